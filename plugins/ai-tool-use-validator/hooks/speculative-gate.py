@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+PreToolUse hook: hands the tool use to `claude-code-tool-use-validator prevalidate`
+only when speculative pre-validation is enabled.
+
+Speculative mode is off by default, and this hook fires for every Bash call.
+Starting the validator's CLI just to find that out costs a full interpreter
+with the package's imports, so this stdlib-only script (run with `python3 -S`)
+checks the config file first and exits when the mode is off.
+"""
+
+import os
+import sys
+
+# Must match CONFIG_PATH in claude_code_tool_use_validator/cli.py
+CONFIG_PATH = os.path.join(os.path.expanduser("~"), ".config", "claude-code-tool-use-validator", "config.toml")
+
+
+def speculative_enabled(config_path: str = CONFIG_PATH) -> bool:
+    try:
+        with open(config_path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return False
+    # Without the section the mode is off, no need to parse the file
+    if b"speculative" not in data:
+        return False
+
+    import tomllib
+
+    try:
+        config = tomllib.loads(data.decode("utf-8"))
+    except (UnicodeDecodeError, tomllib.TOMLDecodeError):
+        return False
+    return config.get("speculative", {}).get("enabled", False) is True
+
+
+def main():
+    if not speculative_enabled():
+        return
+    # Imported only now, it costs more than the rest of this script
+    import subprocess
+
+    hook_input = sys.stdin.buffer.read()
+    try:
+        subprocess.run(["claude-code-tool-use-validator", "prevalidate"], input=hook_input, timeout=4)
+    except (OSError, subprocess.TimeoutExpired):
+        pass
+
+
+if __name__ == "__main__":
+    main()
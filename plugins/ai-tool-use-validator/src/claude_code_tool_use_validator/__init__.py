@@ -1,3 +1,3 @@
 """AI-powered tool use validation for Claude Code."""
 
-__version__ = "0.1.0"
+__version__ = "0.3.0"
@@ -0,0 +1,401 @@
+"""
+Offline replay benchmark for the validator.
+
+`claude-code-tool-use-validator bench CORPUS_DIR` replays recorded hook inputs
+through the full validation pipeline (rules, decision cache, transcript
+parsing, prompt building, API call, decision parsing) without touching the
+network. The API calls go to a local stub that imitates the Vertex AI flavour
+of the Anthropic Messages API (`:rawPredict` and `:streamRawPredict`) with a
+configurable latency and canned responses.
+
+Corpus layout:
+- `*.json` - hook inputs as received on stdin, one per file (subdirectories
+  are included). A relative `transcript_path` is resolved against the file.
+- `responses.json` (optional) - canned model responses, a list of
+  `{"match": "<regex>", "response": "<text>", "model": "<model ID prefix>"}`.
+  The first entry whose regex matches the prompt text (and whose model prefix,
+  if any, matches the requested model) is returned. Without a match, the stub
+  answers `<decision action="escalateToHuman" />`.
+
+The decision cache and transcript checkpoints live in a fresh temporary
+directory, so every run starts cold and never touches the real cache. Results
+can be saved with `--output` and diffed against a previous run with `--compare`.
+"""
+
+import argparse
+import dataclasses
+import hashlib
+import json
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from claude_code_tool_use_validator.cli import (
+    VALIDATED_TOOLS,
+    Config,
+    load_config,
+    open_syslog,
+    run_validation,
+)
+from claude_code_tool_use_validator.metrics import RequestMetrics, format_stats
+
+RESPONSES_FILE = "responses.json"
+
+DEFAULT_RESPONSE = '<decision action="escalateToHuman" />'
+
+# Size of the text deltas the stub streams
+STREAM_CHUNK_SIZE = 16
+
+MODEL_PATTERN = re.compile(r"/models/([^/:]+):(rawPredict|streamRawPredict)$")
+
+
+@dataclasses.dataclass
+class CannedResponse:
+    """A stub response for prompts matching the pattern."""
+
+    pattern: re.Pattern
+    response: str
+    model: str | None = None
+
+
+def load_responses(corpus_dir: Path) -> list[CannedResponse]:
+    """Load the canned responses of a corpus, if it has any."""
+    path = corpus_dir / RESPONSES_FILE
+    if not path.exists():
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    return [
+        CannedResponse(re.compile(entry.get("match", ""), re.DOTALL), entry["response"], entry.get("model"))
+        for entry in entries
+    ]
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _prompt_text(blocks: list[dict]) -> str:
+    return "\n".join(block.get("text", "") for block in blocks if isinstance(block, dict))
+
+
+class StubMessagesServer(ThreadingHTTPServer):
+    """
+    Local imitation of the Vertex AI Messages API.
+
+    Emulates the prompt cache too: the blocks up to the last cache breakpoint
+    are reported as a cache write the first time and as a cache read after that.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, responses: list[CannedResponse], latency_ms: float, chunk_delay_ms: float) -> None:
+        self.responses = responses
+        self.latency = latency_ms / 1000
+        self.chunk_delay = chunk_delay_ms / 1000
+        self.requests = 0
+        self._cached_prefixes: set[str] = set()
+        self._lock = threading.Lock()
+        super().__init__(("127.0.0.1", 0), _StubRequestHandler)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def pick_response(self, model: str, prompt: str) -> str:
+        for canned in self.responses:
+            if canned.model is not None and not model.startswith(canned.model):
+                continue
+            if canned.pattern.search(prompt):
+                return canned.response
+        return DEFAULT_RESPONSE
+
+    def usage(self, model: str, body: dict, response_text: str) -> dict[str, int]:
+        """Token usage of a request, with the cacheable prefix split out."""
+        blocks = list(body.get("system", []))
+        for message in body.get("messages", []):
+            content = message.get("content")
+            blocks.extend(content if isinstance(content, list) else [{"type": "text", "text": content or ""}])
+
+        breakpoint_index = max((i for i, block in enumerate(blocks) if "cache_control" in block), default=-1)
+        prefix = _prompt_text(blocks[: breakpoint_index + 1])
+        rest = _prompt_text(blocks[breakpoint_index + 1 :])
+
+        usage = {
+            "input_tokens": _estimate_tokens(rest),
+            "output_tokens": _estimate_tokens(response_text),
+            "cache_read_input_tokens": 0,
+            "cache_creation_input_tokens": 0,
+        }
+        if prefix:
+            digest = hashlib.sha256(f"{model}\0{prefix}".encode("utf-8")).hexdigest()
+            with self._lock:
+                hit = digest in self._cached_prefixes
+                self._cached_prefixes.add(digest)
+                self.requests += 1
+            usage["cache_read_input_tokens" if hit else "cache_creation_input_tokens"] = _estimate_tokens(prefix)
+        else:
+            with self._lock:
+                self.requests += 1
+        return usage
+
+
+class _StubRequestHandler(BaseHTTPRequestHandler):
+    server: StubMessagesServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        match = MODEL_PATTERN.search(self.path)
+        if match is None:
+            self._send_json(404, {"error": {"type": "not_found_error", "message": self.path}})
+            return
+
+        model = match.group(1)
+        prompt = _prompt_text(
+            [
+                block
+                for message in body.get("messages", [])
+                for block in (
+                    message["content"]
+                    if isinstance(message.get("content"), list)
+                    else [{"type": "text", "text": message.get("content", "")}]
+                )
+            ]
+        )
+        text = self.server.pick_response(model, prompt)
+        usage = self.server.usage(model, body, text)
+        chunks = [text[i : i + STREAM_CHUNK_SIZE] for i in range(0, len(text), STREAM_CHUNK_SIZE)] or [""]
+
+        time.sleep(self.server.latency)
+        if match.group(2) == "streamRawPredict":
+            self._stream(model, chunks, usage)
+        else:
+            # Without streaming the whole response is generated before anything is sent
+            time.sleep(self.server.chunk_delay * len(chunks))
+            self._send_json(200, self._message(model, text, usage))
+
+    def _message(self, model: str, text: str, usage: dict[str, int]) -> dict:
+        return {
+            "id": "msg_bench",
+            "type": "message",
+            "role": "assistant",
+            "model": model,
+            "content": [{"type": "text", "text": text}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": usage,
+        }
+
+    def _send_json(self, status: int, data: dict) -> None:
+        payload = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _stream(self, model: str, chunks: list[str], usage: dict[str, int]) -> None:
+        # The SSE stream has no length, the connection is closed after it
+        self.close_connection = True
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        start_message = self._message(model, "", dict(usage, output_tokens=1))
+        start_message["content"] = []
+        start_message["stop_reason"] = None
+        events = [
+            ("message_start", {"type": "message_start", "message": start_message}),
+            (
+                "content_block_start",
+                {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}},
+            ),
+        ]
+        try:
+            self._send_events(events)
+            for chunk in chunks:
+                time.sleep(self.server.chunk_delay)
+                delta = {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": chunk}}
+                self._send_events([("content_block_delta", delta)])
+            self._send_events(
+                [
+                    ("content_block_stop", {"type": "content_block_stop", "index": 0}),
+                    (
+                        "message_delta",
+                        {
+                            "type": "message_delta",
+                            "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                            "usage": {"output_tokens": usage["output_tokens"]},
+                        },
+                    ),
+                    ("message_stop", {"type": "message_stop"}),
+                ]
+            )
+        except (BrokenPipeError, ConnectionResetError):
+            # The validator stops reading as soon as the decision tag is complete
+            pass
+
+    def _send_events(self, events: list[tuple[str, dict]]) -> None:
+        self.wfile.write(
+            "".join(f"event: {name}\ndata: {json.dumps(data)}\n\n" for name, data in events).encode("utf-8")
+        )
+        self.wfile.flush()
+
+
+def load_corpus(corpus_dir: Path) -> list[tuple[str, dict]]:
+    """Load the recorded hook inputs of a corpus, named by their path relative to it."""
+    cases = []
+    for path in sorted(corpus_dir.rglob("*.json")):
+        if path.name == RESPONSES_FILE:
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            hook_input = json.load(f)
+        transcript_path = hook_input.get("transcript_path")
+        if transcript_path and not Path(transcript_path).is_absolute():
+            hook_input["transcript_path"] = str(path.parent / transcript_path)
+        cases.append((str(path.relative_to(corpus_dir).with_suffix("")), hook_input))
+    return cases
+
+
+def replay_case(name: str, hook_input: dict, config: Config, run: int) -> dict:
+    """Run one recorded hook input through the validation pipeline."""
+    tool_name = hook_input.get("tool_name", "")
+    metrics = RequestMetrics(tool_name)
+    if tool_name in VALIDATED_TOOLS:
+        run_validation(hook_input, metrics, config)
+    else:
+        metrics.decision = metrics.source = "passthrough"
+    return dict(metrics.to_event(), case=name, run=run)
+
+
+def compare_results(previous: dict, results: list[dict]) -> list[str]:
+    """Describe the cases whose decision differs from the previous run (first run of each case)."""
+    def first_decisions(cases: list[dict]) -> dict[str, str | None]:
+        decisions: dict[str, str | None] = {}
+        for case in sorted(cases, key=lambda case: case.get("run", 0)):
+            decisions.setdefault(case["case"], case.get("decision"))
+        return decisions
+
+    before = first_decisions(previous.get("cases", []))
+    after = first_decisions(results)
+    lines = []
+    for name in sorted(before.keys() | after.keys()):
+        if name not in before:
+            lines.append(f"  {name}: new case -> {after[name]}")
+        elif name not in after:
+            lines.append(f"  {name}: {before[name]} -> missing")
+        elif before[name] != after[name]:
+            lines.append(f"  {name}: {before[name]} -> {after[name]}")
+    return lines
+
+
+def run_bench(argv: list[str]) -> None:
+    """Entry point of the `bench` subcommand."""
+    parser = argparse.ArgumentParser(
+        prog="claude-code-tool-use-validator bench",
+        description="Replay recorded hook inputs against a local stub of the Messages API",
+    )
+    parser.add_argument("corpus", type=Path, help="Directory with recorded hook inputs (*.json)")
+    parser.add_argument(
+        "--config",
+        type=Path,
+        help="Config file to take the settings from (default: built-in defaults, for reproducible runs)",
+    )
+    parser.add_argument("--latency-ms", type=float, default=500, help="Stub latency before the first token")
+    parser.add_argument("--chunk-delay-ms", type=float, default=10, help="Stub delay between streamed text chunks")
+    parser.add_argument("--repeat", type=int, default=1, help="Replay the corpus N times (exercises the cache)")
+    parser.add_argument("--concurrency", type=int, default=1, help="Number of requests replayed in parallel")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the decision cache")
+    parser.add_argument("--no-rules", action="store_true", help="Disable the local rules")
+    parser.add_argument("--no-streaming", action="store_true", help="Disable response streaming")
+    parser.add_argument("--routing", action="store_true", help="Enable tiered model routing")
+    parser.add_argument("--output", type=Path, help="Save the results as JSON")
+    parser.add_argument("--compare", type=Path, help="Diff the decisions against previously saved results")
+    args = parser.parse_args(argv)
+
+    cases = load_corpus(args.corpus)
+    if not cases:
+        parser.error(f"No hook inputs found in {args.corpus}")
+
+    base_config = load_config(args.config) if args.config else Config(project_id="bench")
+    server = StubMessagesServer(load_responses(args.corpus), args.latency_ms, args.chunk_delay_ms)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    # Keep the replayed decisions apart from the real ones in syslog
+    open_syslog("claude-code-tool-validator-bench")
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="claude-code-tool-use-validator-bench-") as state_dir:
+        config = dataclasses.replace(
+            base_config,
+            project_id="bench",
+            region="bench",
+            base_url=server.base_url,
+            access_token="bench",
+            state_dir=Path(state_dir),
+            cache_enabled=base_config.cache_enabled and not args.no_cache,
+            rules_enabled=base_config.rules_enabled and not args.no_rules,
+            streaming=base_config.streaming and not args.no_streaming,
+            routing_enabled=base_config.routing_enabled or args.routing,
+        )
+
+        start = time.perf_counter()
+        for run in range(args.repeat):
+            with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as executor:
+                results.extend(
+                    executor.map(lambda case: replay_case(case[0], case[1], config, run), cases)
+                )
+        wall_seconds = time.perf_counter() - start
+    server.shutdown()
+    server.server_close()
+
+    print(f"Cases: {len(cases)} x {args.repeat} runs, concurrency {args.concurrency}")
+    print(f"Stub: {args.latency_ms:.0f}ms latency, {args.chunk_delay_ms:.0f}ms per chunk, {server.requests} API calls")
+    print(f"Wall time: {wall_seconds:.2f}s, throughput: {len(results) / wall_seconds:.1f} requests/s")
+    print()
+    print(format_stats(results))
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+        changes = compare_results(previous, results)
+        print()
+        print(f"Decision changes vs {args.compare}: {len(changes)}")
+        for line in changes:
+            print(line)
+
+    if args.output:
+        settings = {
+            "model": config.model,
+            "streaming": config.streaming,
+            "cache_enabled": config.cache_enabled,
+            "rules_enabled": config.rules_enabled,
+            "routing_enabled": config.routing_enabled,
+            "latency_ms": args.latency_ms,
+            "chunk_delay_ms": args.chunk_delay_ms,
+            "repeat": args.repeat,
+            "concurrency": args.concurrency,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "created_at": time.time(),
+                    "settings": settings,
+                    "wall_seconds": round(wall_seconds, 3),
+                    "throughput": round(len(results) / wall_seconds, 2),
+                    "cases": results,
+                },
+                f,
+                indent=2,
+            )
+        print(f"\nResults saved to {args.output}")
@@ -0,0 +1,366 @@
+"""
+Persistent decision cache for the tool use validator.
+
+Repeated Bash commands (`git status`, `pytest -x`, ...) in the same working
+directory get the same verdict from the LLM almost every time. The cache keeps
+`allow` and `denyWithReason` decisions in a small SQLite database so repeat
+requests skip the API round trip entirely.
+
+`escalateToHuman` is never cached - those requests always reach the model (or
+the user) again.
+
+The same database holds the speculative verdicts computed at PreToolUse time,
+see `SpeculativeStore`.
+"""
+
+import hashlib
+import os
+import re
+import shlex
+import sqlite3
+import time
+from contextlib import closing
+from pathlib import Path
+
+CACHE_DIR = Path.home() / ".cache" / "claude-code-tool-use-validator"
+DECISION_CACHE_PATH = CACHE_DIR / "decisions.sqlite3"
+
+# Only decisions that are safe to replay are cached
+CACHEABLE_ACTIONS = {"allow", "denyWithReason"}
+
+SCHEMA = """\
+CREATE TABLE IF NOT EXISTS decisions (
+    key TEXT PRIMARY KEY,
+    command TEXT NOT NULL,
+    cwd TEXT NOT NULL,
+    action TEXT NOT NULL,
+    reason TEXT,
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS decisions_last_used_at ON decisions (last_used_at);
+"""
+
+SPECULATIVE_SCHEMA = """\
+DROP TABLE IF EXISTS speculative;
+CREATE TABLE IF NOT EXISTS speculative_verdicts (
+    key TEXT PRIMARY KEY,
+    command TEXT NOT NULL,
+    state TEXT NOT NULL,
+    action TEXT,
+    reason TEXT,
+    worker_pid INTEGER,
+    created_at REAL NOT NULL
+);
+"""
+
+# How often a PermissionRequest polls for an in-flight speculative verdict
+SPECULATIVE_POLL_INTERVAL = 0.05
+
+# Where Claude Code installs plugins, only an llm-toto script in there is trusted to be the real one
+CLAUDE_PLUGINS_DIR = Path(os.environ.get("CLAUDE_CONFIG_DIR") or Path.home() / ".claude") / "plugins"
+
+# The llm-toto plugin's PreToolUse hook wraps commands as `python3 .../llm-toto.py --session ID -- <command>`,
+# so the PermissionRequest sees a different command than the PreToolUse did
+LLM_TOTO_WRAPPER_PATTERN = re.compile(
+    r"python3 "
+    + re.escape(str(CLAUDE_PLUGINS_DIR))
+    + r"/(?:(?!\.\.?/)[\w.-]+/)*llm-toto/(?:(?!\.\.?/)[\w.-]+/)?scripts/llm-toto\.py(?: --?\w[\w-]* \S+)* -- "
+)
+# A pipeline wrapped as a single shlex-quoted argument
+SHLEX_QUOTED_PATTERN = re.compile(r"""(?:'[^']*'|"'")+""")
+# Dropped by the llm-toto hook, the wrapper captures both streams anyway
+STDERR_TO_STDOUT_PATTERN = re.compile(r"(?<!\S)2>&1(?!\S)")
+
+
+def normalize_command(command: str) -> str:
+    """
+    Normalize a Bash command for use as a cache key.
+
+    Collapses runs of whitespace outside of quotes and strips the ends. Quoted
+    content is kept verbatim, so `echo 'a  b'` and `echo 'a b'` stay distinct.
+    """
+    result: list[str] = []
+    quote: str | None = None
+    pending_space = False
+    escaped = False
+
+    for char in command.strip():
+        if escaped:
+            result.append(char)
+            escaped = False
+            continue
+        if quote is None and char.isspace():
+            pending_space = True
+            continue
+        if pending_space:
+            result.append(" ")
+            pending_space = False
+        if char == "\\" and quote != "'":
+            escaped = True
+        elif quote is None and char in ("'", '"'):
+            quote = char
+        elif char == quote:
+            quote = None
+        result.append(char)
+
+    return "".join(result)
+
+
+def unwrap_command(command: str) -> str:
+    """
+    Undo the llm-toto wrapping of a Bash command, so both hooks agree on the speculative key.
+
+    Only the llm-toto script installed in CLAUDE_PLUGINS_DIR is unwrapped, a
+    `python3 /tmp/llm-toto.py -- ls` runs whatever that file is and stays as is.
+
+    `cd app && python3 .../llm-toto.py --session s -- make build` becomes
+    `cd app && make build`. Redundant `2>&1` redirects are dropped too. The
+    filters llm-toto drops (`| tail -5`, ...) are not restored, the validator
+    judges those differently anyway.
+    """
+    parts = []
+    position = 0
+    for match in LLM_TOTO_WRAPPER_PATTERN.finditer(command):
+        parts.append(command[position : match.start()])
+        position = match.end()
+        quoted = SHLEX_QUOTED_PATTERN.match(command, position)
+        if quoted is not None:
+            rest = command[quoted.end() :].lstrip(" ")
+            if not rest or rest[0] in ";&|)\n":
+                parts.append(shlex.split(quoted.group())[0])
+                position = quoted.end()
+    parts.append(command[position:])
+    return STDERR_TO_STDOUT_PATTERN.sub("", "".join(parts))
+
+
+def _connect(path: Path, schema: str) -> sqlite3.Connection:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    connection = sqlite3.connect(path, timeout=1.0, isolation_level=None)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(schema)
+    return connection
+
+
+def make_cache_key(command: str, cwd: str) -> str:
+    """Create the cache key for a command executed in the given directory."""
+    normalized = normalize_command(command)
+    return hashlib.sha256(f"{cwd}\0{normalized}".encode("utf-8")).hexdigest()
+
+
+class DecisionCache:
+    """
+    SQLite-backed cache of validator decisions with TTL and LRU eviction.
+
+    All operations are best-effort: a locked or corrupted database behaves
+    like a cache miss instead of failing the validation.
+    """
+
+    def __init__(
+        self,
+        path: Path = DECISION_CACHE_PATH,
+        ttl_seconds: int = 24 * 3600,
+        max_entries: int = 2000,
+    ) -> None:
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+    def _connect(self) -> sqlite3.Connection:
+        return _connect(self.path, SCHEMA)
+
+    def get(self, command: str, cwd: str) -> tuple[str, str | None] | None:
+        """Return the cached (action, reason) for the command, or None on a miss."""
+        key = make_cache_key(command, cwd)
+        now = time.time()
+        try:
+            with closing(self._connect()) as connection:
+                return self._get(connection, key, now)
+        except sqlite3.Error:
+            return None
+
+    def _get(self, connection: sqlite3.Connection, key: str, now: float) -> tuple[str, str | None] | None:
+        row = connection.execute(
+            "SELECT action, reason, created_at FROM decisions WHERE key = ?",
+            (key,),
+        ).fetchone()
+        if row is None:
+            return None
+
+        action, reason, created_at = row
+        if now - created_at > self.ttl_seconds:
+            connection.execute("DELETE FROM decisions WHERE key = ?", (key,))
+            return None
+
+        connection.execute("UPDATE decisions SET last_used_at = ? WHERE key = ?", (now, key))
+        return action, reason
+
+    def put(self, command: str, cwd: str, action: str, reason: str | None) -> None:
+        """Store a decision. Actions outside CACHEABLE_ACTIONS are ignored."""
+        if action not in CACHEABLE_ACTIONS:
+            return
+
+        now = time.time()
+        try:
+            with closing(self._connect()) as connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO decisions (key, command, cwd, action, reason, created_at, last_used_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (make_cache_key(command, cwd), normalize_command(command), cwd, action, reason, now, now),
+                )
+                self._evict(connection, now)
+        except sqlite3.Error:
+            pass
+
+    def _evict(self, connection: sqlite3.Connection, now: float) -> None:
+        """Drop expired entries and the least recently used ones above max_entries."""
+        connection.execute("DELETE FROM decisions WHERE created_at < ?", (now - self.ttl_seconds,))
+        connection.execute(
+            "DELETE FROM decisions WHERE key IN ("
+            "SELECT key FROM decisions ORDER BY last_used_at DESC LIMIT -1 OFFSET ?"
+            ")",
+            (self.max_entries,),
+        )
+
+
+class SpeculativeStore:
+    """
+    Verdicts of speculative pre-validations, keyed on session, CWD and command.
+
+    The PreToolUse hook claims a pending entry and starts the validation in the
+    background, the PermissionRequest hook then collects the verdict, waiting
+    for it if it's still in flight. Each verdict is collected at most once, and
+    only for the command it was claimed for (or that command wrapped by llm-toto).
+    Like the decision cache, all operations are best-effort.
+    """
+
+    def __init__(
+        self,
+        path: Path = DECISION_CACHE_PATH,
+        pending_timeout: float = 30.0,
+        ttl_seconds: float = 300.0,
+    ) -> None:
+        self.path = path
+        # A pending entry older than this belongs to a worker that died
+        self.pending_timeout = pending_timeout
+        # Verdicts not collected within this time are dropped
+        self.ttl_seconds = ttl_seconds
+
+    def _connect(self) -> sqlite3.Connection:
+        return _connect(self.path, SPECULATIVE_SCHEMA)
+
+    @staticmethod
+    def _key(session_id: str, command: str, cwd: str) -> str:
+        return make_cache_key(unwrap_command(command), f"{session_id}\0{cwd}")
+
+    def claim(self, session_id: str, command: str, cwd: str) -> bool:
+        """
+        Register a pending validation. Returns False if one is already pending.
+
+        A verdict nobody collected (e.g. because a rule decided the tool use
+        first) is replaced, so it can't be handed out for this claim.
+        """
+        key = self._key(session_id, command, cwd)
+        now = time.time()
+        try:
+            with closing(self._connect()) as connection:
+                connection.execute(
+                    "DELETE FROM speculative_verdicts WHERE (state = 'pending' AND created_at < ?) OR created_at < ?",
+                    (now - self.pending_timeout, now - self.ttl_seconds),
+                )
+                connection.execute("DELETE FROM speculative_verdicts WHERE key = ? AND state = 'done'", (key,))
+                cursor = connection.execute(
+                    "INSERT OR IGNORE INTO speculative_verdicts (key, command, state, created_at) "
+                    "VALUES (?, ?, 'pending', ?)",
+                    (key, command, now),
+                )
+                return cursor.rowcount == 1
+        except sqlite3.Error:
+            return False
+
+    def assign(self, session_id: str, command: str, cwd: str, worker_pid: int) -> None:
+        """Record the worker process of a pending validation, so a crashed worker isn't waited for."""
+        try:
+            with closing(self._connect()) as connection:
+                connection.execute(
+                    "UPDATE speculative_verdicts SET worker_pid = ? WHERE key = ? AND state = 'pending'",
+                    (worker_pid, self._key(session_id, command, cwd)),
+                )
+        except sqlite3.Error:
+            pass
+
+    def complete(self, session_id: str, command: str, cwd: str, action: str, reason: str | None) -> None:
+        """Store the verdict of a pending validation."""
+        try:
+            with closing(self._connect()) as connection:
+                connection.execute(
+                    "UPDATE speculative_verdicts SET state = 'done', action = ?, reason = ? WHERE key = ?",
+                    (action, reason, self._key(session_id, command, cwd)),
+                )
+        except sqlite3.Error:
+            pass
+
+    def abandon(self, session_id: str, command: str, cwd: str) -> None:
+        """Drop a pending validation that failed, so the PermissionRequest doesn't wait for it."""
+        try:
+            with closing(self._connect()) as connection:
+                connection.execute("DELETE FROM speculative_verdicts WHERE key = ?", (self._key(session_id, command, cwd),))
+        except sqlite3.Error:
+            pass
+
+    def collect(self, session_id: str, command: str, cwd: str, timeout: float) -> tuple[str, str | None] | None:
+        """
+        Return the (action, reason) of a speculative validation and forget it.
+
+        Waits up to timeout seconds for a pending validation to finish. Returns
+        None if there is none, it didn't finish in time, or it was claimed for
+        a different command that only shares the key.
+        """
+        key = self._key(session_id, command, cwd)
+        deadline = time.monotonic() + timeout
+        try:
+            with closing(self._connect()) as connection:
+                while True:
+                    row = connection.execute(
+                        "SELECT command, state, action, reason, worker_pid, created_at "
+                        "FROM speculative_verdicts WHERE key = ?",
+                        (key,),
+                    ).fetchone()
+                    if row is None:
+                        return None
+
+                    claimed_command, state, action, reason, worker_pid, created_at = row
+                    if not _is_claimed_command(claimed_command, command):
+                        return None
+                    age = time.time() - created_at
+                    if state == "done":
+                        connection.execute("DELETE FROM speculative_verdicts WHERE key = ?", (key,))
+                        return (action, reason) if age <= self.ttl_seconds else None
+                    if age > self.pending_timeout or time.monotonic() >= deadline:
+                        return None
+                    if worker_pid is not None and not _is_running(worker_pid):
+                        connection.execute("DELETE FROM speculative_verdicts WHERE key = ? AND state = 'pending'", (key,))
+                        continue
+                    time.sleep(SPECULATIVE_POLL_INTERVAL)
+        except sqlite3.Error:
+            return None
+
+
+def _is_claimed_command(claimed: str, command: str) -> bool:
+    """Whether the command is the claimed one, as is or wrapped by llm-toto."""
+    if command == claimed:
+        return True
+    if LLM_TOTO_WRAPPER_PATTERN.search(command) is None:
+        return False
+    return normalize_command(unwrap_command(command)) == normalize_command(unwrap_command(claimed))
+
+
+def _is_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -14,18 +14,28 @@ Exit behaviors:
 
 import json
 import re
+import subprocess
 import sys
 import syslog
+import threading
 import time
 import tomllib
 import warnings
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 # Suppress Google Cloud SDK credential warnings
 warnings.filterwarnings("ignore", message=".*end user credentials.*quota project.*")
 
-from anthropic import AnthropicVertex
+from claude_code_tool_use_validator.cache import CACHE_DIR, DECISION_CACHE_PATH, DecisionCache, SpeculativeStore
+from claude_code_tool_use_validator.daemon import DaemonUnavailable, request_evaluation, serve
+from claude_code_tool_use_validator.metrics import RequestMetrics, print_stats
+from claude_code_tool_use_validator.rules import DEFAULT_ALLOW_RULES, DEFAULT_ESCALATE_RULES, compile_rules
+from claude_code_tool_use_validator.transcript import CHECKPOINT_DIR, parse_transcript
+
+if TYPE_CHECKING:
+    from anthropic import AnthropicVertex
 
 
 CONFIG_PATH = Path.home() / ".config" / "claude-code-tool-use-validator" / "config.toml"
@@ -38,29 +48,62 @@ class Config:
     project_id: str
     region: str = "global"
     model: str = "claude-opus-4-5@20251101"
-
-
-def load_config() -> Config:
+    streaming: bool = True
+    cache_enabled: bool = True
+    cache_ttl_seconds: int = 24 * 3600
+    cache_max_entries: int = 2000
+    rules_enabled: bool = True
+    rules_allow: list[str] = field(default_factory=lambda: list(DEFAULT_ALLOW_RULES))
+    rules_escalate: list[str] = field(default_factory=lambda: list(DEFAULT_ESCALATE_RULES))
+    routing_enabled: bool = False
+    routing_fast_model: str = "claude-haiku-4-5@20251001"
+    speculative_enabled: bool = False
+    speculative_wait_seconds: float = 25.0
+    # Not read from the config file - `bench` points these at its local stub server
+    base_url: str | None = None
+    access_token: str | None = None
+    # Where the decision cache and transcript checkpoints live
+    state_dir: Path = CACHE_DIR
+
+
+def load_config(config_path: Path = CONFIG_PATH) -> Config:
     """Load configuration from TOML file."""
-    if not CONFIG_PATH.exists():
+    if not config_path.exists():
         raise FileNotFoundError(
-            f"Config file not found: {CONFIG_PATH}\n"
+            f"Config file not found: {config_path}\n"
             f"Please create it with the following content:\n\n"
             f'project_id = "your-gcp-project-id"\n'
             f'region = "global"  # or specific region like "us-east5"\n'
             f'model = "claude-opus-4-5@20251101"  # or other model\n'
         )
 
-    with open(CONFIG_PATH, "rb") as f:
+    with open(config_path, "rb") as f:
         data = tomllib.load(f)
 
     if "project_id" not in data:
-        raise ValueError(f"Missing required 'project_id' in {CONFIG_PATH}")
+        raise ValueError(f"Missing required 'project_id' in {config_path}")
+
+    cache = data.get("cache", {})
+    rules = data.get("rules", {})
+    use_default_rules = rules.get("use_defaults", True)
+    routing = data.get("routing", {})
+    speculative = data.get("speculative", {})
 
     return Config(
         project_id=data["project_id"],
         region=data.get("region", "global"),
         model=data.get("model", "claude-opus-4-5@20251101"),
+        streaming=data.get("streaming", True),
+        cache_enabled=cache.get("enabled", True),
+        cache_ttl_seconds=cache.get("ttl_seconds", 24 * 3600),
+        cache_max_entries=cache.get("max_entries", 2000),
+        rules_enabled=rules.get("enabled", True),
+        rules_allow=(DEFAULT_ALLOW_RULES if use_default_rules else []) + rules.get("allow", []),
+        rules_escalate=(DEFAULT_ESCALATE_RULES if use_default_rules else []) + rules.get("escalate", []),
+        routing_enabled=routing.get("enabled", False),
+        routing_fast_model=routing.get("fast_model", "claude-haiku-4-5@20251001"),
+        speculative_enabled=speculative.get("enabled", False),
+        speculative_wait_seconds=speculative.get("wait_seconds", 25.0),
     )
 
 
@@ -116,6 +159,21 @@ Teaching moments to improve agent behavior:
 
 Think through your reasoning, then output your decision tag at the end."""
 
+# The fast tier additionally rates its confidence, anything but a confident
+# allow/denyWithReason is re-asked to the configured model
+FAST_TIER_SYSTEM_PROMPT = (
+    VALIDATOR_SYSTEM_PROMPT
+    + """
+
+<confidence>
+Add a confidence attribute to your decision tag, e.g. <decision action="allow" confidence="high" />.
+Use confidence="high" only when the case is clear-cut. Use confidence="low" whenever you hesitate - a more capable reviewer will then take another look.
+</confidence>"""
+)
+
+# Fast tier verdicts that are accepted without asking the configured model
+FAST_TIER_FINAL_ACTIONS = {"allow", "denyWithReason"}
+
 
 def make_allow_response() -> dict:
     """Create a response that allows the tool use."""
@@ -153,19 +211,38 @@ def make_ask_response() -> dict:
     }
 
 
+_syslog_opened = False
+
+
+def open_syslog(ident: str = "claude-code-tool-validator") -> None:
+    """Open the syslog connection, once per process - the daemon keeps it for its whole lifetime."""
+    global _syslog_opened
+    if not _syslog_opened:
+        syslog.openlog(ident, syslog.LOG_PID, syslog.LOG_USER)
+        _syslog_opened = True
+
+
 def log_to_syslog(
     tool_name: str,
     tool_input_summary: str,
     decision: str,
     duration_ms: float | None = None,
     level: int = syslog.LOG_INFO,
+    tier: str | None = None,
+    usage: dict[str, int] | None = None,
 ) -> None:
     """Log the validation decision to syslog."""
-    syslog.openlog("claude-code-tool-validator", syslog.LOG_PID, syslog.LOG_USER)
+    open_syslog()
     duration_str = f"duration={duration_ms:.0f}ms " if duration_ms is not None else ""
-    message = f"{duration_str}tool={tool_name} decision={decision} input={tool_input_summary}"
+    tier_str = f"tier={tier} " if tier is not None else ""
+    usage_str = (
+        f"input_tokens={usage['input_tokens']} output_tokens={usage['output_tokens']} "
+        f"cache_read={usage['cache_read_input_tokens']} cache_creation={usage['cache_creation_input_tokens']} "
+        if usage is not None
+        else ""
+    )
+    message = f"{duration_str}{tier_str}{usage_str}tool={tool_name} decision={decision} input={tool_input_summary}"
     syslog.syslog(level, message)
-    syslog.closelog()
 
 
 def summarize_tool_input(tool_name: str, tool_input: dict) -> str:
@@ -195,86 +272,6 @@ def summarize_tool_input(tool_name: str, tool_input: dict) -> str:
         return f"keys={keys}"
 
 
-def parse_transcript(transcript_path: str) -> tuple[str | None, list[dict]]:
-    """
-    Parse the JSONL transcript to extract context.
-
-    Returns:
-        - last_user_prompt: The last user message with string content
-        - recent_operations: List of recent tool_use/tool_result pairs
-    """
-    last_user_prompt: str | None = None
-    recent_operations: list[dict] = []
-
-    try:
-        with open(transcript_path, "r") as f:
-            lines = f.readlines()
-    except (FileNotFoundError, PermissionError, OSError):
-        return None, []
-
-    # Parse all lines into entries
-    entries = []
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-        try:
-            entry = json.loads(line)
-            entries.append(entry)
-        except json.JSONDecodeError:
-            continue
-
-    # Find the last user prompt with string content
-    for entry in reversed(entries):
-        if entry.get("type") == "user":
-            message = entry.get("message", {})
-            content = message.get("content")
-            if isinstance(content, str):
-                last_user_prompt = content
-                break
-
-    # Find recent tool operations (tool_use from assistant, tool_result responses)
-    tool_uses = []
-    tool_results = {}
-
-    for entry in entries:
-        if entry.get("type") == "assistant":
-            message = entry.get("message", {})
-            content = message.get("content", [])
-            if isinstance(content, list):
-                for block in content:
-                    if isinstance(block, dict) and block.get("type") == "tool_use":
-                        tool_uses.append(block)
-        elif entry.get("type") == "user":
-            message = entry.get("message", {})
-            content = message.get("content", [])
-            if isinstance(content, list):
-                for block in content:
-                    if isinstance(block, dict) and block.get("type") == "tool_result":
-                        tool_id = block.get("tool_use_id")
-                        if tool_id:
-                            tool_results[tool_id] = block
-
-    # Get the last ~10 tool operations with their results
-    recent_tool_uses = tool_uses[-10:]
-    for tool_use in recent_tool_uses:
-        tool_id = tool_use.get("id")
-        operation = {
-            "tool_name": tool_use.get("name"),
-            "tool_input": tool_use.get("input", {}),
-        }
-        if tool_id and tool_id in tool_results:
-            result = tool_results[tool_id]
-            result_content = result.get("content")
-            # Truncate very long results
-            if isinstance(result_content, str) and len(result_content) > 500:
-                result_content = result_content[:500] + "... (truncated)"
-            operation["result"] = result_content
-        recent_operations.append(operation)
-
-    return last_user_prompt, recent_operations
-
-
 def format_operations_for_prompt(operations: list[dict]) -> str:
     """Format recent operations for the validator prompt."""
     if not operations:
@@ -308,16 +305,24 @@ def build_validator_prompt(
     recent_operations: list[dict],
     tool_name: str,
     tool_input: dict,
-) -> str:
-    """Build the user prompt for the validator LLM."""
-    parts = []
+) -> list[dict]:
+    """
+    Build the user prompt for the validator LLM as content blocks.
+
+    The session-stable prefix (cwd, last user prompt) comes first and carries a
+    cache breakpoint, the volatile parts (recent operations, current request)
+    come last, so consecutive calls in a session hit the prompt cache.
+    """
+    stable_parts = []
 
-    parts.append(f"<cwd>{cwd}</cwd>")
+    stable_parts.append(f"<cwd>{cwd}</cwd>")
 
     if last_user_prompt:
-        parts.append(f"<last_user_prompt>\n{last_user_prompt}\n</last_user_prompt>")
+        stable_parts.append(f"<last_user_prompt>\n{last_user_prompt}\n</last_user_prompt>")
     else:
-        parts.append("<last_user_prompt>Not available</last_user_prompt>")
+        stable_parts.append("<last_user_prompt>Not available</last_user_prompt>")
+
+    parts = []
 
     parts.append(
         f"<recent_operations>\n{format_operations_for_prompt(recent_operations)}\n</recent_operations>"
@@ -331,7 +336,17 @@ def build_validator_prompt(
         "<task>Evaluate this tool request. Think through your reasoning, then output your decision.</task>"
     )
 
-    return "\n\n".join(parts)
+    return [
+        {"type": "text", "text": "\n\n".join(stable_parts), "cache_control": {"type": "ephemeral"}},
+        {"type": "text", "text": "\n\n".join(parts)},
+    ]
+
+
+DECISION_PATTERN = re.compile(
+    r'<decision\s+action="(allow|denyWithReason|escalateToHuman)"(?:\s+confidence="(high|low)")?'
+    r'(?:\s*/>|>(.*?)</decision>)',
+    re.DOTALL,
+)
 
 
 def parse_decision(response_text: str) -> tuple[str, str | None]:
@@ -345,17 +360,13 @@ def parse_decision(response_text: str) -> tuple[str, str | None]:
         - reason: The reason text for denyWithReason, None otherwise
     """
     # Find all decision tags (any action type)
-    all_decisions = re.findall(
-        r'<decision\s+action="(allow|denyWithReason|escalateToHuman)"(?:\s*/>|>(.*?)</decision>)',
-        response_text,
-        re.DOTALL,
-    )
+    all_decisions = DECISION_PATTERN.findall(response_text)
 
     # Must have exactly one decision
     if len(all_decisions) != 1:
         return "error", None
 
-    action, content = all_decisions[0]
+    action, _confidence, content = all_decisions[0]
 
     if action == "allow":
         return "allow", None
@@ -371,51 +382,224 @@ def parse_decision(response_text: str) -> tuple[str, str | None]:
     return "error", None
 
 
-def call_vertex_ai(config: Config, system_prompt: str, user_prompt: str) -> str:
-    """Call Vertex AI with the given prompts and return the response text."""
-    client = AnthropicVertex(project_id=config.project_id, region=config.region)
-    response = client.messages.create(
-        model=config.model,
-        max_tokens=1024,
-        system=system_prompt,
-        messages=[{"role": "user", "content": user_prompt}],
-    )
+def parse_confidence(response_text: str) -> str | None:
+    """Return the confidence ("high" or "low") of the single decision tag, None if missing."""
+    all_decisions = DECISION_PATTERN.findall(response_text)
+    if len(all_decisions) != 1:
+        return None
+    return all_decisions[0][1] or None
+
+
+class IncrementalDecisionParser:
+    """
+    Accumulates a streamed response and detects the first complete decision tag.
+
+    Only the tail that may still contain an unfinished tag is re-scanned on
+    each chunk. The accumulated text is still validated with parse_decision,
+    so the exactly-one-decision rule applies to everything received.
+    """
+
+    def __init__(self) -> None:
+        self.text = ""
+        self._scan_from = 0
+
+    def feed(self, chunk: str) -> bool:
+        """Add a chunk of the response, return True once a complete decision tag arrived."""
+        self.text += chunk
+        if DECISION_PATTERN.search(self.text, self._scan_from):
+            return True
+
+        # Resume at an opened but unfinished tag, or just before the end in case a tag starts there
+        opened = self.text.find("<decision", self._scan_from)
+        self._scan_from = opened if opened != -1 else max(0, len(self.text) - len("<decision"))
+        return False
+
+
+# Clients are reused across requests so the daemon keeps warm connections
+_clients: dict[tuple[str, str, str | None], "AnthropicVertex"] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(config: Config) -> "AnthropicVertex":
+    """
+    Get a Vertex AI client for the configured project and region.
+
+    The anthropic SDK is imported lazily, so invocations that are answered
+    by the daemon never pay for importing it.
+    """
+    key = (config.project_id, config.region, config.base_url)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            from anthropic import AnthropicVertex
+
+            client = AnthropicVertex(
+                project_id=config.project_id,
+                region=config.region,
+                base_url=config.base_url,
+                access_token=config.access_token,
+            )
+            _clients[key] = client
+        return client
+
+
+USAGE_FIELDS = ("input_tokens", "output_tokens", "cache_read_input_tokens", "cache_creation_input_tokens")
+
+
+def usage_to_dict(usage) -> dict[str, int]:
+    """Convert the SDK usage object into plain token counts."""
+    return {name: getattr(usage, name, None) or 0 for name in USAGE_FIELDS}
+
+
+def add_usage(total: dict[str, int], usage: dict[str, int]) -> dict[str, int]:
+    """Sum token counts of several API calls."""
+    return {name: total.get(name, 0) + usage.get(name, 0) for name in USAGE_FIELDS}
+
+
+def call_vertex_ai(
+    config: Config,
+    system_prompt: str,
+    user_prompt: str | list[dict],
+    model: str | None = None,
+) -> tuple[str, dict[str, int]]:
+    """
+    Call Vertex AI with the given prompts and return the response text and token usage.
+
+    Uses the configured model unless another model is given. The system prompt
+    carries a cache breakpoint, so it is read from the prompt cache on repeat
+    calls. In streaming mode the stream is closed as soon as a complete
+    decision tag arrives, so the reasoning after it (if any) is neither waited
+    for nor billed.
+    """
+    client = get_client(config)
+    request = {
+        "model": model or config.model,
+        "max_tokens": 1024,
+        "system": [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}],
+        "messages": [{"role": "user", "content": user_prompt}],
+    }
+
+    if config.streaming:
+        parser = IncrementalDecisionParser()
+        with client.messages.stream(**request) as stream:
+            for text in stream.text_stream:
+                if parser.feed(text):
+                    break
+            # Output tokens are only partially counted when the stream is closed early
+            usage = usage_to_dict(stream.current_message_snapshot.usage)
+        return parser.text, usage
+
+    response = client.messages.create(**request)
+    usage = usage_to_dict(response.usage)
 
     # Extract text from response
     if response.content and len(response.content) > 0:
-        return response.content[0].text
-    return ""
+        return response.content[0].text, usage
+    return "", usage
+
+
+def respond_with_decision(
+    action: str,
+    reason: str | None,
+    tool_name: str,
+    tool_input_summary: str,
+    duration_ms: float,
+    source: str | None = None,
+    tier: str | None = None,
+    usage: dict[str, int] | None = None,
+) -> dict | None:
+    """Log a parsed decision and turn it into the hook response."""
+    source_str = f" ({source})" if source else ""
+
+    if action == "allow":
+        log_to_syslog(
+            tool_name, tool_input_summary, f"allow{source_str}", duration_ms=duration_ms, tier=tier, usage=usage
+        )
+        return make_allow_response()
+    elif action == "denyWithReason":
+        log_to_syslog(
+            tool_name,
+            tool_input_summary,
+            f"denyWithReason{source_str}: {reason}",
+            duration_ms=duration_ms,
+            level=syslog.LOG_WARNING,
+            tier=tier,
+            usage=usage,
+        )
+        return make_deny_response(reason or "Operation denied by AI validator.")
+    elif action == "escalateToHuman":
+        log_to_syslog(
+            tool_name,
+            tool_input_summary,
+            f"escalateToHuman{source_str}",
+            duration_ms=duration_ms,
+            tier=tier,
+            usage=usage,
+        )
+        return None
+    else:
+        # Parse error - escalate to human as safe fallback
+        log_to_syslog(
+            tool_name,
+            tool_input_summary,
+            "escalateToHuman (parse error)",
+            duration_ms=duration_ms,
+            level=syslog.LOG_WARNING,
+            tier=tier,
+            usage=usage,
+        )
+        return None
 
 
 # Tools that the validator will evaluate - all others pass through to user
 VALIDATED_TOOLS = {"Bash"}
 
 
-def evaluate_tool_use(hook_input: dict) -> dict | None:
+def evaluate_tool_use(hook_input: dict, config: Config | None = None) -> dict | None:
     """
     Evaluate the tool use and return a decision.
 
+    Every validated request is recorded as a structured metrics event.
+
     Returns:
         - allow response: Auto-approve
         - deny response: Block with feedback
         - ask response or None: Show permission dialog to user
     """
     tool_name = hook_input.get("tool_name", "")
-    tool_input = hook_input.get("tool_input", {})
-    cwd = hook_input.get("cwd", "")
-    transcript_path = hook_input.get("transcript_path", "")
 
     # Only validate specific tools - pass others through to user
     # This avoids interfering with Claude's built-in permission modes
     if tool_name not in VALIDATED_TOOLS:
         return None
 
+    metrics = RequestMetrics(tool_name)
+    try:
+        return run_validation(hook_input, metrics, config)
+    finally:
+        metrics.record()
+
+
+def run_validation(hook_input: dict, metrics: RequestMetrics, config: Config | None = None) -> dict | None:
+    """
+    Run the validation pipeline: rules, decision cache, then the LLM tiers.
+
+    The config is loaded from the config file unless one is given.
+    """
+    tool_name = hook_input.get("tool_name", "")
+    tool_input = hook_input.get("tool_input", {})
+    cwd = hook_input.get("cwd", "")
+    transcript_path = hook_input.get("transcript_path", "")
+
     tool_input_summary = summarize_tool_input(tool_name, tool_input)
 
     # Load config
     try:
-        config = load_config()
+        with metrics.stage("config_load"):
+            if config is None:
+                config = load_config()
     except (FileNotFoundError, ValueError) as e:
+        metrics.decision = "configError"
         log_to_syslog(
             tool_name,
             tool_input_summary,
@@ -424,66 +608,240 @@ def evaluate_tool_use(hook_input: dict) -> dict | None:
         )
         return None
 
+    command = tool_input.get("command", "")
+
+    # Resolve clear-cut commands locally without calling the LLM
+    if config.rules_enabled:
+        start_time = time.perf_counter()
+        with metrics.stage("rules"):
+            rule_set = compile_rules(tuple(config.rules_allow), tuple(config.rules_escalate))
+            action = rule_set.evaluate(command, cwd)
+        if action is not None:
+            duration_ms = (time.perf_counter() - start_time) * 1000
+            metrics.decision, metrics.source = action, "rule"
+            return respond_with_decision(
+                action, None, tool_name, tool_input_summary, duration_ms, source="rule"
+            )
+
+    # Serve repeated commands from the decision cache
+    decision_cache = None
+    if config.cache_enabled:
+        decision_cache = DecisionCache(
+            config.state_dir / DECISION_CACHE_PATH.name,
+            ttl_seconds=config.cache_ttl_seconds,
+            max_entries=config.cache_max_entries,
+        )
+        start_time = time.perf_counter()
+        with metrics.stage("cache_lookup"):
+            cached = decision_cache.get(command, cwd)
+        if cached is not None:
+            duration_ms = (time.perf_counter() - start_time) * 1000
+            action, reason = cached
+            metrics.decision, metrics.source = action, "cache"
+            return respond_with_decision(
+                action, reason, tool_name, tool_input_summary, duration_ms, source="cached"
+            )
+
+    # Collect the verdict of a validation started speculatively at PreToolUse time
+    if config.speculative_enabled and hook_input.get("hook_event_name") != "PreToolUse":
+        start_time = time.perf_counter()
+        with metrics.stage("speculative_wait"):
+            speculative = make_speculative_store(config).collect(
+                hook_input.get("session_id", ""), command, cwd, timeout=config.speculative_wait_seconds
+            )
+        if speculative is not None:
+            duration_ms = (time.perf_counter() - start_time) * 1000
+            action, reason = speculative
+            metrics.decision, metrics.source = action, "speculative"
+            return respond_with_decision(
+                action, reason, tool_name, tool_input_summary, duration_ms, source="speculative"
+            )
+
+    metrics.source = "llm"
+
     # Parse transcript for context
     last_user_prompt = None
     recent_operations: list[dict] = []
     if transcript_path:
-        last_user_prompt, recent_operations = parse_transcript(transcript_path)
+        with metrics.stage("transcript_parse"):
+            last_user_prompt, recent_operations = parse_transcript(
+                transcript_path, checkpoint_dir=config.state_dir / CHECKPOINT_DIR.name
+            )
 
     # Build the prompt for the validator
-    user_prompt = build_validator_prompt(
-        cwd=cwd,
-        last_user_prompt=last_user_prompt,
-        recent_operations=recent_operations,
-        tool_name=tool_name,
-        tool_input=tool_input,
-    )
+    with metrics.stage("prompt_build"):
+        user_prompt = build_validator_prompt(
+            cwd=cwd,
+            last_user_prompt=last_user_prompt,
+            recent_operations=recent_operations,
+            tool_name=tool_name,
+            tool_input=tool_input,
+        )
 
-    # Call Vertex AI
     start_time = time.perf_counter()
+    usage: dict[str, int] = {}
+
+    # Ask the fast model first - the configured model only gets what it isn't sure about
+    if config.routing_enabled:
+        try:
+            call_start = time.perf_counter()
+            with metrics.stage("api_call"):
+                response_text, usage = call_vertex_ai(
+                    config, FAST_TIER_SYSTEM_PROMPT, user_prompt, model=config.routing_fast_model
+                )
+            metrics.add_call(
+                config.routing_fast_model, "fast", usage, (time.perf_counter() - call_start) * 1000
+            )
+            with metrics.stage("parse"):
+                action, reason = parse_decision(response_text)
+                confidence = parse_confidence(response_text)
+            if action in FAST_TIER_FINAL_ACTIONS and confidence == "high":
+                duration_ms = (time.perf_counter() - start_time) * 1000
+                if decision_cache is not None:
+                    decision_cache.put(command, cwd, action, reason)
+                metrics.decision, metrics.tier = action, "fast"
+                return respond_with_decision(
+                    action, reason, tool_name, tool_input_summary, duration_ms, tier="fast", usage=usage
+                )
+        except Exception as e:
+            log_to_syslog(
+                tool_name,
+                tool_input_summary,
+                f"retrying with primary model (fast tier API error: {e})",
+                level=syslog.LOG_WARNING,
+                tier="fast",
+            )
+
+    tier = "primary" if config.routing_enabled else None
+    metrics.tier = tier
+
+    # Call Vertex AI
     try:
-        response_text = call_vertex_ai(config, VALIDATOR_SYSTEM_PROMPT, user_prompt)
+        call_start = time.perf_counter()
+        with metrics.stage("api_call"):
+            response_text, primary_usage = call_vertex_ai(config, VALIDATOR_SYSTEM_PROMPT, user_prompt)
+        metrics.add_call(config.model, tier, primary_usage, (time.perf_counter() - call_start) * 1000)
+        usage = add_usage(usage, primary_usage)
     except Exception as e:
         duration_ms = (time.perf_counter() - start_time) * 1000
+        metrics.decision = "apiError"
         log_to_syslog(
             tool_name,
             tool_input_summary,
             f"escalateToHuman (API error: {e})",
             duration_ms=duration_ms,
             level=syslog.LOG_ERR,
+            tier=tier,
         )
         return None
 
     duration_ms = (time.perf_counter() - start_time) * 1000
 
     # Parse the decision
-    action, reason = parse_decision(response_text)
+    with metrics.stage("parse"):
+        action, reason = parse_decision(response_text)
+    metrics.decision = action
 
-    if action == "allow":
-        log_to_syslog(tool_name, tool_input_summary, "allow", duration_ms=duration_ms)
-        return make_allow_response()
-    elif action == "denyWithReason":
-        log_to_syslog(
-            tool_name,
-            tool_input_summary,
-            f"denyWithReason: {reason}",
-            duration_ms=duration_ms,
-            level=syslog.LOG_WARNING,
-        )
-        return make_deny_response(reason or "Operation denied by AI validator.")
-    elif action == "escalateToHuman":
-        log_to_syslog(tool_name, tool_input_summary, "escalateToHuman", duration_ms=duration_ms)
-        return None
-    else:
-        # Parse error - escalate to human as safe fallback
-        log_to_syslog(
-            tool_name,
-            tool_input_summary,
-            "escalateToHuman (parse error)",
-            duration_ms=duration_ms,
-            level=syslog.LOG_WARNING,
+    if decision_cache is not None:
+        decision_cache.put(command, cwd, action, reason)
+
+    return respond_with_decision(
+        action, reason, tool_name, tool_input_summary, duration_ms, tier=tier, usage=usage
+    )
+
+
+def make_speculative_store(config: Config) -> SpeculativeStore:
+    """The speculative verdicts share the database with the decision cache."""
+    return SpeculativeStore(
+        config.state_dir / DECISION_CACHE_PATH.name,
+        pending_timeout=config.speculative_wait_seconds + 5,
+    )
+
+
+def decision_from_response(response: dict | None) -> tuple[str, str | None]:
+    """Turn a hook response back into the (action, reason) it was made from."""
+    decision = (response or {}).get("hookSpecificOutput", {}).get("decision", {})
+    if decision.get("behavior") == "allow":
+        return "allow", None
+    if decision.get("behavior") == "deny":
+        return "denyWithReason", decision.get("message")
+    return "escalateToHuman", None
+
+
+def prevalidate(hook_input: dict) -> None:
+    """
+    PreToolUse hook: start validating the tool use before the permission request.
+
+    The validation runs in a detached worker process, so the tool call isn't
+    held up. The PermissionRequest hook then collects the verdict (or waits for
+    it) instead of starting the LLM call from scratch. Requests the rules or
+    the decision cache answer are not worth a worker and are skipped.
+    """
+    if hook_input.get("tool_name", "") not in VALIDATED_TOOLS:
+        return
+
+    try:
+        config = load_config()
+    except (FileNotFoundError, ValueError):
+        return
+    if not config.speculative_enabled:
+        return
+
+    command = hook_input.get("tool_input", {}).get("command", "")
+    cwd = hook_input.get("cwd", "")
+
+    if config.rules_enabled:
+        rule_set = compile_rules(tuple(config.rules_allow), tuple(config.rules_escalate))
+        if rule_set.evaluate(command, cwd) is not None:
+            return
+    if config.cache_enabled:
+        decision_cache = DecisionCache(
+            config.state_dir / DECISION_CACHE_PATH.name,
+            ttl_seconds=config.cache_ttl_seconds,
+            max_entries=config.cache_max_entries,
         )
-        return None
+        if decision_cache.get(command, cwd) is not None:
+            return
+
+    store = make_speculative_store(config)
+    session_id = hook_input.get("session_id", "")
+    if not store.claim(session_id, command, cwd):
+        return
+
+    worker = subprocess.Popen(
+        [sys.executable, "-m", "claude_code_tool_use_validator.cli", "prevalidate-worker"],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    store.assign(session_id, command, cwd, worker.pid)
+    worker.stdin.write(json.dumps(hook_input).encode("utf-8"))
+    worker.stdin.close()
+
+
+def run_prevalidation_worker(hook_input: dict) -> None:
+    """Validate the tool use claimed by `prevalidate` and store the verdict."""
+    session_id = hook_input.get("session_id", "")
+    command = hook_input.get("tool_input", {}).get("command", "")
+    cwd = hook_input.get("cwd", "")
+
+    try:
+        config = load_config()
+    except (FileNotFoundError, ValueError):
+        config = Config(project_id="")
+    store = make_speculative_store(config)
+
+    try:
+        try:
+            response = request_evaluation(hook_input)
+        except DaemonUnavailable:
+            response = evaluate_tool_use(hook_input)
+    except Exception:
+        store.abandon(session_id, command, cwd)
+        return
+
+    store.complete(session_id, command, cwd, *decision_from_response(response))
 
 
 def verify_api() -> None:
@@ -500,7 +858,7 @@ def verify_api() -> None:
 
     print("\nTesting API call...")
     try:
-        client = AnthropicVertex(project_id=config.project_id, region=config.region)
+        client = get_client(config)
         response = client.messages.create(
             model=config.model,
             max_tokens=50,
@@ -530,6 +888,24 @@ def main() -> None:
         verify_api()
         return
 
+    # Check for serve subcommand
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        serve(evaluate_tool_use)
+        return
+
+    # Check for stats subcommand
+    if len(sys.argv) > 1 and sys.argv[1] == "stats":
+        print_stats(sys.argv[2:])
+        return
+
+    # Check for bench subcommand
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        # Imported here, the bench module itself builds on this one
+        from claude_code_tool_use_validator.bench import run_bench
+
+        run_bench(sys.argv[2:])
+        return
+
     # Normal hook mode: read JSON from stdin
     try:
         raw_input = sys.stdin.read()
@@ -538,9 +914,24 @@ def main() -> None:
         print(f"Failed to parse hook input: {e}", file=sys.stderr)
         sys.exit(1)
 
-    # Evaluate the tool use
+    # PreToolUse hook mode: start the validation speculatively, never block the tool call
+    if len(sys.argv) > 1 and sys.argv[1] == "prevalidate":
+        try:
+            prevalidate(hook_input)
+        except Exception as e:
+            print(f"Prevalidation error: {e}", file=sys.stderr)
+        sys.exit(0)
+
+    if len(sys.argv) > 1 and sys.argv[1] == "prevalidate-worker":
+        run_prevalidation_worker(hook_input)
+        sys.exit(0)
+
+    # Evaluate the tool use, preferring a running daemon over in-process evaluation
     try:
-        response = evaluate_tool_use(hook_input)
+        try:
+            response = request_evaluation(hook_input)
+        except DaemonUnavailable:
+            response = evaluate_tool_use(hook_input)
     except Exception as e:
         print(f"Evaluation error: {e}", file=sys.stderr)
         sys.exit(1)
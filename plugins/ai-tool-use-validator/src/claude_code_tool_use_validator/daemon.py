@@ -0,0 +1,149 @@
+"""
+Long-lived validator daemon and its Unix socket client.
+
+Every PermissionRequest hook starts a fresh process. Importing the anthropic
+SDK and building a new HTTP client (with a fresh TLS handshake) costs hundreds
+of milliseconds before any inference runs. `claude-code-tool-use-validator serve`
+keeps one warm process around; the hook invocation then only forwards the hook
+JSON over a Unix socket and prints the answer.
+
+Protocol: the client sends the hook input JSON and shuts down its write side,
+the daemon replies with `{"response": <hook response or null>}` or
+`{"error": "<message>"}` and closes the connection.
+"""
+
+import json
+import os
+import socket
+import socketserver
+import sys
+from collections.abc import Callable
+from pathlib import Path
+
+from claude_code_tool_use_validator.cache import CACHE_DIR
+
+SOCKET_PATH = CACHE_DIR / "validator.sock"
+
+# How long the client waits to connect - the daemon is local, so this only
+# guards against a wedged socket
+CONNECT_TIMEOUT = 0.5
+
+# Stay below the 30s hook timeout from hooks.json
+RESPONSE_TIMEOUT = 28.0
+
+MAX_MESSAGE_SIZE = 16 * 1024 * 1024
+
+
+class DaemonUnavailable(Exception):
+    """Raised when no daemon is listening, so the caller should evaluate in-process."""
+
+
+def _read_all(sock: socket.socket) -> bytes:
+    chunks = []
+    size = 0
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > MAX_MESSAGE_SIZE:
+            raise ValueError("Message too large")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def request_evaluation(hook_input: dict, socket_path: Path = SOCKET_PATH) -> dict | None:
+    """
+    Forward the hook input to the daemon and return its hook response.
+
+    Raises DaemonUnavailable if no daemon accepts the connection. Once the
+    request was handed over, failures are not retried in-process - the daemon
+    may already be calling the API, and a second call would blow the hook timeout.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(CONNECT_TIMEOUT)
+        try:
+            sock.connect(str(socket_path))
+        except OSError as e:
+            raise DaemonUnavailable(str(e)) from e
+
+        sock.settimeout(RESPONSE_TIMEOUT)
+        sock.sendall(json.dumps(hook_input).encode("utf-8"))
+        sock.shutdown(socket.SHUT_WR)
+        reply = json.loads(_read_all(sock) or b"{}")
+    finally:
+        sock.close()
+
+    if "error" in reply:
+        raise RuntimeError(f"Daemon error: {reply['error']}")
+    return reply.get("response")
+
+
+class _ValidatorServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: Path, evaluate: Callable[[dict], dict | None]) -> None:
+        self.evaluate = evaluate
+        super().__init__(str(socket_path), _ValidatorRequestHandler)
+
+
+class _ValidatorRequestHandler(socketserver.BaseRequestHandler):
+    server: _ValidatorServer
+
+    def handle(self) -> None:
+        try:
+            hook_input = json.loads(_read_all(self.request) or b"{}")
+            reply = {"response": self.server.evaluate(hook_input)}
+        except Exception as e:
+            reply = {"error": str(e)}
+
+        try:
+            self.request.sendall(json.dumps(reply).encode("utf-8"))
+        except OSError:
+            # Client gave up (hook timeout) - nothing left to do
+            pass
+
+
+def _remove_stale_socket(socket_path: Path) -> None:
+    """Remove a socket file left behind by a dead daemon, refuse to start if one is alive."""
+    if not socket_path.exists():
+        return
+
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.settimeout(CONNECT_TIMEOUT)
+        probe.connect(str(socket_path))
+    except OSError:
+        socket_path.unlink()
+        return
+    finally:
+        probe.close()
+
+    print(f"Validator daemon is already running on {socket_path}", file=sys.stderr)
+    sys.exit(1)
+
+
+def serve(evaluate: Callable[[dict], dict | None], socket_path: Path = SOCKET_PATH) -> None:
+    """Run the validator daemon in the foreground until interrupted."""
+    socket_path.parent.mkdir(parents=True, exist_ok=True)
+    _remove_stale_socket(socket_path)
+
+    # Only the current user may talk to the daemon
+    old_umask = os.umask(0o177)
+    try:
+        server = _ValidatorServer(socket_path, evaluate)
+    finally:
+        os.umask(old_umask)
+
+    print(f"Validator daemon listening on {socket_path}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        try:
+            socket_path.unlink()
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,225 @@
+"""
+Structured per-request metrics and the `stats` report.
+
+Every validated request appends one JSON line to
+`~/.cache/claude-code-tool-use-validator/events.jsonl` with per-stage timings,
+the decision, where it came from (rule, cache or LLM) and the token usage of
+each API call. `claude-code-tool-use-validator stats` aggregates the events
+into latency percentiles, the decision mix and the cost per tool.
+"""
+
+import argparse
+import json
+import math
+import os
+import time
+from collections import Counter, defaultdict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+from claude_code_tool_use_validator.cache import CACHE_DIR
+
+EVENTS_PATH = CACHE_DIR / "events.jsonl"
+
+# The events file is rotated (one backup is kept) once it grows past this size
+MAX_EVENTS_BYTES = 20 * 1024 * 1024
+
+STAGES = (
+    "config_load",
+    "rules",
+    "cache_lookup",
+    "speculative_wait",
+    "transcript_parse",
+    "prompt_build",
+    "api_call",
+    "parse",
+)
+
+# USD per million tokens (input, output) by model ID prefix.
+# Cache reads cost 0.1x and cache writes 1.25x the input price.
+MODEL_PRICES = {
+    "claude-opus-4-5": (5.0, 25.0),
+    "claude-opus-4": (15.0, 75.0),
+    "claude-sonnet-4": (3.0, 15.0),
+    "claude-3-7-sonnet": (3.0, 15.0),
+    "claude-3-5-sonnet": (3.0, 15.0),
+    "claude-haiku-4-5": (1.0, 5.0),
+    "claude-3-5-haiku": (0.8, 4.0),
+    "claude-3-haiku": (0.25, 1.25),
+}
+
+
+class RequestMetrics:
+    """Timings, usage and outcome of a single validation request."""
+
+    def __init__(self, tool_name: str) -> None:
+        self.tool_name = tool_name
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.stages: dict[str, float] = {}
+        self.calls: list[dict] = []
+        self.decision: str | None = None
+        self.source: str | None = None
+        self.tier: str | None = None
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time a stage of the request, repeated stages are summed."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+    def add_call(self, model: str, tier: str | None, usage: dict[str, int], duration_ms: float) -> None:
+        """Record one API call."""
+        self.calls.append({"model": model, "tier": tier, "usage": usage, "duration_ms": round(duration_ms, 1)})
+
+    def to_event(self) -> dict:
+        return {
+            "ts": round(self.started_at, 3),
+            "tool": self.tool_name,
+            "decision": self.decision,
+            "source": self.source,
+            "tier": self.tier,
+            "duration_ms": round((time.perf_counter() - self._start) * 1000, 1),
+            "stages": {name: round(ms, 2) for name, ms in self.stages.items()},
+            "calls": self.calls,
+        }
+
+    def record(self, path: Path = EVENTS_PATH) -> None:
+        """Append the event to the events file. Best-effort, never raises."""
+        line = json.dumps(self.to_event()) + "\n"
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                if path.stat().st_size > MAX_EVENTS_BYTES:
+                    os.replace(path, path.with_name(path.name + ".1"))
+            except FileNotFoundError:
+                pass
+            # A single O_APPEND write keeps concurrent hook processes from interleaving lines
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            try:
+                os.write(fd, line.encode("utf-8"))
+            finally:
+                os.close(fd)
+        except OSError:
+            pass
+
+
+def read_events(path: Path = EVENTS_PATH, since: float = 0.0) -> list[dict]:
+    """Read events (including the rotated backup) newer than the given timestamp."""
+    events = []
+    for events_path in (path.with_name(path.name + ".1"), path):
+        try:
+            with open(events_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if event.get("ts", 0) >= since:
+                        events.append(event)
+        except FileNotFoundError:
+            continue
+    return events
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct * len(ordered) / 100))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def estimate_cost(model: str, usage: dict[str, int]) -> float | None:
+    """Estimate the USD cost of a call, None for models without a known price."""
+    model_id = model.split("@", 1)[0]
+    for prefix, (input_price, output_price) in MODEL_PRICES.items():
+        if model_id.startswith(prefix):
+            return (
+                usage.get("input_tokens", 0) * input_price
+                + usage.get("cache_read_input_tokens", 0) * input_price * 0.1
+                + usage.get("cache_creation_input_tokens", 0) * input_price * 1.25
+                + usage.get("output_tokens", 0) * output_price
+            ) / 1_000_000
+    return None
+
+
+def format_stats(events: list[dict]) -> str:
+    """Render the stats report."""
+    if not events:
+        return "No events recorded."
+
+    lines = [f"Requests: {len(events)}", ""]
+
+    lines.append(f"{'Latency (ms)':<20} {'count':>7} {'p50':>8} {'p95':>8} {'p99':>8}")
+    by_source: dict[str, list[float]] = defaultdict(list)
+    for event in events:
+        by_source[event.get("source") or "unknown"].append(event.get("duration_ms", 0.0))
+    all_durations = [event.get("duration_ms", 0.0) for event in events]
+    for name, durations in [("all", all_durations)] + sorted(by_source.items()):
+        lines.append(
+            f"  {name:<18} {len(durations):>7} {percentile(durations, 50):>8.0f} "
+            f"{percentile(durations, 95):>8.0f} {percentile(durations, 99):>8.0f}"
+        )
+
+    lines.append("")
+    lines.append(f"{'Stages (ms)':<20} {'count':>7} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for stage in STAGES:
+        durations = [event["stages"][stage] for event in events if stage in event.get("stages", {})]
+        if durations:
+            lines.append(
+                f"  {stage:<18} {len(durations):>7} {percentile(durations, 50):>8.1f} "
+                f"{percentile(durations, 95):>8.1f} {percentile(durations, 99):>8.1f}"
+            )
+
+    lines.append("")
+    lines.append("Decisions")
+    decisions = Counter(event.get("decision") or "unknown" for event in events)
+    for decision, count in decisions.most_common():
+        lines.append(f"  {decision:<18} {count:>7} {count / len(events):>8.1%}")
+
+    lines.append("")
+    lines.append(
+        f"{'Cost per tool':<20} {'calls':>7} {'input':>10} {'output':>10} {'cache_rd':>10} {'cache_wr':>10} {'USD':>10}"
+    )
+    by_tool: dict[str, list[dict]] = defaultdict(list)
+    for event in events:
+        by_tool[event.get("tool") or "unknown"].extend(event.get("calls", []))
+    for tool, calls in sorted(by_tool.items()):
+        totals: Counter = Counter()
+        cost = 0.0
+        unpriced = False
+        for call in calls:
+            totals.update(call.get("usage", {}))
+            call_cost = estimate_cost(call.get("model", ""), call.get("usage", {}))
+            if call_cost is None:
+                unpriced = True
+            else:
+                cost += call_cost
+        cost_str = f"{cost:.4f}" + ("*" if unpriced else "")
+        lines.append(
+            f"  {tool:<18} {len(calls):>7} {totals['input_tokens']:>10} {totals['output_tokens']:>10} "
+            f"{totals['cache_read_input_tokens']:>10} {totals['cache_creation_input_tokens']:>10} {cost_str:>10}"
+        )
+    if any("*" in line for line in lines[-len(by_tool):]):
+        lines.append("  * includes calls to models without a known price")
+
+    return "\n".join(lines)
+
+
+def print_stats(argv: list[str]) -> None:
+    """Entry point of the `stats` subcommand."""
+    parser = argparse.ArgumentParser(
+        prog="claude-code-tool-use-validator stats",
+        description="Report validator latency, decision mix and cost",
+    )
+    parser.add_argument("--days", type=float, default=7, help="Only include the last N days (default: 7)")
+    args = parser.parse_args(argv)
+
+    since = time.time() - args.days * 24 * 3600 if args.days > 0 else 0.0
+    print(format_stats(read_events(since=since)))
@@ -0,0 +1,251 @@
+"""
+Deterministic local rules evaluated before the LLM.
+
+Most Bash requests are trivially classifiable: `git status`, `ls`, `pytest`
+are safe, `sudo` or `git push` always need a human. These cases are resolved
+locally without a network call. Everything the rules can't decide with
+certainty returns None and goes to the LLM.
+
+The rules only ever take the conservative route:
+- a command is allowed only if every segment of it matches an allow rule and
+  nothing in it could reach outside the working directory
+- a command is escalated if any segment matches an escalate rule
+- anything else (substitutions, redirections, variables, unknown commands) is
+  left for the LLM
+"""
+
+import functools
+import os
+import re
+import shlex
+
+DEFAULT_ALLOW_RULES = [
+    # Read-only commands
+    "cat",
+    "ls",
+    "pwd",
+    "head",
+    "tail",
+    "wc",
+    "grep",
+    "rg",
+    "find",
+    "tree",
+    "file",
+    "stat",
+    "diff",
+    "which",
+    "echo",
+    # Read-only git
+    "git status",
+    "git log",
+    "git diff",
+    "git show",
+    "git blame",
+    "git branch",
+    "git rev-parse",
+    "git ls-files",
+    # Git operations that don't push
+    "git add",
+    "git commit",
+    "git checkout",
+    "git switch",
+    # Build, test, lint, format
+    "pytest",
+    "python -m pytest",
+    "python3 -m pytest",
+    "ruff check",
+    "ruff format",
+    "mypy",
+    "eslint",
+    "npx eslint",
+    "prettier",
+    "npx prettier",
+    "npm test",
+    "npm run test",
+    "npm run lint",
+    "npm run build",
+    "cargo build",
+    "cargo check",
+    "cargo test",
+    "cargo clippy",
+    "cargo fmt",
+    "go build",
+    "go test",
+    "go vet",
+]
+
+DEFAULT_ESCALATE_RULES = [
+    "sudo",
+    "su",
+    "doas",
+    "git push",
+    "rm -rf /",
+    "rm -rf /*",
+    "rm -rf ~",
+    "rm -rf ~/",
+    "rm -rf ~/*",
+    "rm -fr /",
+    "rm -fr ~",
+    "dd",
+    "mkfs",
+    "shutdown",
+    "reboot",
+]
+
+# Arguments that turn an otherwise read-only command into something else,
+# also matched in the `--option=value` form
+UNSAFE_ARGUMENTS = {
+    "find": {"-delete", "-exec", "-execdir", "-ok", "-okdir", "-fprint", "-fprint0", "-fprintf", "-fls"},
+    # Runs the given command on every searched file
+    "rg": {"--pre"},
+}
+
+# Filters that truncate output - the LLM may want to teach the agent to redirect instead
+TRUNCATING_FILTERS = {"head", "tail"}
+
+# Redirections that are harmless and can be ignored by the rules. The target must end
+# the word, `> /dev/null.txt` writes a file
+HARMLESS_REDIRECT_PATTERN = re.compile(r"\s*(?:[12]?>\s*/dev/null|2>&1)(?=[\s;&|)]|$)")
+
+# Anything that makes the command's meaning depend on evaluation we don't do
+OPAQUE_PATTERN = re.compile(r"[$`<>]")
+
+# Tokens emitted by shlex for shell control operators
+SEPARATOR_TOKENS = {"&&", "||", ";", "&"}
+PIPE_TOKENS = {"|", "|&"}
+
+# Directories that are always considered safe to touch besides the CWD
+SAFE_DIRECTORIES = ("/tmp",)
+
+
+class _RuleTrie:
+    """Token prefix trie, so matching cost doesn't grow with the number of rules."""
+
+    _TERMINAL = ""
+
+    def __init__(self, rules: list[str]) -> None:
+        self._root: dict = {}
+        for rule in rules:
+            node = self._root
+            for token in shlex.split(rule):
+                node = node.setdefault(token, {})
+            node[self._TERMINAL] = True
+
+    def matches(self, tokens: list[str]) -> bool:
+        """Check whether any rule is a token prefix of the given command tokens."""
+        node = self._root
+        for token in tokens:
+            if self._TERMINAL in node:
+                return True
+            node = node.get(token)
+            if node is None:
+                return False
+        return self._TERMINAL in node
+
+
+class RuleSet:
+    """Compiled allow/escalate rules."""
+
+    def __init__(self, allow: list[str], escalate: list[str]) -> None:
+        self._allow = _RuleTrie(allow)
+        self._escalate = _RuleTrie(escalate)
+
+    def evaluate(self, command: str, cwd: str) -> str | None:
+        """
+        Classify a Bash command.
+
+        Returns:
+            - "allow": every segment is allowed and stays within the CWD
+            - "escalateToHuman": some segment matches an escalate rule
+            - None: the rules can't decide, ask the LLM
+        """
+        command = HARMLESS_REDIRECT_PATTERN.sub("", command)
+        pipelines = _split_command(command)
+        if pipelines is None:
+            return None
+
+        segments = [segment for pipeline in pipelines for segment in pipeline]
+        if any(self._escalate.matches(segment) for segment in segments):
+            return "escalateToHuman"
+
+        if not segments or OPAQUE_PATTERN.search(command):
+            return None
+
+        for pipeline in pipelines:
+            for index, segment in enumerate(pipeline):
+                if index > 0 and segment[0] in TRUNCATING_FILTERS:
+                    return None
+                if not self._allow.matches(segment):
+                    return None
+                if UNSAFE_ARGUMENTS.get(segment[0], set()).intersection(token.split("=", 1)[0] for token in segment):
+                    return None
+                if not all(_stays_within(token, cwd) for token in segment[1:]):
+                    return None
+
+        return "allow"
+
+
+def _split_command(command: str) -> list[list[list[str]]] | None:
+    """
+    Split a command into pipelines of segments of tokens.
+
+    `a | b && c` becomes `[[["a"], ["b"]], [["c"]]]`. Returns None if the
+    command can't be tokenized (e.g. unbalanced quotes), spans multiple lines
+    or contains empty pipeline stages.
+    """
+    if "\n" in command.strip():
+        return None
+
+    lexer = shlex.shlex(command, posix=True, punctuation_chars=";&|()<>")
+    lexer.whitespace_split = True
+
+    pipelines: list[list[list[str]]] = []
+    pipeline: list[list[str]] = []
+    segment: list[str] = []
+    try:
+        for token in lexer:
+            if token in SEPARATOR_TOKENS or token in PIPE_TOKENS:
+                if not segment:
+                    if token in SEPARATOR_TOKENS and not pipeline:
+                        continue
+                    return None
+                pipeline.append(segment)
+                segment = []
+                if token in SEPARATOR_TOKENS:
+                    pipelines.append(pipeline)
+                    pipeline = []
+            else:
+                segment.append(token)
+    except ValueError:
+        return None
+
+    if segment:
+        pipeline.append(segment)
+    elif pipeline:
+        # Trailing pipe
+        return None
+    if pipeline:
+        pipelines.append(pipeline)
+    return pipelines
+
+
+def _stays_within(token: str, cwd: str) -> bool:
+    """Check that a path-like argument doesn't point outside the CWD or /tmp."""
+    value = token.split("=", 1)[1] if token.startswith("-") and "=" in token else token
+    if value.startswith("~"):
+        return False
+    if not (value.startswith("/") or ".." in value.split("/")):
+        return True
+    if not cwd:
+        return False
+
+    path = os.path.normpath(os.path.join(cwd, value))
+    roots = (os.path.normpath(cwd),) + SAFE_DIRECTORIES
+    return any(path == root or path.startswith(root.rstrip("/") + "/") for root in roots)
+
+
+@functools.lru_cache(maxsize=8)
+def compile_rules(allow: tuple[str, ...], escalate: tuple[str, ...]) -> RuleSet:
+    """Compile (and memoize) a rule set, so the daemon builds it only once."""
+    return RuleSet(list(allow), list(escalate))
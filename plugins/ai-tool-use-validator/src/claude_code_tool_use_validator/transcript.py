@@ -0,0 +1,252 @@
+"""
+Incremental reader for Claude Code session transcripts.
+
+The validator only needs the last user prompt and the last few tool uses, but
+session transcripts (JSONL) grow to tens of megabytes. Instead of parsing the
+whole file on every permission request, the transcript is read backwards from
+the end until enough context is found. The parsed tail is checkpointed together
+with the byte offset it covers, so the next request only parses lines appended
+since then.
+"""
+
+import hashlib
+import json
+import os
+import time
+from collections.abc import Iterator
+from pathlib import Path
+from typing import BinaryIO
+
+from claude_code_tool_use_validator.cache import CACHE_DIR
+
+CHECKPOINT_DIR = CACHE_DIR / "transcripts"
+
+# How many recent tool uses are given to the validator as context
+MAX_RECENT_OPERATIONS = 10
+
+# Tool results longer than this are truncated
+MAX_RESULT_LENGTH = 500
+
+READ_BLOCK_SIZE = 64 * 1024
+
+# Checkpoints of sessions not touched for this long are removed
+CHECKPOINT_MAX_AGE_SECONDS = 7 * 24 * 3600
+
+
+class _TranscriptTail:
+    """The parsed context: last user prompt and the most recent tool uses (oldest first)."""
+
+    def __init__(self, last_user_prompt: str | None = None, tool_uses: list[dict] | None = None) -> None:
+        self.last_user_prompt = last_user_prompt
+        self.tool_uses = tool_uses if tool_uses is not None else []
+
+    def apply(self, entry: dict) -> None:
+        """Update the tail with an entry appended to the transcript."""
+        if entry.get("type") == "assistant":
+            for block in _content_blocks(entry, "tool_use"):
+                self.tool_uses.append(
+                    {"id": block.get("id"), "name": block.get("name"), "input": block.get("input", {})}
+                )
+            del self.tool_uses[:-MAX_RECENT_OPERATIONS]
+        elif entry.get("type") == "user":
+            content = entry.get("message", {}).get("content")
+            if isinstance(content, str):
+                self.last_user_prompt = content
+            for block in _content_blocks(entry, "tool_result"):
+                tool_id = block.get("tool_use_id")
+                for tool_use in self.tool_uses:
+                    if tool_id and tool_use["id"] == tool_id:
+                        tool_use["result"] = _truncate_result(block.get("content"))
+
+    def to_operations(self) -> list[dict]:
+        operations = []
+        for tool_use in self.tool_uses:
+            operation = {"tool_name": tool_use["name"], "tool_input": tool_use["input"]}
+            if "result" in tool_use:
+                operation["result"] = tool_use["result"]
+            operations.append(operation)
+        return operations
+
+
+def _content_blocks(entry: dict, block_type: str) -> list[dict]:
+    content = entry.get("message", {}).get("content", [])
+    if not isinstance(content, list):
+        return []
+    return [block for block in content if isinstance(block, dict) and block.get("type") == block_type]
+
+
+def _truncate_result(result_content):
+    if isinstance(result_content, str) and len(result_content) > MAX_RESULT_LENGTH:
+        return result_content[:MAX_RESULT_LENGTH] + "... (truncated)"
+    return result_content
+
+
+def _parse_line(line: bytes) -> dict | None:
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        entry = json.loads(line)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+    return entry if isinstance(entry, dict) else None
+
+
+def _iter_lines_reversed(f: BinaryIO, end: int) -> Iterator[bytes]:
+    """Yield the complete lines of f[:end] from the last one to the first."""
+    position = end
+    remainder = b""
+    while position > 0:
+        size = min(READ_BLOCK_SIZE, position)
+        position -= size
+        f.seek(position)
+        block = f.read(size) + remainder
+        lines = block.split(b"\n")
+        # The first piece may be the tail of a line that starts in an earlier block
+        remainder = lines.pop(0)
+        yield from reversed(lines)
+    if remainder:
+        yield remainder
+
+
+def _read_tail_backwards(f: BinaryIO, end: int) -> _TranscriptTail:
+    """Scan backwards from end until the last prompt and enough tool uses are found."""
+    tail = _TranscriptTail()
+    results: dict[str, dict] = {}
+    tool_uses_reversed: list[dict] = []
+
+    for line in _iter_lines_reversed(f, end):
+        if tail.last_user_prompt is not None and len(tool_uses_reversed) >= MAX_RECENT_OPERATIONS:
+            break
+
+        entry = _parse_line(line)
+        if entry is None:
+            continue
+
+        if entry.get("type") == "user":
+            content = entry.get("message", {}).get("content")
+            if isinstance(content, str) and tail.last_user_prompt is None:
+                tail.last_user_prompt = content
+            for block in _content_blocks(entry, "tool_result"):
+                tool_id = block.get("tool_use_id")
+                if tool_id:
+                    # Reading backwards, the first result seen is the latest one
+                    results.setdefault(tool_id, block)
+        elif entry.get("type") == "assistant" and len(tool_uses_reversed) < MAX_RECENT_OPERATIONS:
+            tool_uses_reversed.extend(reversed(_content_blocks(entry, "tool_use")))
+
+    for block in reversed(tool_uses_reversed[:MAX_RECENT_OPERATIONS]):
+        tool_use = {"id": block.get("id"), "name": block.get("name"), "input": block.get("input", {})}
+        if tool_use["id"] and tool_use["id"] in results:
+            tool_use["result"] = _truncate_result(results[tool_use["id"]].get("content"))
+        tail.tool_uses.append(tool_use)
+
+    return tail
+
+
+def _read_tail_forward(f: BinaryIO, start: int, end: int, tail: _TranscriptTail) -> None:
+    """Apply the lines between start and end (both on line boundaries) to the tail."""
+    f.seek(start)
+    for line in f.read(end - start).split(b"\n"):
+        entry = _parse_line(line)
+        if entry is not None:
+            tail.apply(entry)
+
+
+def _complete_lines_end(f: BinaryIO, size: int) -> int:
+    """Return the offset just past the last newline, ignoring a partially written last line."""
+    position = size
+    while position > 0:
+        block_start = max(0, position - READ_BLOCK_SIZE)
+        f.seek(block_start)
+        block = f.read(position - block_start)
+        newline = block.rfind(b"\n")
+        if newline != -1:
+            return block_start + newline + 1
+        position = block_start
+    return 0
+
+
+def _checkpoint_path(checkpoint_dir: Path, transcript_path: str) -> Path:
+    digest = hashlib.sha256(os.path.abspath(transcript_path).encode("utf-8")).hexdigest()
+    return checkpoint_dir / f"{digest[:32]}.json"
+
+
+def _load_checkpoint(path: Path, inode: int, size: int) -> tuple[int, _TranscriptTail] | None:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (FileNotFoundError, PermissionError, OSError, json.JSONDecodeError):
+        return None
+
+    # A different or truncated file means the checkpoint no longer applies
+    if data.get("inode") != inode or data.get("offset", size + 1) > size:
+        return None
+    return data["offset"], _TranscriptTail(data.get("last_user_prompt"), data.get("tool_uses", []))
+
+
+def _save_checkpoint(path: Path, inode: int, offset: int, tail: _TranscriptTail) -> None:
+    try:
+        if not path.parent.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+        if not path.exists():
+            _prune_checkpoints(path.parent)
+
+        data = {
+            "inode": inode,
+            "offset": offset,
+            "last_user_prompt": tail.last_user_prompt,
+            "tool_uses": tail.tool_uses,
+        }
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except (OSError, TypeError, ValueError):
+        pass
+
+
+def _prune_checkpoints(checkpoint_dir: Path) -> None:
+    cutoff = time.time() - CHECKPOINT_MAX_AGE_SECONDS
+    for path in checkpoint_dir.glob("*.json"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except OSError:
+            pass
+
+
+def parse_transcript(
+    transcript_path: str,
+    checkpoint_dir: Path | None = None,
+) -> tuple[str | None, list[dict]]:
+    """
+    Parse the JSONL transcript to extract context.
+
+    Only the end of the transcript is read. With a checkpoint_dir, the parsed
+    tail is checkpointed and later calls only parse newly appended lines.
+
+    Returns:
+        - last_user_prompt: The last user message with string content
+        - recent_operations: List of recent tool_use/tool_result pairs
+    """
+    try:
+        with open(transcript_path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            end = _complete_lines_end(f, stat.st_size)
+
+            checkpoint_path = _checkpoint_path(checkpoint_dir, transcript_path) if checkpoint_dir else None
+            checkpoint = _load_checkpoint(checkpoint_path, stat.st_ino, end) if checkpoint_path else None
+
+            if checkpoint is not None:
+                offset, tail = checkpoint
+                _read_tail_forward(f, offset, end, tail)
+            else:
+                tail = _read_tail_backwards(f, end)
+    except (FileNotFoundError, PermissionError, OSError):
+        return None, []
+
+    if checkpoint_path is not None and (checkpoint is None or checkpoint[0] != end):
+        _save_checkpoint(checkpoint_path, stat.st_ino, end, tail)
+
+    return tail.last_user_prompt, tail.to_operations()
@@ -0,0 +1,137 @@
+"""Tests for the offline replay benchmark and its stub Messages API."""
+
+import dataclasses
+import json
+import re
+import threading
+
+import pytest
+
+from claude_code_tool_use_validator import bench
+from claude_code_tool_use_validator.bench import CannedResponse, StubMessagesServer, load_corpus, replay_case
+from claude_code_tool_use_validator.cli import Config
+
+pytest.importorskip("anthropic")
+
+RESPONSES = [
+    {"match": "make deploy", "response": 'Deploys are risky. <decision action="denyWithReason">Ask first</decision>'},
+    {"match": "make build", "model": "claude-haiku", "response": '<decision action="allow" confidence="high" />'},
+    {"match": "make build", "response": '<decision action="allow" />'},
+]
+
+
+def hook_input(command: str, tool_name: str = "Bash") -> dict:
+    return {"tool_name": tool_name, "tool_input": {"command": command}, "cwd": "/repo", "transcript_path": "session.jsonl"}
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    corpus_dir = tmp_path / "corpus"
+    (corpus_dir / "nested").mkdir(parents=True)
+    (corpus_dir / "responses.json").write_text(json.dumps(RESPONSES))
+    (corpus_dir / "deploy.json").write_text(json.dumps(hook_input("make deploy")))
+    (corpus_dir / "nested" / "build.json").write_text(json.dumps(hook_input("make build")))
+    (corpus_dir / "unknown.json").write_text(json.dumps(hook_input("./run.sh")))
+    (corpus_dir / "read.json").write_text(json.dumps(hook_input("", tool_name="Read")))
+    (corpus_dir / "nested" / "session.jsonl").write_text(
+        json.dumps({"type": "user", "message": {"content": "Build it"}}) + "\n"
+    )
+    return corpus_dir
+
+
+@pytest.fixture
+def stub():
+    server = StubMessagesServer(
+        [CannedResponse(re.compile(entry["match"]), entry["response"], entry.get("model")) for entry in RESPONSES],
+        latency_ms=0,
+        chunk_delay_ms=0,
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def stub_config(stub: StubMessagesServer, tmp_path, **changes) -> Config:
+    config = Config(
+        project_id="bench",
+        region="bench",
+        base_url=stub.base_url,
+        access_token="bench",
+        state_dir=tmp_path,
+        rules_enabled=False,
+        cache_enabled=False,
+    )
+    return dataclasses.replace(config, **changes)
+
+
+def test_load_corpus(corpus):
+    cases = dict(load_corpus(corpus))
+    assert sorted(cases) == ["deploy", "nested/build", "read", "unknown"]
+    assert cases["nested/build"]["transcript_path"] == str(corpus / "nested" / "session.jsonl")
+
+
+@pytest.mark.parametrize("streaming", [True, False])
+def test_replay_against_stub(stub, tmp_path, streaming):
+    config = stub_config(stub, tmp_path, streaming=streaming)
+
+    deny = replay_case("deploy", hook_input("make deploy"), config, run=0)
+    assert (deny["case"], deny["run"], deny["decision"], deny["source"]) == ("deploy", 0, "denyWithReason", "llm")
+    assert set(deny["stages"]) >= {"prompt_build", "api_call", "parse"}
+    assert deny["calls"][0]["usage"]["cache_creation_input_tokens"] > 0
+
+    # The second call reads the system prompt and stable prefix from the stub's prompt cache
+    allow = replay_case("build", hook_input("make build"), config, run=0)
+    assert allow["decision"] == "allow"
+    assert allow["calls"][0]["usage"]["cache_read_input_tokens"] > 0
+
+    assert replay_case("unknown", hook_input("./run.sh"), config, run=0)["decision"] == "escalateToHuman"
+    assert replay_case("read", hook_input("", tool_name="Read"), config, run=0)["decision"] == "passthrough"
+    assert stub.requests == 3
+
+
+def test_stub_picks_responses_per_model(stub, tmp_path):
+    config = stub_config(stub, tmp_path, routing_enabled=True)
+    result = replay_case("build", hook_input("make build"), config, run=0)
+    assert result["decision"] == "allow"
+    assert result["tier"] == "fast"
+    assert [call["model"] for call in result["calls"]] == [config.routing_fast_model]
+
+    # No fast-tier entry for deploys, the default escalation sends it to the primary model
+    result = replay_case("deploy", hook_input("make deploy"), config, run=0)
+    assert [call["tier"] for call in result["calls"]] == ["fast", "primary"]
+    assert result["decision"] == "denyWithReason"
+
+
+def test_run_bench_saves_and_compares(corpus, tmp_path, capsys):
+    first = tmp_path / "first.json"
+    bench.run_bench([str(corpus), "--latency-ms", "0", "--chunk-delay-ms", "0", "--repeat", "2", "--output", str(first)])
+    output = capsys.readouterr().out
+    assert "Cases: 4 x 2 runs, concurrency 1" in output
+    # The second run only asks about the escalation again, the rest is served from the decision cache
+    assert "4 API calls" in output
+
+    saved = json.loads(first.read_text())
+    assert len(saved["cases"]) == 8
+    decisions = {case["case"]: case["decision"] for case in saved["cases"] if case["run"] == 0}
+    assert decisions == {
+        "deploy": "denyWithReason",
+        "nested/build": "allow",
+        "read": "passthrough",
+        "unknown": "escalateToHuman",
+    }
+
+    (corpus / "responses.json").write_text(json.dumps(RESPONSES[1:]))
+    bench.run_bench(
+        [str(corpus), "--latency-ms", "0", "--chunk-delay-ms", "0", "--concurrency", "4", "--compare", str(first)]
+    )
+    output = capsys.readouterr().out
+    assert "Decision changes vs" in output
+    assert "  deploy: denyWithReason -> escalateToHuman" in output
+
+
+def test_compare_results():
+    previous = {"cases": [{"case": "a", "run": 1, "decision": "deny"}, {"case": "a", "run": 0, "decision": "allow"}]}
+    results = [{"case": "a", "run": 0, "decision": "allow"}, {"case": "b", "run": 0, "decision": "allow"}]
+    assert bench.compare_results(previous, results) == ["  b: new case -> allow"]
+    assert bench.compare_results({"cases": results}, []) == ["  a: allow -> missing", "  b: allow -> missing"]
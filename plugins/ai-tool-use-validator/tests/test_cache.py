@@ -0,0 +1,231 @@
+"""Tests for the decision cache and the speculative verdict store."""
+
+import os
+import subprocess
+import threading
+import time
+import types
+
+import pytest
+
+from claude_code_tool_use_validator import cache
+from claude_code_tool_use_validator.cache import (
+    DecisionCache,
+    SpeculativeStore,
+    make_cache_key,
+    normalize_command,
+    unwrap_command,
+)
+
+TOTO = f"python3 {cache.CLAUDE_PLUGINS_DIR}/cache/fprochazka-claude-code-plugins/llm-toto/0.2.0/scripts/llm-toto.py --session 4f2a --"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A controllable time.time() for the cache module."""
+    now = [1_000_000.0]
+    fake_time = types.SimpleNamespace(time=lambda: now[0], monotonic=time.monotonic, sleep=time.sleep)
+    monkeypatch.setattr(cache, "time", fake_time)
+    return now
+
+
+def test_normalize_command_keeps_quoted_whitespace():
+    assert normalize_command("  git   status  ") == "git status"
+    assert normalize_command("echo 'a  b'") == "echo 'a  b'"
+    assert normalize_command("echo 'a  b'") != normalize_command("echo 'a b'")
+    assert make_cache_key("ls  -la", "/repo") == make_cache_key("ls -la", "/repo")
+    assert make_cache_key("ls", "/repo") != make_cache_key("ls", "/other")
+
+
+def test_decision_cache_round_trip(tmp_path):
+    decisions = DecisionCache(tmp_path / "decisions.sqlite3")
+    assert decisions.get("git status", "/repo") is None
+
+    decisions.put("git status", "/repo", "allow", None)
+    decisions.put("rm -rf build", "/repo", "denyWithReason", "Use make clean")
+    assert decisions.get("git  status", "/repo") == ("allow", None)
+    assert decisions.get("rm -rf build", "/repo") == ("denyWithReason", "Use make clean")
+    assert decisions.get("git status", "/elsewhere") is None
+
+
+def test_decision_cache_skips_escalations_and_errors(tmp_path):
+    decisions = DecisionCache(tmp_path / "decisions.sqlite3")
+    decisions.put("git push", "/repo", "escalateToHuman", None)
+    decisions.put("make", "/repo", "error", None)
+    assert decisions.get("git push", "/repo") is None
+    assert decisions.get("make", "/repo") is None
+
+
+def test_decision_cache_ttl(tmp_path, clock):
+    decisions = DecisionCache(tmp_path / "decisions.sqlite3", ttl_seconds=60)
+    decisions.put("git status", "/repo", "allow", None)
+
+    clock[0] += 59
+    assert decisions.get("git status", "/repo") == ("allow", None)
+    # Using an entry doesn't extend its lifetime
+    clock[0] += 2
+    assert decisions.get("git status", "/repo") is None
+
+
+def test_decision_cache_evicts_least_recently_used(tmp_path, clock):
+    decisions = DecisionCache(tmp_path / "decisions.sqlite3", max_entries=2)
+    decisions.put("a", "/repo", "allow", None)
+    clock[0] += 1
+    decisions.put("b", "/repo", "allow", None)
+    clock[0] += 1
+    assert decisions.get("a", "/repo") is not None
+    clock[0] += 1
+    decisions.put("c", "/repo", "allow", None)
+
+    assert decisions.get("a", "/repo") is not None
+    assert decisions.get("b", "/repo") is None
+    assert decisions.get("c", "/repo") is not None
+
+
+def test_decision_cache_unusable_database_is_a_miss(tmp_path):
+    path = tmp_path / "decisions.sqlite3"
+    path.write_bytes(b"not a database" * 100)
+    decisions = DecisionCache(path)
+    decisions.put("git status", "/repo", "allow", None)
+    assert decisions.get("git status", "/repo") is None
+
+
+def test_speculative_claim_once(tmp_path):
+    store = SpeculativeStore(tmp_path / "decisions.sqlite3")
+    assert store.claim("s1", "make lint", "/repo")
+    assert not store.claim("s1", "make  lint", "/repo")
+    assert store.claim("s2", "make lint", "/repo"), "keyed per session"
+
+
+def test_speculative_concurrent_claims(tmp_path):
+    """Of many hooks racing for the same command, exactly one wins the claim."""
+    store = SpeculativeStore(tmp_path / "decisions.sqlite3")
+    store.claim("warmup", "x", "/repo")  # create the schema before the race
+    results = []
+    barrier = threading.Barrier(8)
+
+    def claim():
+        barrier.wait()
+        results.append(SpeculativeStore(tmp_path / "decisions.sqlite3").claim("s", "make lint", "/repo"))
+
+    threads = [threading.Thread(target=claim) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results.count(True) == 1
+
+
+def test_speculative_collect_once(tmp_path):
+    store = SpeculativeStore(tmp_path / "decisions.sqlite3")
+    assert store.collect("s", "make lint", "/repo", timeout=0) is None
+
+    store.claim("s", "make lint", "/repo")
+    store.complete("s", "make lint", "/repo", "denyWithReason", "Use make check")
+    assert store.collect("s", "make lint", "/repo", timeout=0) == ("denyWithReason", "Use make check")
+    assert store.collect("s", "make lint", "/repo", timeout=0) is None
+    # Collected verdicts can be claimed again
+    assert store.claim("s", "make lint", "/repo")
+
+
+def test_speculative_claim_replaces_uncollected_verdict(tmp_path):
+    store = SpeculativeStore(tmp_path / "decisions.sqlite3")
+    store.claim("s", "make lint", "/repo")
+    store.complete("s", "make lint", "/repo", "allow", None)
+    assert store.claim("s", "make lint", "/repo")
+    assert store.collect("s", "make lint", "/repo", timeout=0) is None, "still pending"
+
+
+def test_speculative_collect_waits_for_pending(tmp_path):
+    store = SpeculativeStore(tmp_path / "decisions.sqlite3")
+    store.claim("s", "make lint", "/repo")
+    store.assign("s", "make lint", "/repo", os.getpid())
+    timer = threading.Timer(0.2, store.complete, ("s", "make lint", "/repo", "allow", None))
+    timer.start()
+    try:
+        assert store.collect("s", "make lint", "/repo", timeout=5) == ("allow", None)
+    finally:
+        timer.cancel()
+
+
+def test_speculative_collect_gives_up(tmp_path):
+    store = SpeculativeStore(tmp_path / "decisions.sqlite3")
+    store.claim("s", "make lint", "/repo")
+    start = time.monotonic()
+    assert store.collect("s", "make lint", "/repo", timeout=0.2) is None
+    assert time.monotonic() - start < 2
+
+
+def test_speculative_dead_worker_not_waited_for(tmp_path):
+    store = SpeculativeStore(tmp_path / "decisions.sqlite3")
+    worker = subprocess.Popen(["true"])
+    worker.wait()
+    store.claim("s", "make lint", "/repo")
+    store.assign("s", "make lint", "/repo", worker.pid)
+
+    start = time.monotonic()
+    assert store.collect("s", "make lint", "/repo", timeout=10) is None
+    assert time.monotonic() - start < 2
+    assert store.claim("s", "make lint", "/repo"), "the dead worker's claim was dropped"
+
+
+def test_speculative_abandon_and_stale_claims(tmp_path, clock):
+    store = SpeculativeStore(tmp_path / "decisions.sqlite3", pending_timeout=30, ttl_seconds=300)
+    store.claim("s", "make lint", "/repo")
+    store.abandon("s", "make lint", "/repo")
+    assert store.claim("s", "make lint", "/repo")
+
+    # A pending claim of a worker that never finished expires
+    clock[0] += 31
+    assert store.claim("s", "make lint", "/repo")
+
+    # An uncollected verdict expires too
+    store.complete("s", "make lint", "/repo", "allow", None)
+    clock[0] += 301
+    assert store.collect("s", "make lint", "/repo", timeout=0) is None
+
+
+def test_unwrap_command():
+    assert unwrap_command(f"{TOTO} make build") == "make build"
+    assert unwrap_command(f"cd app && {TOTO} ./mvnw package") == "cd app && ./mvnw package"
+    assert unwrap_command(f"{TOTO} 'curl -s $URL | jq .items'") == "curl -s $URL | jq .items"
+    assert unwrap_command(f"""{TOTO} 'echo '"'"'a | b'"'"' | wc -l' && {TOTO} make""") == "echo 'a | b' | wc -l && make"
+    assert unwrap_command(f"(cd api && {TOTO} go test ./...)") == "(cd api && go test ./...)"
+    assert unwrap_command(f"{TOTO} 'my script.sh' --fast") == "'my script.sh' --fast"
+    assert normalize_command(unwrap_command("make build 2>&1")) == "make build"
+    assert unwrap_command("echo '2>&1'") == "echo '2>&1'"
+    assert unwrap_command("make build") == "make build"
+    # Only the installed llm-toto script is unwrapped
+    assert unwrap_command("python3 /tmp/evil/llm-toto.py -- ls") == "python3 /tmp/evil/llm-toto.py -- ls"
+    escaped = f"python3 {cache.CLAUDE_PLUGINS_DIR}/../../../tmp/llm-toto/scripts/llm-toto.py -- ls"
+    assert unwrap_command(escaped) == escaped
+
+
+def test_speculative_key_matches_llm_toto_rewrite(tmp_path):
+    """The PreToolUse sees the command before llm-toto wraps it, the PermissionRequest after."""
+    store = SpeculativeStore(tmp_path / "decisions.sqlite3")
+    assert store.claim("s", "cd app && ./mvnw package 2>&1", "/repo")
+    store.complete("s", "cd app && ./mvnw package 2>&1", "/repo", "allow", None)
+    assert store.collect("s", f"cd app && {TOTO} ./mvnw package", "/repo", timeout=0) == ("allow", None)
+
+    assert store.claim("s", "curl -s $URL | jq .items", "/repo")
+    assert not store.claim("s", f"{TOTO} 'curl -s $URL | jq .items'", "/repo")
+
+
+def test_speculative_verdict_only_for_the_claimed_command(tmp_path):
+    """A command that merely shares the key doesn't get the verdict computed for another one."""
+    store = SpeculativeStore(tmp_path / "decisions.sqlite3")
+    store.claim("s", "make build", "/repo")
+    store.complete("s", "make build", "/repo", "allow", None)
+    assert store.collect("s", "make build 2>&1", "/repo", timeout=0) is None
+    assert store.collect("s", "make build", "/repo", timeout=0) == ("allow", None)
+
+    store.claim("s", "make build 2>&1", "/repo")
+    store.complete("s", "make build 2>&1", "/repo", "allow", None)
+    assert store.collect("s", "make build", "/repo", timeout=0) is None
+    assert store.collect("s", f"{TOTO} make build", "/repo", timeout=0) == ("allow", None)
+
+    store.claim("s", "ls", "/repo")
+    store.complete("s", "ls", "/repo", "allow", None)
+    assert store.collect("s", "python3 /tmp/evil/llm-toto.py -- ls", "/repo", timeout=0) is None
+    assert store.collect("s", "ls", "/repo", timeout=0) == ("allow", None)
@@ -0,0 +1,63 @@
+"""Tests for parsing the validator's responses."""
+
+from claude_code_tool_use_validator.cli import IncrementalDecisionParser, parse_confidence, parse_decision
+
+
+def feed_all(chunks: list[str]) -> tuple[bool, int]:
+    """Feed the chunks, return whether a decision was detected and after how many chunks."""
+    parser = IncrementalDecisionParser()
+    for index, chunk in enumerate(chunks, 1):
+        if parser.feed(chunk):
+            return True, index
+    return False, len(chunks)
+
+
+def test_parse_decision():
+    assert parse_decision('<decision action="allow"/>') == ("allow", None)
+    assert parse_decision('<decision action="escalateToHuman" confidence="low" />') == ("escalateToHuman", None)
+    assert parse_decision('<decision action="denyWithReason">Use make</decision>') == ("denyWithReason", "Use make")
+    assert parse_decision('<decision action="denyWithReason"></decision>') == ("error", None)
+    assert parse_decision('<decision action="allow"/><decision action="allow"/>') == ("error", None)
+    assert parse_decision("no decision") == ("error", None)
+
+
+def test_parse_confidence():
+    assert parse_confidence('<decision action="allow" confidence="high"/>') == "high"
+    assert parse_confidence('<decision action="denyWithReason" confidence="low">No</decision>') == "low"
+    assert parse_confidence('<decision action="allow"/>') is None
+    assert parse_confidence('<decision action="allow" confidence="medium"/>') is None
+    assert parse_confidence('<decision action="allow" confidence="high"/> <decision action="allow"/>') is None
+
+
+def test_incremental_parser_tag_split_across_chunks():
+    response = 'Reasoning first.\n<decision action="denyWithReason" confidence="high">Redirect to a file</decision> trailing'
+    tag_end = response.index("</decision>") + len("</decision>")
+    for split in range(1, len(response)):
+        parser = IncrementalDecisionParser()
+        assert parser.feed(response[:split]) == (split >= tag_end), split
+        assert parser.feed(response[split:]), split
+        assert parse_decision(parser.text) == ("denyWithReason", "Redirect to a file")
+
+    # Character by character, the decision is detected exactly when the closing tag is complete
+    detected, count = feed_all(list(response))
+    assert detected
+    assert count == tag_end
+
+
+def test_incremental_parser_self_closing_tag():
+    response = 'ok <decision action="allow" confidence="high" />'
+    detected, count = feed_all(list(response))
+    assert detected and count == len(response)
+
+    parser = IncrementalDecisionParser()
+    assert not parser.feed('<decision action="al')
+    assert not parser.feed('low"')
+    assert parser.feed("/>")
+    assert parse_decision(parser.text) == ("allow", None)
+
+
+def test_incremental_parser_without_decision():
+    parser = IncrementalDecisionParser()
+    for chunk in ["I think ", "<decisio", "n is hard", " to make"]:
+        assert not parser.feed(chunk)
+    assert parse_decision(parser.text) == ("error", None)
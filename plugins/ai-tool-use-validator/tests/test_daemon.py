@@ -0,0 +1,106 @@
+"""Tests for the validator daemon and the hook's fallback to in-process evaluation."""
+
+import io
+import json
+import threading
+
+import pytest
+
+from claude_code_tool_use_validator import cli, daemon
+from claude_code_tool_use_validator.daemon import DaemonUnavailable, request_evaluation
+
+HOOK_INPUT = {"tool_name": "Bash", "tool_input": {"command": "make lint"}, "cwd": "/repo"}
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    return tmp_path / "validator.sock"
+
+
+@pytest.fixture
+def running_daemon(socket_path):
+    """A daemon on a temporary socket, evaluating with a function the test can swap."""
+    requests = []
+
+    def evaluate(hook_input: dict) -> dict | None:
+        requests.append(hook_input)
+        if hook_input.get("fail"):
+            raise RuntimeError("boom")
+        return cli.make_allow_response() if hook_input["tool_input"]["command"] == "make lint" else None
+
+    server = daemon._ValidatorServer(socket_path, evaluate)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield requests
+    server.shutdown()
+    server.server_close()
+
+
+def run_hook(monkeypatch, capsys, hook_input: dict) -> tuple[int, str]:
+    """Run the hook entry point with the input on stdin, returns its exit code and stdout."""
+    monkeypatch.setattr("sys.argv", ["claude-code-tool-use-validator"])
+    monkeypatch.setattr("sys.stdin", io.StringIO(json.dumps(hook_input)))
+    with pytest.raises(SystemExit) as exit_info:
+        cli.main()
+    return exit_info.value.code, capsys.readouterr().out
+
+
+def test_round_trip(socket_path, running_daemon):
+    assert request_evaluation(HOOK_INPUT, socket_path) == cli.make_allow_response()
+    assert request_evaluation({"tool_name": "Bash", "tool_input": {"command": "make"}}, socket_path) is None
+    assert running_daemon[0] == HOOK_INPUT
+
+
+def test_daemon_errors_are_raised(socket_path, running_daemon):
+    with pytest.raises(RuntimeError, match="boom"):
+        request_evaluation(dict(HOOK_INPUT, fail=True), socket_path)
+    # The daemon keeps serving after a failed evaluation
+    assert request_evaluation(HOOK_INPUT, socket_path) == cli.make_allow_response()
+
+
+def test_unavailable_without_daemon(socket_path):
+    with pytest.raises(DaemonUnavailable):
+        request_evaluation(HOOK_INPUT, socket_path)
+
+    # A socket file left behind by a dead daemon
+    socket_path.touch()
+    with pytest.raises(DaemonUnavailable):
+        request_evaluation(HOOK_INPUT, socket_path)
+
+
+def test_hook_forwards_to_daemon(monkeypatch, capsys, socket_path, running_daemon):
+    monkeypatch.setattr(cli, "request_evaluation", lambda hook_input: request_evaluation(hook_input, socket_path))
+    monkeypatch.setattr(cli, "evaluate_tool_use", lambda hook_input: pytest.fail("evaluated in-process"))
+
+    exit_code, output = run_hook(monkeypatch, capsys, HOOK_INPUT)
+    assert exit_code == 0
+    assert json.loads(output) == cli.make_allow_response()
+    assert len(running_daemon) == 1
+
+
+def test_hook_falls_back_to_in_process_evaluation(monkeypatch, capsys, socket_path):
+    evaluated = []
+
+    def evaluate_tool_use(hook_input: dict) -> dict:
+        evaluated.append(hook_input)
+        return cli.make_deny_response("Use make check")
+
+    monkeypatch.setattr(cli, "request_evaluation", lambda hook_input: request_evaluation(hook_input, socket_path))
+    monkeypatch.setattr(cli, "evaluate_tool_use", evaluate_tool_use)
+
+    exit_code, output = run_hook(monkeypatch, capsys, HOOK_INPUT)
+    assert exit_code == 0
+    assert json.loads(output) == cli.make_deny_response("Use make check")
+    assert evaluated == [HOOK_INPUT]
+
+
+def test_serve_refuses_to_replace_a_running_daemon(socket_path, running_daemon):
+    with pytest.raises(SystemExit):
+        daemon._remove_stale_socket(socket_path)
+    assert request_evaluation(HOOK_INPUT, socket_path) == cli.make_allow_response()
+
+
+def test_serve_removes_a_stale_socket(socket_path):
+    socket_path.touch()
+    daemon._remove_stale_socket(socket_path)
+    assert not socket_path.exists()
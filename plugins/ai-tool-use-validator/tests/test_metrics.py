@@ -0,0 +1,134 @@
+"""Tests for the structured metrics events and the stats report."""
+
+import json
+
+import pytest
+
+from claude_code_tool_use_validator import metrics
+from claude_code_tool_use_validator.metrics import RequestMetrics, estimate_cost, format_stats, percentile, read_events
+
+USAGE = {"input_tokens": 1000, "output_tokens": 200, "cache_read_input_tokens": 0, "cache_creation_input_tokens": 0}
+
+
+def event(ts: float, duration_ms: float, decision: str = "allow", source: str = "llm", **extra) -> dict:
+    return dict({"ts": ts, "tool": "Bash", "decision": decision, "source": source, "duration_ms": duration_ms}, **extra)
+
+
+def write_events(path, events: list[dict]) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        for entry in events:
+            f.write(json.dumps(entry) + "\n")
+
+
+def test_request_metrics_event(tmp_path):
+    request = RequestMetrics("Bash")
+    with request.stage("api_call"):
+        pass
+    with request.stage("api_call"):
+        pass
+    request.add_call("claude-haiku-4-5@20251001", "fast", USAGE, 812.345)
+    request.decision, request.source, request.tier = "allow", "llm", "fast"
+
+    path = tmp_path / "events.jsonl"
+    request.record(path)
+    request.record(path)
+    lines = path.read_text().splitlines()
+    assert len(lines) == 2
+
+    recorded = json.loads(lines[0])
+    assert recorded["tool"] == "Bash"
+    assert (recorded["decision"], recorded["source"], recorded["tier"]) == ("allow", "llm", "fast")
+    assert list(recorded["stages"]) == ["api_call"]
+    assert recorded["calls"] == [
+        {"model": "claude-haiku-4-5@20251001", "tier": "fast", "usage": USAGE, "duration_ms": 812.3}
+    ]
+    assert recorded["duration_ms"] >= 0
+
+
+def test_stage_is_timed_when_it_raises():
+    request = RequestMetrics("Bash")
+    with pytest.raises(ValueError):
+        with request.stage("parse"):
+            raise ValueError
+    assert "parse" in request.stages
+
+
+def test_record_rotates_and_never_raises(tmp_path, monkeypatch):
+    path = tmp_path / "events.jsonl"
+    monkeypatch.setattr(metrics, "MAX_EVENTS_BYTES", 10)
+    write_events(path, [event(1.0, 100)])
+    RequestMetrics("Bash").record(path)
+
+    assert json.loads((tmp_path / "events.jsonl.1").read_text())["ts"] == 1.0
+    assert len(path.read_text().splitlines()) == 1
+
+    # An unwritable location is silently skipped
+    RequestMetrics("Bash").record(tmp_path / "events.jsonl" / "nested")
+
+
+def test_read_events_includes_backup_and_skips_broken_lines(tmp_path):
+    path = tmp_path / "events.jsonl"
+    write_events(tmp_path / "events.jsonl.1", [event(1.0, 100), event(2.0, 200)])
+    write_events(path, [event(3.0, 300)])
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"ts": 4.0, "trunc\n')
+
+    assert [entry["ts"] for entry in read_events(path)] == [1.0, 2.0, 3.0]
+    assert [entry["ts"] for entry in read_events(path, since=2.0)] == [2.0, 3.0]
+    assert read_events(tmp_path / "missing.jsonl") == []
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 99) == 99
+    assert percentile([5.0, 1.0, 3.0], 50) == 3.0
+    assert percentile([7.0], 99) == 7.0
+    assert percentile([], 50) == 0.0
+
+
+def test_estimate_cost():
+    assert estimate_cost("claude-haiku-4-5@20251001", USAGE) == pytest.approx((1000 * 1.0 + 200 * 5.0) / 1e6)
+    cached = {"input_tokens": 0, "output_tokens": 0, "cache_read_input_tokens": 1000, "cache_creation_input_tokens": 1000}
+    assert estimate_cost("claude-sonnet-4-5@20250929", cached) == pytest.approx((1000 * 0.3 + 1000 * 3.75) / 1e6)
+    # The most specific prefix wins
+    assert estimate_cost("claude-opus-4-5@20251101", USAGE) == pytest.approx((1000 * 5.0 + 200 * 25.0) / 1e6)
+    assert estimate_cost("gemini-2.5-pro", USAGE) is None
+
+
+def test_format_stats():
+    events = [event(float(i), float(i), source="rule") for i in range(1, 21)]
+    events.append(
+        event(
+            21.0,
+            900.0,
+            decision="denyWithReason",
+            stages={"api_call": 850.0},
+            calls=[{"model": "claude-haiku-4-5@20251001", "usage": USAGE}, {"model": "other-model", "usage": USAGE}],
+        )
+    )
+    report = format_stats(events).splitlines()
+
+    assert report[0] == "Requests: 21"
+    assert report[3].split() == ["all", "21", "11", "20", "900"]
+    assert report[4].split() == ["llm", "1", "900", "900", "900"]
+    assert report[5].split() == ["rule", "20", "10", "19", "20"]
+    assert ["api_call", "1", "850.0", "850.0", "850.0"] in [line.split() for line in report]
+    assert ["allow", "20", "95.2%"] in [line.split() for line in report]
+    assert ["Bash", "2", "2000", "400", "0", "0", "0.0020*"] in [line.split() for line in report]
+    assert report[-1] == "  * includes calls to models without a known price"
+
+    assert format_stats([]) == "No events recorded."
+
+
+def test_stats_command(tmp_path, monkeypatch, capsys):
+    path = tmp_path / "events.jsonl"
+    write_events(path, [event(1.0, 100.0), event(2_000_000_000.0, 250.0)])
+    monkeypatch.setattr(metrics, "read_events", lambda since: read_events(path, since=since))
+
+    metrics.print_stats(["--days", "0"])
+    assert capsys.readouterr().out.startswith("Requests: 2\n")
+
+    metrics.print_stats([])
+    assert capsys.readouterr().out.startswith("Requests: 1\n")
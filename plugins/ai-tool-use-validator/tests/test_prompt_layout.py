@@ -0,0 +1,95 @@
+"""Tests for the prompt-caching-aware layout of validator requests."""
+
+import types
+
+import pytest
+
+from claude_code_tool_use_validator import cli
+from claude_code_tool_use_validator.cli import Config, build_validator_prompt, call_vertex_ai
+
+OPERATIONS = [{"tool_name": "Bash", "tool_input": {"command": "make lint"}, "result": "ok"}]
+
+
+def build(command: str, operations: list[dict] = OPERATIONS, last_user_prompt: str | None = "Fix the build") -> list[dict]:
+    return build_validator_prompt(
+        cwd="/repo",
+        last_user_prompt=last_user_prompt,
+        recent_operations=operations,
+        tool_name="Bash",
+        tool_input={"command": command},
+    )
+
+
+def test_stable_prefix_carries_the_only_breakpoint():
+    blocks = build("make test")
+    assert len(blocks) == 2
+    stable, volatile = blocks
+    assert stable["cache_control"] == {"type": "ephemeral"}
+    assert "cache_control" not in volatile
+    assert stable["text"] == "<cwd>/repo</cwd>\n\n<last_user_prompt>\nFix the build\n</last_user_prompt>"
+
+
+def test_volatile_sections_come_last():
+    volatile = build("make test")[1]["text"]
+    assert volatile.index("<recent_operations>") < volatile.index("<current_tool_request>") < volatile.index("<task>")
+    assert "make lint" in volatile
+    assert '"command": "make test"' in volatile
+
+
+def test_prefix_is_identical_across_requests_of_a_session():
+    first = build("make test")
+    second = build("git status", OPERATIONS + [{"tool_name": "Bash", "tool_input": {"command": "make test"}}])
+    assert first[0] == second[0]
+    assert first[1] != second[1]
+
+    assert "Not available" in build("make test", last_user_prompt=None)[0]["text"]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """A fake SDK client that records the request and answers with a fixed usage."""
+    requests = []
+    usage = types.SimpleNamespace(
+        input_tokens=50, output_tokens=10, cache_read_input_tokens=1200, cache_creation_input_tokens=None
+    )
+
+    def create(**request):
+        requests.append(request)
+        return types.SimpleNamespace(content=[types.SimpleNamespace(text='<decision action="allow" />')], usage=usage)
+
+    fake = types.SimpleNamespace(messages=types.SimpleNamespace(create=create))
+    monkeypatch.setattr(cli, "get_client", lambda config: fake)
+    return requests
+
+
+def test_system_prompt_is_cached(client):
+    config = Config(project_id="test", streaming=False)
+    user_prompt = build("make test")
+    text, usage = call_vertex_ai(config, cli.VALIDATOR_SYSTEM_PROMPT, user_prompt)
+
+    assert text == '<decision action="allow" />'
+    request = client[0]
+    assert request["system"] == [
+        {"type": "text", "text": cli.VALIDATOR_SYSTEM_PROMPT, "cache_control": {"type": "ephemeral"}}
+    ]
+    assert request["messages"] == [{"role": "user", "content": user_prompt}]
+    # Missing counts in the SDK usage become zeros
+    assert usage == {
+        "input_tokens": 50,
+        "output_tokens": 10,
+        "cache_read_input_tokens": 1200,
+        "cache_creation_input_tokens": 0,
+    }
+
+
+def test_cache_usage_in_syslog_line(monkeypatch):
+    logged = []
+    monkeypatch.setattr(cli, "open_syslog", lambda: None)
+    monkeypatch.setattr(cli.syslog, "syslog", lambda level, message: logged.append(message))
+
+    usage = {"input_tokens": 50, "output_tokens": 10, "cache_read_input_tokens": 1200, "cache_creation_input_tokens": 0}
+    cli.log_to_syslog("Bash", "command=make test", "allow", duration_ms=812, usage=usage)
+    assert logged == [
+        "duration=812ms input_tokens=50 output_tokens=10 cache_read=1200 cache_creation=0 "
+        "tool=Bash decision=allow input=command=make test"
+    ]
@@ -0,0 +1,122 @@
+"""Tests for routing requests through the fast model tier first."""
+
+import pytest
+
+from claude_code_tool_use_validator import cli
+from claude_code_tool_use_validator.cli import Config, run_validation
+from claude_code_tool_use_validator.metrics import RequestMetrics
+
+FAST_MODEL = "claude-haiku-4-5@20251001"
+PRIMARY_MODEL = "claude-opus-4-5@20251101"
+
+HOOK_INPUT = {"tool_name": "Bash", "tool_input": {"command": "make deploy"}, "cwd": "/repo"}
+
+USAGE = {"input_tokens": 100, "output_tokens": 20, "cache_read_input_tokens": 0, "cache_creation_input_tokens": 0}
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """Canned responses per model, records the calls and the syslog lines."""
+    responses: dict[str, str | Exception] = {}
+    calls = []
+    logged = []
+
+    def call_vertex_ai(config, system_prompt, user_prompt, model=None):
+        model = model or config.model
+        calls.append((model, system_prompt))
+        response = responses[model]
+        if isinstance(response, Exception):
+            raise response
+        return response, dict(USAGE)
+
+    def log_to_syslog(tool_name, tool_input_summary, decision, duration_ms=None, level=None, tier=None, usage=None):
+        logged.append({"decision": decision, "tier": tier, "usage": usage})
+
+    monkeypatch.setattr(cli, "call_vertex_ai", call_vertex_ai)
+    monkeypatch.setattr(cli, "log_to_syslog", log_to_syslog)
+    return responses, calls, logged
+
+
+def validate(tmp_path, routing_enabled: bool = True) -> tuple[dict | None, RequestMetrics]:
+    config = Config(
+        project_id="test",
+        model=PRIMARY_MODEL,
+        routing_enabled=routing_enabled,
+        routing_fast_model=FAST_MODEL,
+        rules_enabled=False,
+        cache_enabled=False,
+        state_dir=tmp_path,
+    )
+    metrics = RequestMetrics("Bash")
+    return run_validation(HOOK_INPUT, metrics, config), metrics
+
+
+def test_confident_fast_verdict_is_final(tmp_path, api):
+    responses, calls, logged = api
+    responses[FAST_MODEL] = '<decision action="allow" confidence="high" />'
+
+    response, metrics = validate(tmp_path)
+    assert response == cli.make_allow_response()
+    assert [model for model, _ in calls] == [FAST_MODEL]
+    assert calls[0][1] == cli.FAST_TIER_SYSTEM_PROMPT
+    assert metrics.tier == "fast"
+    assert logged[-1]["tier"] == "fast"
+
+
+@pytest.mark.parametrize(
+    "fast_response",
+    [
+        '<decision action="allow" confidence="low" />',
+        '<decision action="denyWithReason">Use make check</decision>',
+        '<decision action="escalateToHuman" confidence="high" />',
+        "no decision at all",
+    ],
+)
+def test_unsure_fast_verdict_escalates_to_primary(tmp_path, api, fast_response):
+    responses, calls, logged = api
+    responses[FAST_MODEL] = fast_response
+    responses[PRIMARY_MODEL] = '<decision action="denyWithReason">Use make check</decision>'
+
+    response, metrics = validate(tmp_path)
+    assert response == cli.make_deny_response("Use make check")
+    assert [model for model, _ in calls] == [FAST_MODEL, PRIMARY_MODEL]
+    assert calls[1][1] == cli.VALIDATOR_SYSTEM_PROMPT
+    assert metrics.tier == "primary"
+    assert [call["tier"] for call in metrics.calls] == ["fast", "primary"]
+    # The syslog line carries the usage of both calls
+    assert logged[-1]["tier"] == "primary"
+    assert logged[-1]["usage"]["input_tokens"] == 200
+
+
+def test_fast_tier_error_falls_back_to_primary(tmp_path, api):
+    responses, calls, logged = api
+    responses[FAST_MODEL] = RuntimeError("overloaded")
+    responses[PRIMARY_MODEL] = '<decision action="allow" />'
+
+    response, metrics = validate(tmp_path)
+    assert response == cli.make_allow_response()
+    assert [model for model, _ in calls] == [FAST_MODEL, PRIMARY_MODEL]
+    assert "fast tier API error: overloaded" in logged[0]["decision"]
+    assert metrics.tier == "primary"
+
+
+def test_without_routing_only_the_configured_model_is_asked(tmp_path, api):
+    responses, calls, logged = api
+    responses[PRIMARY_MODEL] = '<decision action="allow" />'
+
+    response, metrics = validate(tmp_path, routing_enabled=False)
+    assert response == cli.make_allow_response()
+    assert [model for model, _ in calls] == [PRIMARY_MODEL]
+    assert metrics.tier is None
+    assert logged[-1]["tier"] is None
+
+
+def test_routing_config(tmp_path):
+    config_path = tmp_path / "config.toml"
+    config_path.write_text('project_id = "p"\n[routing]\nenabled = true\nfast_model = "claude-3-5-haiku@20241022"\n')
+    config = cli.load_config(config_path)
+    assert config.routing_enabled
+    assert config.routing_fast_model == "claude-3-5-haiku@20241022"
+
+    config_path.write_text('project_id = "p"\n')
+    assert not cli.load_config(config_path).routing_enabled
@@ -0,0 +1,115 @@
+"""Tests for the local allow/escalate rules."""
+
+import pytest
+
+from claude_code_tool_use_validator.rules import DEFAULT_ALLOW_RULES, DEFAULT_ESCALATE_RULES, RuleSet, _stays_within
+
+CWD = "/home/user/project"
+
+
+@pytest.fixture(scope="module")
+def rules() -> RuleSet:
+    return RuleSet(DEFAULT_ALLOW_RULES, DEFAULT_ESCALATE_RULES)
+
+
+@pytest.mark.parametrize(
+    "command",
+    [
+        "ls -la",
+        "git status",
+        "git diff HEAD~1 -- src/",
+        "pytest tests/ -x && ruff check .",
+        "cat README.md | grep install",
+        "ls 2>/dev/null",
+        "ls >/dev/null 2>&1; git status",
+        "grep -r TODO src 2>/dev/null | wc -l",
+        "cat /tmp/build.log",
+        "rg --pre-glob '*.pdf' TODO",
+    ],
+)
+def test_allowed(rules, command):
+    assert rules.evaluate(command, CWD) == "allow"
+
+
+@pytest.mark.parametrize(
+    "command",
+    [
+        # Real file writes that only look like /dev/null
+        "echo x > /dev/null_evil",
+        "echo x >/dev/nullify.sh",
+        "cat a 2>/dev/null.txt",
+        "echo x > /dev/null/../../etc/profile",
+        "echo x > out.txt",
+        # Outside the CWD
+        "cat ~/.ssh/id_rsa",
+        "cat ../other/secret",
+        "ls /etc",
+        # Unknown, opaque or unsafe
+        "make deploy",
+        "echo $HOME",
+        "cat $(ls)",
+        "find . -delete",
+        "find . -fprint0 files.txt",
+        "rg --pre ./convert.sh TODO",
+        "rg --pre=./convert.sh TODO",
+        "pytest | tail -5",
+        "echo 'unbalanced",
+        "ls |",
+    ],
+)
+def test_undecided(rules, command):
+    assert rules.evaluate(command, CWD) is None
+
+
+@pytest.mark.parametrize(
+    "command",
+    [
+        "sudo ls",
+        "git push origin main",
+        "git status && git push",
+        "ls | sudo tee /etc/hosts",
+        "cat build.log | dd of=/dev/sda",
+        "make build; rm -rf /",
+        "echo done || reboot",
+        "git push > /dev/null 2>&1",
+    ],
+)
+def test_escalated(rules, command):
+    assert rules.evaluate(command, CWD) == "escalateToHuman"
+
+
+def test_custom_rules_are_token_prefixes():
+    rules = RuleSet(["make test"], ["make deploy"])
+    assert rules.evaluate("make test", CWD) == "allow"
+    assert rules.evaluate("make test-unit", CWD) is None
+    assert rules.evaluate("make deploy-staging", CWD) is None
+    assert rules.evaluate("make test | make deploy", CWD) == "escalateToHuman"
+
+
+@pytest.mark.parametrize(
+    ("token", "expected"),
+    [
+        ("src/main.py", True),
+        ("-n", True),
+        ("./build/../src", True),
+        (f"{CWD}/src", True),
+        (CWD, True),
+        ("/tmp/out.log", True),
+        ("--output=/tmp/out.log", True),
+        ("../sibling", False),
+        ("src/../../sibling", False),
+        (f"{CWD}-other/file", False),
+        ("/tmpfoo/file", False),
+        ("/etc/passwd", False),
+        ("--config=/etc/app.conf", False),
+        ("~/notes", False),
+        ("~", False),
+    ],
+)
+def test_stays_within(token, expected):
+    assert _stays_within(token, CWD) is expected
+
+
+def test_stays_within_without_cwd():
+    assert _stays_within("src/main.py", "")
+    assert not _stays_within("/tmp/out.log", "")
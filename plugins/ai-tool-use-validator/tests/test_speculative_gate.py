@@ -0,0 +1,27 @@
+"""Tests for the PreToolUse hook that starts speculative pre-validation."""
+
+import os
+from importlib.machinery import SourceFileLoader
+
+gate = SourceFileLoader(
+    "speculative_gate", os.path.join(os.path.dirname(__file__), "..", "hooks", "speculative-gate.py")
+).load_module()
+
+
+def test_disabled_without_config(tmp_path):
+    assert not gate.speculative_enabled(str(tmp_path / "missing.toml"))
+
+
+def test_enabled_only_by_the_speculative_section(tmp_path):
+    config = tmp_path / "config.toml"
+    config.write_text('project_id = "p"\n')
+    assert not gate.speculative_enabled(str(config))
+
+    config.write_text('project_id = "p"\n[speculative]\nenabled = false\n')
+    assert not gate.speculative_enabled(str(config))
+
+    config.write_text('project_id = "p"\n[speculative]\nenabled = true\nwait_seconds = 10\n')
+    assert gate.speculative_enabled(str(config))
+
+    config.write_text('[speculative\nenabled = true\n')
+    assert not gate.speculative_enabled(str(config))
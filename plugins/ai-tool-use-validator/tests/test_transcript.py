@@ -0,0 +1,105 @@
+"""Tests for the incremental transcript reader."""
+
+import json
+import os
+
+from claude_code_tool_use_validator import transcript
+from claude_code_tool_use_validator.transcript import parse_transcript
+
+
+def prompt(text: str) -> dict:
+    return {"type": "user", "message": {"content": text}}
+
+
+def tool_use(tool_id: str, command: str) -> dict:
+    return {
+        "type": "assistant",
+        "message": {"content": [{"type": "tool_use", "id": tool_id, "name": "Bash", "input": {"command": command}}]},
+    }
+
+
+def tool_result(tool_id: str, content: str) -> dict:
+    return {"type": "user", "message": {"content": [{"type": "tool_result", "tool_use_id": tool_id, "content": content}]}}
+
+
+def write_lines(path, entries: list[dict], mode: str = "w") -> None:
+    with open(path, mode, encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + "\n")
+
+
+def commands(operations: list[dict]) -> list[str]:
+    return [operation["tool_input"]["command"] for operation in operations]
+
+
+def test_reads_prompt_and_recent_operations(tmp_path):
+    path = tmp_path / "session.jsonl"
+    entries = [prompt("first")]
+    for index in range(15):
+        entries += [tool_use(f"t{index}", f"cmd {index}"), tool_result(f"t{index}", f"out {index}")]
+    entries.append(prompt("second"))
+    write_lines(path, entries)
+
+    last_prompt, operations = parse_transcript(str(path))
+    assert last_prompt == "second"
+    assert commands(operations) == [f"cmd {index}" for index in range(5, 15)]
+    assert operations[-1]["result"] == "out 14"
+
+
+def test_ignores_partial_last_line(tmp_path):
+    path = tmp_path / "session.jsonl"
+    write_lines(path, [prompt("done")])
+    with open(path, "a") as f:
+        f.write('{"type": "user", "message": {"content": "half')
+    assert parse_transcript(str(path)) == ("done", [])
+
+
+def test_checkpoint_reads_only_appended_lines(tmp_path, monkeypatch):
+    path = tmp_path / "session.jsonl"
+    checkpoints = tmp_path / "checkpoints"
+    write_lines(path, [prompt("build it"), tool_use("t1", "make"), tool_result("t1", "ok")])
+    assert parse_transcript(str(path), checkpoints) == (
+        "build it",
+        [{"tool_name": "Bash", "tool_input": {"command": "make"}, "result": "ok"}],
+    )
+
+    # With a checkpoint, the start of the file is never read backwards again
+    monkeypatch.setattr(transcript, "_read_tail_backwards", None)
+    write_lines(path, [tool_use("t2", "make test"), tool_result("t2", "passed"), prompt("now lint")], mode="a")
+    last_prompt, operations = parse_transcript(str(path), checkpoints)
+    assert last_prompt == "now lint"
+    assert commands(operations) == ["make", "make test"]
+    assert operations[-1]["result"] == "passed"
+
+
+def test_checkpoint_discarded_for_replaced_file(tmp_path):
+    path = tmp_path / "session.jsonl"
+    checkpoints = tmp_path / "checkpoints"
+    write_lines(path, [prompt("old"), tool_use("t1", "old command")])
+    parse_transcript(str(path), checkpoints)
+
+    # A new file (new inode) at the same path, longer than the checkpointed offset
+    replacement = tmp_path / "replacement.jsonl"
+    write_lines(replacement, [prompt("new prompt"), tool_use("t9", "new command"), tool_result("t9", "x" * 200)])
+    old_inode = os.stat(path).st_ino
+    os.replace(replacement, path)
+    assert os.stat(path).st_ino != old_inode
+
+    last_prompt, operations = parse_transcript(str(path), checkpoints)
+    assert last_prompt == "new prompt"
+    assert commands(operations) == ["new command"]
+
+
+def test_checkpoint_discarded_for_truncated_file(tmp_path):
+    path = tmp_path / "session.jsonl"
+    checkpoints = tmp_path / "checkpoints"
+    write_lines(path, [prompt("a long first prompt " * 10), tool_use("t1", "old command")])
+    parse_transcript(str(path), checkpoints)
+
+    # Truncated in place (same inode) and rewritten shorter
+    write_lines(path, [prompt("short")])
+    assert parse_transcript(str(path), checkpoints) == ("short", [])
+
+
+def test_missing_transcript(tmp_path):
+    assert parse_transcript(str(tmp_path / "missing.jsonl"), tmp_path / "checkpoints") == (None, [])
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Resident host for plugin hook scripts.
+
+Every hook invocation is a fresh Python process, which spends tens of
+milliseconds starting the interpreter and importing modules before the hook
+does any work. The host is a long-lived process listening on a Unix socket.
+Hook scripts are registered into it on their first request: the script is
+compiled and its imports are loaded once (and again when it changes). For
+every request, the script's top level and its main() run with the request's
+stdin, stdout, stderr, argv, environment and cwd swapped in.
+
+Each request runs in a child forked from the host: the child starts with the
+host's modules already imported, a slow hook doesn't hold up the others, and
+whatever a hook changes (module state, sys.modules, a crash) goes away with
+the child.
+
+Usage:
+    hook_host.py serve    # run the host in the foreground
+    hook_host.py start    # start the host in the background unless it is running (SessionStart hook)
+    hook_host.py stop
+"""
+
+import fcntl
+import io
+import os
+import signal
+import socket
+import subprocess
+import sys
+import traceback
+import types
+
+from host_client import socket_path
+
+# The host exits after this long without a request
+IDLE_TIMEOUT_SECONDS = 30 * 60
+
+# Requests larger than this are refused (hook inputs are a few KB of JSON)
+MAX_REQUEST_BYTES = 16 * 1024 * 1024
+
+# A client sends its whole request right after connecting, the host stops waiting for it after this long
+REQUEST_TIMEOUT_SECONDS = 5
+
+
+class HookModules:
+    """Hook scripts compiled once (and again when the file changes) and loaded as modules."""
+
+    def __init__(self):
+        self._code: dict[str, tuple[int, types.CodeType]] = {}
+
+    def compile(self, script: str) -> tuple[types.CodeType, bool]:
+        """Returns the script's code and whether it was compiled just now."""
+        mtime = os.stat(script).st_mtime_ns
+        cached = self._code.get(script)
+        if cached is not None and cached[0] == mtime:
+            return cached[1], False
+        with open(script, "rb") as f:
+            code = compile(f.read(), script, "exec")
+        self._code[script] = (mtime, code)
+        return code, True
+
+    def load(self, script: str) -> types.ModuleType:
+        """Run the script's top level in a new module, with the current environment, cwd and argv."""
+        code, _ = self.compile(script)
+        module = types.ModuleType("hook_host_script")
+        module.__file__ = script
+        # The script's own helper modules stay referenced by the script, but are dropped
+        # from sys.modules, so a same-named helper of another plugin is imported from its own directory
+        script_dir = os.path.dirname(script)
+        known_modules = set(sys.modules)
+        sys.path.insert(0, script_dir)
+        try:
+            exec(code, module.__dict__)
+        finally:
+            sys.path.remove(script_dir)
+            for name in set(sys.modules) - known_modules:
+                if os.path.dirname(getattr(sys.modules[name], "__file__", None) or "") == script_dir:
+                    del sys.modules[name]
+        if not callable(getattr(module, "main", None)):
+            raise RuntimeError(f"{script} has no main() function")
+        return module
+
+
+def parse_request(request: bytes) -> tuple[str, str, list[str], dict[str, str], bytes]:
+    """Split a request into script, cwd, args, environment and the hook input (see host_client)."""
+    fields = []
+    position = 0
+    lists_ended = 0
+    while lists_ended < 2:
+        end = request.index(b"\0", position)
+        field = request[position:end].decode("utf-8", "surrogateescape")
+        position = end + 1
+        if not field and len(fields) >= 2:
+            lists_ended += 1
+            fields.append(None)
+        else:
+            fields.append(field)
+
+    script, cwd = fields[0], fields[1]
+    separator = fields.index(None, 2)
+    args = fields[2:separator]
+    env = dict(item.partition("=")[::2] for item in fields[separator + 1 : -1])
+    return script, cwd, args, env, request[position:]
+
+
+def run_hook(modules: HookModules, script: str, cwd: str, args: list[str], env: dict[str, str], hook_input: bytes) -> tuple[int, bytes, bytes]:
+    """Call the script's main() as if it was run as `python3 script args`, returns (exit code, stdout, stderr)."""
+    stdout, stderr = io.BytesIO(), io.BytesIO()
+    saved = (sys.stdin, sys.stdout, sys.stderr, sys.argv, dict(os.environ), os.getcwd(), list(sys.path))
+    # Kept referenced, a wrapper closes its buffer when it is garbage collected
+    streams = (
+        io.TextIOWrapper(io.BytesIO(hook_input), encoding="utf-8"),
+        io.TextIOWrapper(stdout, encoding="utf-8", write_through=True),
+        io.TextIOWrapper(stderr, encoding="utf-8", write_through=True),
+    )
+    sys.stdin, sys.stdout, sys.stderr = streams
+    sys.argv = [script] + args
+    # For imports done inside main(), as when the script is run directly
+    sys.path.insert(0, os.path.dirname(script))
+    os.environ.clear()
+    os.environ.update(env)
+    exit_code = 0
+    try:
+        os.chdir(cwd)
+        modules.load(script).main()
+    except SystemExit as e:
+        if isinstance(e.code, int):
+            exit_code = e.code
+        elif e.code is not None:
+            print(e.code, file=sys.stderr)
+            exit_code = 1
+    except BaseException:
+        # Including KeyboardInterrupt and the like, the hook fails but the host keeps serving
+        traceback.print_exc()
+        exit_code = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        sys.stdin, sys.stdout, sys.stderr, sys.argv = saved[:4]
+        os.environ.clear()
+        os.environ.update(saved[4])
+        os.chdir(saved[5])
+        sys.path[:] = saved[6]
+    result = exit_code, stdout.getvalue(), stderr.getvalue()
+    for stream in streams:
+        stream.detach()
+    return result
+
+
+def handle(connection: socket.socket, modules: HookModules, host_files: tuple) -> bool:
+    """Run one request in a forked child, returns False for the stop request (an empty script path).
+
+    host_files (the listening socket and the lock) are closed in the child, so a hook that
+    is still running doesn't keep the socket or stop a new host from starting.
+    """
+    connection.settimeout(REQUEST_TIMEOUT_SECONDS)
+    chunks = []
+    size = 0
+    while True:
+        chunk = connection.recv(65536)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > MAX_REQUEST_BYTES:
+            return True
+        chunks.append(chunk)
+
+    try:
+        script, cwd, args, env, hook_input = parse_request(b"".join(chunks))
+    except ValueError:
+        return True
+    if not script:
+        return False
+
+    # A new or changed script is compiled and loaded once in the host, so the children get its
+    # imports for free. The module itself is thrown away: its top level may read the environment
+    # (e.g. CLAUDE_PLUGIN_ROOT), so every child runs it again with the request's environment.
+    # A script that fails to load is left to the child, which reports the error to the client.
+    try:
+        if modules.compile(script)[1]:
+            modules.load(script)
+    except BaseException:
+        pass
+
+    if os.fork() != 0:
+        return True
+    try:
+        for host_file in host_files:
+            host_file.close()
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        exit_code, stdout, stderr = run_hook(modules, script, cwd, args, env, hook_input)
+        connection.settimeout(None)
+        connection.sendall(f"{exit_code} {len(stdout)}\n".encode() + stdout + stderr)
+    finally:
+        os._exit(0)
+
+
+def serve(path: str) -> None:
+    """Listen on the socket until idle for IDLE_TIMEOUT_SECONDS."""
+    os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+
+    # Only one host per socket, a second one (e.g. from two sessions starting at once) just exits
+    lock_file = open(path + ".lock", "w")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return
+
+    if os.path.exists(path):
+        os.unlink(path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    os.chmod(path, 0o600)
+    server.listen(16)
+    server.settimeout(IDLE_TIMEOUT_SECONDS)
+    # Finished children are reaped by the kernel
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+
+    modules = HookModules()
+    try:
+        while True:
+            try:
+                connection, _ = server.accept()
+            except socket.timeout:
+                break
+            with connection:
+                try:
+                    if not handle(connection, modules, (server, lock_file)):
+                        break
+                except OSError:
+                    pass
+    finally:
+        server.close()
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+        lock_file.close()
+
+
+def is_running(path: str) -> bool:
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        client.close()
+
+
+def start(path: str) -> None:
+    """Start the host in a detached process, unless one is already listening."""
+    if is_running(path):
+        return
+    subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "serve"],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+def stop(path: str) -> None:
+    """Stop the host by sending it the stop request."""
+    if not is_running(path):
+        print("Hook host is not running")
+        return
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    with client:
+        client.connect(path)
+        client.sendall(b"\0\0\0\0")
+        client.shutdown(socket.SHUT_WR)
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    path = socket_path()
+    if command == "serve":
+        serve(path)
+    elif command == "start":
+        start(path)
+    elif command == "stop":
+        stop(path)
+    else:
+        print("Usage: hook_host.py serve | start | stop", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""Startup-time benchmark of the plugin hooks, run directly, through the client, and through the host.
+
+    python3 tests/bench_startup.py
+    python3 tests/bench_startup.py --runs 50
+
+Each hook is run as Claude Code runs it (a new process per invocation, the
+hook input on stdin) and the wall time per invocation is reported:
+- direct: `python3 <script>`, as before the hook host
+- client: `python3 -S host_client.py <script>` with no host running (fallback)
+- host: the same client command with a host running on a temporary socket
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+PLUGINS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+HOST = os.path.join(PLUGINS, "hook-host", "scripts", "hook_host.py")
+
+HOOKS = [
+    (
+        "llm-toto rewrite-bash",
+        os.path.join(PLUGINS, "llm-toto", "hooks", "rewrite-bash.py"),
+        [],
+        {"session_id": "bench", "tool_name": "Bash", "tool_input": {"command": "cd app && ./mvnw package 2>&1 | tail -50"}},
+    ),
+    (
+        "no-background-tasks --release",
+        os.path.join(PLUGINS, "no-background-tasks", "scripts", "rewrite_background.py"),
+        ["--release"],
+        {"session_id": "bench", "hook_event_name": "PostToolUse", "tool_name": "Bash", "tool_input": {}},
+    ),
+    (
+        "skill-keyword-reminder",
+        os.path.join(PLUGINS, "skill-keyword-reminder", "scripts", "scan_skills.py"),
+        [],
+        {"prompt": "open the gitlab merge request", "cwd": PLUGINS},
+    ),
+]
+
+
+def measure(command: list[str], hook_input: str, env: dict, runs: int) -> list[float]:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, input=hook_input, capture_output=True, text=True, env=env)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark hook startup with and without the hook host")
+    parser.add_argument("--runs", type=int, default=20, help="Invocations per hook and mode (default: 20)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, HOOK_HOST_SOCKET=os.path.join(tmp, "host.sock"))
+        results = {}
+        for name, script, script_args, hook_input in HOOKS:
+            client = os.path.join(os.path.dirname(script), "host_client.py")
+            data = json.dumps(hook_input)
+            results[name] = {
+                "direct": measure(["python3", script, *script_args], data, env, args.runs),
+                "client": measure(["python3", "-S", client, script, *script_args], data, env, args.runs),
+            }
+
+        host = subprocess.Popen(["python3", HOST, "serve"], env=env)
+        try:
+            while not os.path.exists(env["HOOK_HOST_SOCKET"]):
+                time.sleep(0.01)
+            for name, script, script_args, hook_input in HOOKS:
+                client = os.path.join(os.path.dirname(script), "host_client.py")
+                command = ["python3", "-S", client, script, *script_args]
+                # The first request loads the script into the host
+                measure(command, json.dumps(hook_input), env, 1)
+                results[name]["host"] = measure(command, json.dumps(hook_input), env, args.runs)
+        finally:
+            subprocess.run(["python3", HOST, "stop"], env=env)
+            host.wait(timeout=5)
+
+    print(f"Wall time per hook invocation in ms (median / p95 of {args.runs} runs)")
+    print(f"  {'hook':<32} {'direct':>14} {'client':>14} {'host':>14}")
+    for name, timings in results.items():
+        cells = []
+        for mode in ("direct", "client", "host"):
+            values = sorted(timings[mode])
+            p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+            cells.append(f"{statistics.median(values):6.1f} / {p95:5.1f}")
+        print(f"  {name:<32} {cells[0]:>14} {cells[1]:>14} {cells[2]:>14}")
+    python_only = statistics.median(measure(["python3", "-S", "-c", "pass"], "", os.environ, args.runs))
+    print(f"  {'(python3 -S -c pass)':<32} {python_only:6.1f}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
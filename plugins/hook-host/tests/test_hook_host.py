@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""Tests for the hook host and its client."""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+PLUGINS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+SCRIPTS = os.path.join(PLUGINS, "hook-host", "scripts")
+HOST = os.path.join(SCRIPTS, "hook_host.py")
+CLIENT = os.path.join(SCRIPTS, "host_client.py")
+
+HOOK_SCRIPT = """
+import json
+import os
+import sys
+
+CALLS = []
+
+
+def main():
+    data = json.load(sys.stdin)
+    CALLS.append(data)
+    print(json.dumps({"argv": sys.argv[1:], "cwd": os.getcwd(), "env": os.environ.get("HOOK_TEST"), "calls": len(CALLS), "input": data}))
+    print("note", file=sys.stderr)
+    sys.exit(data.get("exit", 0))
+
+
+if __name__ == "__main__":
+    main()
+"""
+
+
+SLOW_HOOK_SCRIPT = """
+import sys
+import time
+
+
+def main():
+    time.sleep(float(sys.stdin.read()))
+    print("slept")
+"""
+
+INTERRUPTED_HOOK_SCRIPT = """
+def main():
+    raise KeyboardInterrupt
+"""
+
+HELPER_HOOK_SCRIPT = """
+import helper
+
+
+def main():
+    print(helper.NAME)
+"""
+
+# Plugins that ship a copy of host_client.py next to their hook scripts
+CLIENT_COPIES = [
+    "llm-toto/hooks/host_client.py",
+    "no-background-tasks/scripts/host_client.py",
+    "skill-keyword-reminder/scripts/host_client.py",
+]
+
+
+def write_script(path: str, source: str) -> str:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(source)
+    return path
+
+
+def run_client(env: dict, script: str, hook_input: dict, *args: str, cwd: str | None = None) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        ["python3", "-S", CLIENT, script, *args],
+        input=json.dumps(hook_input),
+        capture_output=True,
+        text=True,
+        env=env,
+        cwd=cwd,
+    )
+
+
+def start_host(env: dict) -> subprocess.Popen:
+    host = subprocess.Popen(["python3", HOST, "serve"], env=env)
+    for _ in range(100):
+        if os.path.exists(env["HOOK_HOST_SOCKET"]):
+            break
+        time.sleep(0.02)
+    return host
+
+
+def test_client_runs_script_without_host():
+    """Without a host, the client runs the hook script in-process."""
+    with tempfile.TemporaryDirectory() as tmp:
+        script = os.path.join(tmp, "hook.py")
+        with open(script, "w") as f:
+            f.write(HOOK_SCRIPT)
+        env = dict(os.environ, HOOK_HOST_SOCKET=os.path.join(tmp, "host.sock"), HOOK_TEST="direct")
+
+        result = run_client(env, script, {"exit": 2}, "--lock", cwd=tmp)
+        assert result.returncode == 2
+        assert result.stderr == "note\n"
+        output = json.loads(result.stdout)
+        assert output["argv"] == ["--lock"]
+        assert output["env"] == "direct"
+        assert output["calls"] == 1
+
+
+def test_host_runs_registered_script():
+    """With a host, the script stays loaded and sees the client's argv, env, cwd and stdin."""
+    with tempfile.TemporaryDirectory() as tmp:
+        script = os.path.join(tmp, "hook.py")
+        with open(script, "w") as f:
+            f.write(HOOK_SCRIPT)
+        env = dict(os.environ, HOOK_HOST_SOCKET=os.path.join(tmp, "host.sock"))
+        host = start_host(env)
+        try:
+            first = run_client(dict(env, HOOK_TEST="one"), script, {"prompt": "a"}, cwd=tmp)
+            second = run_client(dict(env, HOOK_TEST="two"), script, {"exit": 2}, "--release", cwd="/")
+            assert first.returncode == 0
+            assert json.loads(first.stdout) == {"argv": [], "cwd": tmp, "env": "one", "calls": 1, "input": {"prompt": "a"}}
+            assert second.returncode == 2
+            assert second.stderr == "note\n"
+            # Every request runs in its own child, so module-level state doesn't carry over
+            assert json.loads(second.stdout)["calls"] == 1
+            assert json.loads(second.stdout)["env"] == "two"
+            assert json.loads(second.stdout)["cwd"] == "/"
+
+            # A changed script is loaded again
+            with open(script, "a") as f:
+                f.write("\n# changed\n")
+            os.utime(script, (time.time() + 5, time.time() + 5))
+            assert json.loads(run_client(env, script, {}).stdout)["calls"] == 1
+        finally:
+            subprocess.run(["python3", HOST, "stop"], env=env)
+            host.wait(timeout=5)
+        assert not os.path.exists(env["HOOK_HOST_SOCKET"])
+
+
+def test_host_isolates_hooks():
+    """A slow hook doesn't block others, an interrupted one doesn't stop the host, helpers don't clash."""
+    with tempfile.TemporaryDirectory() as tmp:
+        slow = write_script(os.path.join(tmp, "slow.py"), SLOW_HOOK_SCRIPT)
+        interrupted = write_script(os.path.join(tmp, "interrupted.py"), INTERRUPTED_HOOK_SCRIPT)
+        first = write_script(os.path.join(tmp, "first", "hook.py"), HELPER_HOOK_SCRIPT)
+        second = write_script(os.path.join(tmp, "second", "hook.py"), HELPER_HOOK_SCRIPT)
+        write_script(os.path.join(tmp, "first", "helper.py"), "NAME = 'first'\n")
+        write_script(os.path.join(tmp, "second", "helper.py"), "NAME = 'second'\n")
+        env = dict(os.environ, HOOK_HOST_SOCKET=os.path.join(tmp, "host.sock"))
+        host = start_host(env)
+        try:
+            slow_client = subprocess.Popen(
+                ["python3", "-S", CLIENT, slow], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, env=env
+            )
+            slow_client.stdin.write("2")
+            slow_client.stdin.close()
+            started = time.monotonic()
+
+            result = run_client(env, interrupted, {})
+            assert result.returncode == 1
+            assert "KeyboardInterrupt" in result.stderr
+
+            assert run_client(env, first, {}).stdout == "first\n"
+            assert run_client(env, second, {}).stdout == "second\n"
+            assert time.monotonic() - started < 1.5
+
+            assert slow_client.wait(timeout=5) == 0
+            assert slow_client.stdout.read() == "slept\n"
+            slow_client.stdout.close()
+        finally:
+            subprocess.run(["python3", HOST, "stop"], env=env)
+            host.wait(timeout=5)
+
+
+def test_host_runs_script_top_level_with_client_env():
+    """Paths a hook derives from the environment at import follow the client, not the host."""
+    llm_toto = os.path.join(PLUGINS, "llm-toto")
+    rewrite = os.path.join(llm_toto, "hooks", "rewrite-bash.py")
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, HOOK_HOST_SOCKET=os.path.join(tmp, "host.sock"), LLM_TOTO_HISTORY="0")
+        host = start_host(dict(env, CLAUDE_PLUGIN_ROOT=os.path.join(PLUGINS, "hook-host")))
+        try:
+            hook_input = {"tool_name": "Bash", "tool_input": {"command": "make build"}, "session_id": "abc"}
+            for _ in range(2):
+                result = run_client(dict(env, CLAUDE_PLUGIN_ROOT=llm_toto), rewrite, hook_input, cwd=tmp)
+                assert result.returncode == 0, result.stderr
+                command = json.loads(result.stdout)["hookSpecificOutput"]["updatedInput"]["command"]
+                script = os.path.join(llm_toto, "scripts", "llm-toto.py")
+                assert command == f"python3 {script} --session abc -- make build"
+                assert os.path.exists(script)
+        finally:
+            subprocess.run(["python3", HOST, "stop"], env=env)
+            host.wait(timeout=5)
+
+
+def test_client_copies_are_identical():
+    """The plugins' copies of host_client.py must match the one in hook-host."""
+    with open(CLIENT, "rb") as f:
+        expected = f.read()
+    for copy in CLIENT_COPIES:
+        with open(os.path.join(PLUGINS, copy), "rb") as f:
+            assert f.read() == expected, f"{copy} differs from hook-host/scripts/host_client.py"
+
+
+if __name__ == "__main__":
+    test_functions = [v for k, v in sorted(globals().items()) if k.startswith("test_")]
+    passed = 0
+    failed = 0
+    errors = []
+
+    for test_fn in test_functions:
+        try:
+            test_fn()
+            passed += 1
+            print(f"  PASS  {test_fn.__name__}")
+        except AssertionError as e:
+            failed += 1
+            errors.append((test_fn.__name__, str(e)))
+            print(f"  FAIL  {test_fn.__name__}: {e}")
+        except Exception as e:
+            failed += 1
+            errors.append((test_fn.__name__, str(e)))
+            print(f"  ERROR {test_fn.__name__}: {e}")
+
+    print(f"\n{passed} passed, {failed} failed")
+    if errors:
+        print("\nFailures:")
+        for name, err in errors:
+            print(f"  {name}: {err}")
+        sys.exit(1)
@@ -12,14 +12,21 @@ Rewriting rules:
 - Skips file management commands (mkdir, cp, mv, rm, etc.)
 - Skips git write operations (add, commit, push, etc.)
 - Skips package install commands
-- Strips trailing filter pipes (| grep, | tail, | head, etc.) from wrapped commands
-- Wraps everything else with llm-toto
+- Strips trailing filter pipes that only pick lines (| grep, | tail, | head, | sort)
+  from wrapped commands, but keeps counts, inverted greps and other transformations
+- Wraps everything else with llm-toto, pipeline by pipeline (cd app && make build
+  only wraps make build), using a shell lexer that understands quotes,
+  substitutions, subshells and heredocs
+- Skips commands that the project's llm-toto history shows to be fast and
+  quiet, checking them again once a day
 """
 
 import json
 import os
 import re
+import shlex
 import sys
+import time
 
 PLUGIN_ROOT = os.environ.get("CLAUDE_PLUGIN_ROOT", os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 LLM_TOTO_SCRIPT = os.path.join(PLUGIN_ROOT, "scripts", "llm-toto.py")
@@ -131,51 +138,95 @@ PASSTHROUGH_PREFIXES = [
     "git fetch",
 ]
 
-# Patterns for grep/sed/awk on specific files (not recursive)
-# These are fast targeted file operations, not search-everything operations
-SPECIFIC_FILE_OP_PATTERNS = [
-    # grep without -r/-R (not recursive search)
-    # Matches: grep pattern file.txt, grep -n 'error' log.txt
-    # Does NOT match: grep -r pattern ., grep -R 'error' src/
-    re.compile(r"^grep\s+(?!-[rR]\b)(?!.*\s-[rR]\b)"),
-    # sed on a file
-    re.compile(r"^sed\s+"),
-    # awk on a file
-    re.compile(r"^awk\s+"),
-    # diff between files
-    re.compile(r"^diff\s+"),
-    # sort/uniq on a file
-    re.compile(r"^sort\s+"),
-    re.compile(r"^uniq\s+"),
-    # cut on a file
-    re.compile(r"^cut\s+"),
-    # tr
-    re.compile(r"^tr\s+"),
-    # tee
-    re.compile(r"^tee\s+"),
-    # xargs
-    re.compile(r"^xargs\s+"),
-]
+# Commands operating on specific files (grep without -r, sed, awk, etc.), passed through
+# when they have arguments. These are fast targeted file operations, not search-everything operations
+SPECIFIC_FILE_OP_COMMANDS = {
+    "grep",
+    "sed",
+    "awk",
+    "diff",
+    "sort",
+    "uniq",
+    "cut",
+    "tr",
+    "tee",
+    "xargs",
+}
+
+# A recursive grep searches everything, so it is wrapped
+# Matches: grep -r pattern ., grep -R 'error' src/
+# Does NOT match: grep pattern file.txt, grep -n 'error' log.txt
+RECURSIVE_GREP_PATTERN = re.compile(r"^-[rR]\b|\s-[rR]\b")
+
+# Trie node keys marking the end of a passthrough prefix (any continuation matches),
+# or of a prefix whose trailing space was dropped (only the exact command matches)
+PREFIX_END = 0
+EXACT_END = 1
+
+
+def build_prefix_trie(prefixes: list[str]) -> dict:
+    """Build a character trie of the prefixes, so a lookup doesn't depend on their number.
+
+    A prefix ending with a space also matches the command without it
+    (`cat` as well as `cat file`).
+    """
+    root: dict = {}
+    for prefix in prefixes:
+        for key, text in ((PREFIX_END, prefix), (EXACT_END, prefix.rstrip())):
+            node = root
+            for char in text:
+                node = node.setdefault(char, {})
+            node[key] = True
+    return root
+
 
-# Trailing filter pipes that should be stripped when wrapping
-TRAILING_PIPE_PATTERN = re.compile(
-    r"""
-    \s*\|\s*                           # pipe operator
-    (?:grep|tail|head|awk|sed|wc|sort|uniq|cut|tr)  # filter command
-    (?:\s+[^\|]*)?                     # optional arguments
-    (?:                                # optionally chained filters
-        \s*\|\s*
-        (?:grep|tail|head|awk|sed|wc|sort|uniq|cut|tr)
-        (?:\s+[^\|]*)?
-    )*
-    \s*$                               # end of string
-    """,
-    re.VERBOSE,
-)
+PASSTHROUGH_TRIE = build_prefix_trie(PASSTHROUGH_PREFIXES)
+
+
+def matches_prefix(trie: dict, command: str) -> bool:
+    """Check whether the command starts with one of the prefixes in the trie."""
+    node = trie
+    for char in command:
+        if PREFIX_END in node:
+            return True
+        node = node.get(char)
+        if node is None:
+            return False
+    return PREFIX_END in node or EXACT_END in node
+
+
+# Filters that only pick or reorder lines. Their pipes are stripped when they trail a wrapped
+# command, the full output is buffered instead and can be queried
+FILTER_COMMANDS = {"grep", "tail", "head", "sort"}
+
+# Options that make a filter's output depend on all of its input (counts, inverted matches,
+# deduplication), such filters are kept: (short option letters, long options)
+AGGREGATING_FILTER_OPTIONS = {
+    "grep": ("vclLq", {"--invert-match", "--count", "--files-with-matches", "--files-without-match", "--quiet", "--silent"}),
+    "sort": ("ucC", {"--unique", "--check"}),
+}
+
+# Compound commands can't be wrapped segment by segment, the whole command is wrapped instead
+RESERVED_WORDS = {
+    "if", "then", "elif", "else", "fi",
+    "for", "select", "while", "until", "do", "done",
+    "case", "esac", "function",
+}
 
 # Stderr-to-stdout redirections that are redundant (llm-toto captures both streams)
 STDERR_REDIRECT_PATTERN = re.compile(r"\s*2>&1\s*")
 
+# The history llm-toto keeps per project (see history_path() in llm-toto.py)
+HISTORY_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "llm-toto", "history")
+DEFAULT_THRESHOLD = 4000
+
+# A command is left unwrapped after this many runs that all stayed below the threshold
+QUIET_MIN_RUNS = 3
+# ... and took less than this on average (seconds)
+QUIET_MAX_DURATION = 1.0
+# ... and once its last wrapped run is this old, it's wrapped again to refresh the history
+QUIET_RECHECK_SECONDS = 24 * 3600
+
 
 def is_passthrough(command: str) -> bool:
     """Check if the command should be passed through without wrapping."""
@@ -186,17 +237,17 @@ def is_passthrough(command: str) -> bool:
         return True
 
     # Check prefix-based passthrough
-    for prefix in PASSTHROUGH_PREFIXES:
-        if stripped.startswith(prefix) or stripped == prefix.rstrip():
-            return True
+    if matches_prefix(PASSTHROUGH_TRIE, stripped):
+        return True
 
     # Check if it's a specific file operation (grep without -r, sed, awk, etc.)
-    for pattern in SPECIFIC_FILE_OP_PATTERNS:
-        if pattern.match(stripped):
-            return True
+    parts = stripped.split(None, 1)
+    if len(parts) == 2 and parts[0] in SPECIFIC_FILE_OP_COMMANDS:
+        return parts[0] != "grep" or not RECURSIVE_GREP_PATTERN.search(parts[1])
 
     # Variable assignment
-    if re.match(r"^[A-Za-z_][A-Za-z0-9_]*=", stripped):
+    name, equals, _ = stripped.partition("=")
+    if equals and name.isascii() and name.isidentifier():
         return True
 
     # Command substitution or subshell only
@@ -206,53 +257,378 @@ def is_passthrough(command: str) -> bool:
     return False
 
 
-def strip_trailing_pipes(command: str) -> str:
-    """Strip trailing filter pipes from the command.
+def find_project_root(cwd: str) -> str:
+    """The nearest directory with a .git entry, or cwd itself."""
+    path = os.path.abspath(cwd)
+    while True:
+        if os.path.exists(os.path.join(path, ".git")):
+            return path
+        parent = os.path.dirname(path)
+        if parent == path:
+            return os.path.abspath(cwd)
+        path = parent
+
+
+class CommandHistory:
+    """Read-only view of the runs llm-toto recorded for a project."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connection = None
+
+    @classmethod
+    def for_cwd(cls, cwd: str) -> "CommandHistory | None":
+        """The history of the project containing cwd, None when there is none (or it is disabled)."""
+        if os.environ.get("LLM_TOTO_HISTORY", "1") in ("", "0"):
+            return None
+        name = find_project_root(cwd).replace(os.sep, "-")
+        path = os.path.join(os.environ.get("LLM_TOTO_HISTORY_DIR") or HISTORY_DIR, f"{name}.sqlite3")
+        return cls(path) if os.path.isfile(path) else None
+
+    def is_quiet(self, command: str) -> bool:
+        """Whether the command (as llm-toto would see it) has been reliably fast, small and successful."""
+        import sqlite3
+
+        try:
+            if self._connection is None:
+                self._connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, timeout=0.2)
+            row = self._connection.execute(
+                "SELECT runs, duration, max_output_bytes, exit_code, last_run, threshold FROM commands WHERE command = ?",
+                (" ".join(command.split()),),
+            ).fetchone()
+        except sqlite3.Error:
+            return False
+        if row is None:
+            return False
+        runs, duration, max_output_bytes, exit_code, last_run, threshold = row
+        if threshold is None:
+            threshold = int(os.environ.get("LLM_TOTO_THRESHOLD", DEFAULT_THRESHOLD))
+        return (
+            runs >= QUIET_MIN_RUNS
+            and exit_code == 0
+            and duration < QUIET_MAX_DURATION
+            and max_output_bytes <= threshold
+            and last_run is not None
+            and time.time() - last_run < QUIET_RECHECK_SECONDS
+        )
+
+
+def wrapped_command_text(text: str) -> str:
+    """The command as llm-toto sees it when the text is passed unquoted (see to_shell_command() in llm-toto.py)."""
+    try:
+        words = shlex.split(text)
+    except ValueError:
+        return text
+    return shlex.join(words) if len(words) > 1 else " ".join(words)
 
-    Examples:
-        './mvnw package 2>&1 | grep ERROR | head -20' -> './mvnw package'
-        './mvnw package 2>&1 | tail -5' -> './mvnw package'
-        'kubectl get pods | grep Running' -> 'kubectl get pods'
-    """
-    result = TRAILING_PIPE_PATTERN.sub("", command)
-    result = STDERR_REDIRECT_PATTERN.sub(" ", result)
-    return result.strip()
 
+class Stage:
+    """A simple command (or a ( ) / { } group) of a pipeline, as a span of the command string."""
 
-def extract_base_command(command: str) -> str:
-    """Extract the base command before any pipes, for passthrough checking.
+    __slots__ = ("start", "end", "group", "redirects_stdout", "has_heredoc", "compound")
 
-    Handles compound commands with && and ; by checking the last segment,
-    since that's what produces the output.
-    """
-    # For compound commands (&&, ;), check the last command segment
-    # because that's the one whose output matters
-    for sep in ["&&", ";"]:
-        if sep in command:
-            parts = command.rsplit(sep, 1)
-            return parts[-1].strip()
+    def __init__(self, start: int):
+        self.start = start
+        self.end = start
+        # Pipelines inside a ( ) or { } group
+        self.group: list[list["Stage"]] | None = None
+        # Stdout goes to a file (or /dev/null, or stderr), there is nothing to buffer
+        self.redirects_stdout = False
+        self.has_heredoc = False
+        # Starts with a reserved word (if, for, while, ...) or defines a function
+        self.compound = False
 
-    # For piped commands, the first command is the base
-    if "|" in command:
-        return command.split("|")[0].strip()
 
-    return command.strip()
+class ShellParser:
+    """Splits a POSIX shell command into lists of pipelines of stages.
 
+    Quotes, escapes, $(...), `...`, ${...}, heredoc bodies and comments are
+    skipped over, so operators inside them don't split the command. Groups
+    are parsed recursively. Raises ValueError for unbalanced quotes or
+    brackets, which is left for the shell to report.
+    """
 
-def rewrite_command(command: str, session_id: str) -> str | None:
-    """Determine if and how to rewrite the command. Returns new command or None."""
+    def __init__(self, command: str):
+        self.command = command
+        self.pos = 0
+        self._heredocs: list[tuple[str, bool]] = []
+
+    def parse(self) -> list[list[Stage]]:
+        return self._parse_list("")
+
+    def _parse_list(self, closing: str) -> list[list[Stage]]:
+        command = self.command
+        pipelines: list[list[Stage]] = []
+        stages: list[Stage] = []
+        stage: Stage | None = None
+
+        def end_stage() -> None:
+            nonlocal stage
+            if stage is not None:
+                stage.end = self._trim_end(stage.start, self.pos)
+                stages.append(stage)
+                stage = None
+
+        def end_pipeline() -> None:
+            nonlocal stages
+            end_stage()
+            if stages:
+                pipelines.append(stages)
+                stages = []
+
+        while self.pos < len(command):
+            char = command[self.pos]
+            following = command[self.pos : self.pos + 2]
+
+            if stage is None and char in " \t":
+                self.pos += 1
+            elif char == "\n":
+                end_pipeline()
+                self.pos += 1
+                self._skip_heredoc_bodies()
+            elif char == "#" and (self.pos == 0 or command[self.pos - 1] in " \t\n;&|()"):
+                newline = command.find("\n", self.pos)
+                end_stage()
+                self.pos = len(command) if newline == -1 else newline
+            elif closing == ")" and char == ")":
+                end_pipeline()
+                self.pos += 1
+                return pipelines
+            elif closing == "}" and char == "}" and stage is None:
+                end_pipeline()
+                self.pos += 1
+                return pipelines
+            elif stage is None and (char == "(" or (char == "{" and command[self.pos + 1 : self.pos + 2].isspace())):
+                stage = Stage(self.pos)
+                self.pos += 1
+                stage.group = self._parse_list(")" if char == "(" else "}")
+            elif following in ("&&", "||") or char == ";" or (char == "&" and following != "&>"):
+                end_pipeline()
+                self.pos += 2 if following in ("&&", "||", ";;") else 1
+            elif char == "|":
+                end_stage()
+                self.pos += 2 if following == "|&" else 1
+            else:
+                if stage is None:
+                    stage = Stage(self.pos)
+                    word_end = self.pos
+                    while word_end < len(command) and not command[word_end].isspace() and command[word_end] not in ";&|":
+                        word_end += 1
+                    stage.compound = command[self.pos : word_end] in RESERVED_WORDS
+                self._skip_word_part(stage)
+
+        if closing:
+            raise ValueError(f"missing {closing!r}")
+        end_pipeline()
+        return pipelines
+
+    def _skip_word_part(self, stage: Stage) -> None:
+        """Skip the quoted string, substitution, redirection or plain character at the position."""
+        command = self.command
+        char = command[self.pos]
+        following = command[self.pos : self.pos + 2]
+
+        if char == "\\":
+            self.pos += 2
+        elif char == "'":
+            end = command.find("'", self.pos + 1)
+            if end == -1:
+                raise ValueError("unterminated single quote")
+            self.pos = end + 1
+        elif char == '"':
+            self._skip_double_quoted()
+        elif char == "`":
+            self._skip_backticks()
+        elif following == "$(" or (char in "<>" and command[self.pos + 1 : self.pos + 2] == "("):
+            # Command or process substitution, nothing inside it is wrapped
+            if char == ">":
+                stage.redirects_stdout = True
+            self.pos += 2
+            self._parse_list(")")
+        elif following == "${":
+            end = command.find("}", self.pos + 2)
+            if end == -1:
+                raise ValueError("unterminated parameter expansion")
+            self.pos = end + 1
+        elif following == "<<" and command[self.pos + 2 : self.pos + 3] != "<":
+            self._read_heredoc_delimiter()
+            stage.has_heredoc = True
+        elif char == ">" or following == "&>":
+            fd = command[self.pos - 1] if self.pos > stage.start and char == ">" else ""
+            if not fd.isdigit() or fd == "1":
+                stage.redirects_stdout = True
+            self.pos += 2 if following in ("&>", ">>", ">|", ">&") else 1
+        elif char == "(":
+            # A function definition, f() { ...; }
+            stage.compound = True
+            self.pos += 1
+            self._parse_list(")")
+        elif char == ")":
+            raise ValueError("unbalanced ')'")
+        else:
+            self.pos += 1
+
+    def _skip_double_quoted(self) -> None:
+        command = self.command
+        self.pos += 1
+        while self.pos < len(command):
+            char = command[self.pos]
+            if char == "\\":
+                self.pos += 2
+            elif char == '"':
+                self.pos += 1
+                return
+            elif char == "`":
+                self._skip_backticks()
+            elif command.startswith("$(", self.pos):
+                self.pos += 2
+                self._parse_list(")")
+            else:
+                self.pos += 1
+        raise ValueError("unterminated double quote")
+
+    def _skip_backticks(self) -> None:
+        command = self.command
+        self.pos += 1
+        while self.pos < len(command):
+            if command[self.pos] == "\\":
+                self.pos += 2
+            elif command[self.pos] == "`":
+                self.pos += 1
+                return
+            else:
+                self.pos += 1
+        raise ValueError("unterminated backtick")
+
+    def _read_heredoc_delimiter(self) -> None:
+        """Read the delimiter of a <<WORD or <<-WORD heredoc, its body starts on the next line."""
+        command = self.command
+        self.pos += 2
+        strip_tabs = command[self.pos : self.pos + 1] == "-"
+        if strip_tabs:
+            self.pos += 1
+        while self.pos < len(command) and command[self.pos] in " \t":
+            self.pos += 1
+        start = self.pos
+        while self.pos < len(command) and not command[self.pos].isspace() and command[self.pos] not in ";&|<>()":
+            if command[self.pos] in "'\"":
+                end = command.find(command[self.pos], self.pos + 1)
+                if end == -1:
+                    raise ValueError("unterminated heredoc delimiter")
+                self.pos = end
+            self.pos += 1
+        delimiter = command[start : self.pos].replace("'", "").replace('"', "").replace("\\", "")
+        self._heredocs.append((delimiter, strip_tabs))
+
+    def _skip_heredoc_bodies(self) -> None:
+        command = self.command
+        for delimiter, strip_tabs in self._heredocs:
+            while self.pos < len(command):
+                newline = command.find("\n", self.pos)
+                end = len(command) if newline == -1 else newline
+                line = command[self.pos : end]
+                self.pos = end + 1
+                if (line.lstrip("\t") if strip_tabs else line) == delimiter:
+                    break
+        self._heredocs = []
+        self.pos = min(self.pos, len(command))
+
+    def _trim_end(self, start: int, end: int) -> int:
+        while end > start and self.command[end - 1].isspace():
+            end -= 1
+        return end
+
+
+def plan_wrapping(
+    command: str, pipelines: list[list[Stage]], wrapper: str, history: CommandHistory | None = None
+) -> list[tuple[int, int, str]]:
+    """Decide which pipelines to wrap, as (start, end, replacement) edits of the command.
+
+    Each pipeline is judged by the stage producing its output (the first one).
+    Trailing filter stages of a wrapped pipeline are dropped; if other stages
+    remain, the pipeline runs inside llm-toto as a single argument. Pipelines
+    the history knows as quiet are left alone.
+    """
+    edits: list[tuple[int, int, str]] = []
+    for stages in pipelines:
+        producer = stages[0]
+        filters = 0
+        while filters < len(stages) - 1 and _is_filter(command, stages[-1 - filters]):
+            filters += 1
+        kept = stages[: len(stages) - filters]
+        end = stages[-1].end
+
+        if producer.group is not None:
+            group_edits = plan_wrapping(command, producer.group, wrapper, history)
+            edits.extend(group_edits)
+            if group_edits and len(kept) == 1 and filters:
+                edits.append((producer.end, end, ""))
+            continue
+
+        text = command[producer.start : producer.end]
+        if producer.redirects_stdout or is_passthrough(text):
+            continue
+        if len(kept) == 1:
+            text = STDERR_REDIRECT_PATTERN.sub(" ", text).strip()
+            if history is None or not history.is_quiet(wrapped_command_text(text)):
+                edits.append((producer.start, end, f"{wrapper} {text}"))
+        elif not any(stage.has_heredoc or stage.redirects_stdout for stage in kept):
+            text = command[producer.start : kept[-1].end]
+            if history is None or not history.is_quiet(text):
+                edits.append((producer.start, end, f"{wrapper} {shlex.quote(text)}"))
+    return edits
+
+
+def _is_filter(command: str, stage: Stage) -> bool:
+    """Whether the stage only picks lines of its input, so the buffered output makes it redundant."""
+    if stage.group is not None or stage.redirects_stdout:
+        return False
+    try:
+        words = shlex.split(command[stage.start : stage.end])
+    except ValueError:
+        return False
+    if not words or words[0] not in FILTER_COMMANDS:
+        return False
+    short_options, long_options = AGGREGATING_FILTER_OPTIONS.get(words[0], ("", set()))
+    for word in words[1:]:
+        if word == "--":
+            break
+        if word.startswith("--"):
+            if word.split("=", 1)[0] in long_options:
+                return False
+        elif word.startswith("-") and any(letter in short_options for letter in word[1:]):
+            return False
+    return True
+
+
+def rewrite_command(command: str, session_id: str, history: CommandHistory | None = None) -> str | None:
+    """Determine if and how to rewrite the command. Returns new command or None.
+
+    Only the pipelines producing expensive output are wrapped, so in
+    `cd app && make build` the `cd` still runs in the Bash tool's shell.
+    """
     stripped = command.strip()
+    wrapper = f"python3 {LLM_TOTO_SCRIPT} --session {session_id} --"
 
-    # Check if the base command should be passed through
-    base = extract_base_command(stripped)
-    if is_passthrough(base):
+    try:
+        pipelines = ShellParser(stripped).parse()
+    except ValueError:
+        # Let the shell report the syntax error
         return None
 
-    # Strip trailing filter pipes
-    rewritten = strip_trailing_pipes(stripped)
+    if any(stage.compound for stages in pipelines for stage in stages):
+        if is_passthrough(stripped) or (history is not None and history.is_quiet(stripped)):
+            return None
+        return f"{wrapper} {shlex.quote(stripped)}"
 
-    # Build the llm-toto command
-    return f"python3 {LLM_TOTO_SCRIPT} --session {session_id} -- {rewritten}"
+    edits = plan_wrapping(stripped, pipelines, wrapper, history)
+    if not edits:
+        return None
+
+    rewritten = stripped
+    for start, end, replacement in sorted(edits, reverse=True):
+        rewritten = rewritten[:start] + replacement + rewritten[end:]
+    return rewritten
 
 
 def main():
@@ -275,7 +651,9 @@ def main():
 
     session_id = input_data.get("session_id", "default")
 
-    new_command = rewrite_command(command, session_id)
+    history = CommandHistory.for_cwd(input_data.get("cwd") or os.getcwd())
+
+    new_command = rewrite_command(command, session_id, history)
 
     if new_command is None:
         # No rewrite needed
@@ -5,8 +5,18 @@ llm-toto: LLM Tool Output Tokens Optimizer
 Wraps shell commands, buffers large outputs to files, and provides
 compact summaries with keyword analysis and preview lines.
 
+The output is processed as a stream of raw bytes: it is kept in memory only
+until it crosses the threshold, after that it goes verbatim to the session
+file. Line count, keyword counts and preview lines are updated as data
+arrives, so memory use stays constant no matter how large the output is.
+Only the preview lines are decoded, so non-UTF-8 output is safe to wrap.
+
 Usage:
-    llm-toto [--session SESSION_ID] [--threshold CHARS] <command...>
+    llm-toto [--session SESSION_ID] [--threshold BYTES] [--keywords LIST] [--compress MODE] [--live] [--rerun-cache SECONDS] <command...>
+    llm-toto cat <file>
+    llm-toto query <file> [--lines A:B] [--grep REGEX [-C N]] [--keywords [LIST]]
+    llm-toto gc [--dry-run]
+    llm-toto history [--threshold BYTES COMMAND | --forget COMMAND]
 
 If output is small (below threshold): prints output as-is.
 If output is large (above threshold): saves to file, prints summary with preview.
@@ -14,16 +24,84 @@ Always propagates the wrapped command's exit code.
 """
 
 import argparse
+import bisect
+import gzip
+import hashlib
+import json
+import mmap
 import os
 import re
 import shlex
+import shutil
+import sqlite3
+import struct
 import subprocess
 import sys
+import tempfile
 import time
+from array import array
+from collections import Counter, deque
 from pathlib import Path
+from typing import BinaryIO
+
+try:
+    from compression import zstd  # Python 3.14+
+except ImportError:
+    zstd = None
 
 DEFAULT_THRESHOLD = 4000
 
+OUTPUT_ROOT = Path("/tmp/llm-toto")
+
+# Compression of the buffered outputs (/tmp is often tmpfs, i.e. RAM)
+COMPRESSION_SUFFIXES = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+GZIP_LEVEL = 1
+
+# Retention limits, enforced after every buffered output and by `llm-toto gc`
+DEFAULT_MAX_SESSION_BYTES = 256 * 1024 * 1024
+DEFAULT_MAX_TOTAL_BYTES = 1024 * 1024 * 1024
+DEFAULT_MAX_AGE_HOURS = 72
+# Other sessions are only checked this often after a buffered output
+GC_INTERVAL_SECONDS = 600
+GC_MARKER = ".last-gc"
+
+# Content-addressed copies of the outputs (hardlinks), so repeated outputs share their data
+BLOBS_DIR = "blobs"
+
+# Per-session index of the commands behind the buffered outputs, to diff re-runs against the previous run
+COMMAND_INDEX = ".commands.jsonl"
+# New and fixed keyword lines listed in the summary of a re-run
+RUN_DIFF_MAX_LINES = 10
+
+# With the rerun cache, the report of each buffered output is kept next to it, to be printed again
+REPORT_SUFFIX = ".report"
+# Commands faster than this are run again even when a cached result exists
+RERUN_CACHE_MIN_SECONDS = 5.0
+
+# Per-project history of wrapped commands (duration, output size, exit code), read by the hook
+HISTORY_DIR = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "llm-toto" / "history"
+# Weight of the newest run in the moving averages
+HISTORY_EWMA_ALPHA = 0.3
+# Commands not run for this long are dropped from the history
+HISTORY_MAX_AGE_DAYS = 90
+# Parts of a line that change between otherwise identical runs (timestamps, durations, addresses)
+VOLATILE_PATTERN = re.compile(
+    r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?|\d{2}:\d{2}:\d{2}(?:[.,]\d+)?"
+    r"|\b\d+(?:\.\d+)?\s?(?:ms|s|sec|seconds|min)\b|\b0x[0-9a-fA-F]+\b"
+)
+
+# Sparse line-offset index written next to every buffered output, used by `llm-toto query`
+LINE_INDEX_SUFFIX = ".idx"
+LINE_INDEX_BLOCK_SIZE = 64 * 1024
+LINE_INDEX_MAGIC = b"TOTOIDX1"
+# magic, block size, line count, output size in bytes - followed by (offset, newlines before) uint64 pairs
+LINE_INDEX_HEADER = struct.Struct("<8sQQQ")
+LINE_INDEX_FLUSH_ENTRIES = 4096
+
+QUERY_DEFAULT_MAX_COUNT = 100
+QUERY_MAX_LINE_LENGTH = 2000
+QUERY_SCAN_CHUNK_SIZE = 1024 * 1024
+
 KEYWORDS = [
     "exception",
     "error",
@@ -31,24 +109,126 @@ KEYWORDS = [
     "warn",
 ]
 
-# Pre-compile keyword patterns (case-insensitive, whole word)
-KEYWORD_PATTERNS = [(kw, re.compile(rf"\b{kw}", re.IGNORECASE)) for kw in KEYWORDS]
+# Keyword hit locations (line, byte offset) are saved next to every buffered output
+KEYWORD_HITS_SUFFIX = ".hits"
+KEYWORD_HITS_MAX = 10000
+# Hit lines listed per keyword in the summary
+KEYWORD_SUMMARY_LOCATIONS = 5
+
 
 PREVIEW_HEAD_LINES = 5
 PREVIEW_TAIL_LINES = 10
 PREVIEW_MAX_LINE_LENGTH = 200
+# Raw bytes kept of each preview line, enough for PREVIEW_MAX_LINE_LENGTH + 1 characters of any UTF-8
+PREVIEW_MAX_LINE_BYTES = (PREVIEW_MAX_LINE_LENGTH + 1) * 4
 # Don't show preview if the omitted portion is less than this fraction of total
 PREVIEW_MIN_OMISSION_RATIO = 0.5
 
+READ_CHUNK_SIZE = 64 * 1024
+
+# Structured summaries (see Summarizer), printed instead of the preview
+SUMMARY_SNIFF_BYTES = 4096
+SUMMARY_MAX_ITEMS = 20
+SUMMARY_MAX_KEYS = 12
+SUMMARY_MAX_LINE_BYTES = 64 * 1024
+JSON_SUMMARY_MAX_BYTES = 8 * 1024 * 1024
+
+
+# Bytes that make up a word in case-folded output (for the keyword word boundary)
+WORD_BYTES = frozenset(b"abcdefghijklmnopqrstuvwxyz0123456789_")
+
+
+class KeywordScanner:
+    """Case-insensitive keyword counter over a stream of bytes chunks.
+
+    Each chunk is case-folded once, then every keyword is found with a literal
+    search, which runs at memchr speed - far faster than a case-insensitive
+    regex (or one combined alternation), which CPython's regex engine has to
+    try at every position. A keyword matches at the start of a word, so
+    "warn" also counts "warning".
+
+    With max_hits, the line number and byte offset of the first max_hits
+    matches of each keyword are recorded as well.
+    """
+
+    def __init__(self, keywords: list[str], max_hits: int = 0):
+        self.keywords = keywords
+        self.max_hits = max_hits
+        self._needles = {kw: kw.lower().encode("utf-8") for kw in keywords}
+        self._patterns = {needle: re.compile(re.escape(needle)) for needle in set(self._needles.values())}
+        # A match starting this close to the end of a chunk might continue in the next one
+        self._lookahead = max((len(needle) for needle in self._patterns), default=1) - 1
+        self._counts = {needle: 0 for needle in self._patterns}
+        self._hits: dict[bytes, list[tuple[int, int]]] = {needle: [] for needle in self._patterns}
+        self._carry = b""
+        self._position = 0
+        self._consumed = 0
+        # Newlines before the start of the carry, only tracked when recording hits
+        self._newlines = 0
 
-def count_keywords(text: str) -> dict[str, int]:
+    def feed(self, data: bytes) -> None:
+        """Scan a chunk, holding back the end that could be the start of a split keyword."""
+        buffer = self._carry + data.lower()
+        base = self._consumed - len(self._carry)
+        self._consumed += len(data)
+        self._scan(buffer, len(buffer) - self._lookahead, base)
+
+    def finish(self) -> None:
+        """Scan what was held back."""
+        self._scan(self._carry, len(self._carry), self._consumed - len(self._carry))
+        self._carry = b""
+        self._position = 0
+
+    def _scan(self, buffer: bytes, limit: int, base: int) -> None:
+        """Count the matches starting between the current position and limit."""
+        position = self._position
+        if limit > position:
+            for needle, pattern in self._patterns.items():
+                needs_boundary = needle[0] in WORD_BYTES
+                hits = self._hits[needle]
+                # Line numbers of the hits are counted forward from the previous hit
+                cursor, newlines = 0, self._newlines
+                count = 0
+                for match in pattern.finditer(buffer, position, limit + len(needle) - 1):
+                    start = match.start()
+                    if needs_boundary and start > 0 and buffer[start - 1] in WORD_BYTES:
+                        continue
+                    count += 1
+                    if len(hits) < self.max_hits:
+                        newlines += buffer.count(b"\n", cursor, start)
+                        cursor = start
+                        hits.append((newlines + 1, base + start))
+                self._counts[needle] += count
+            position = limit
+        # Keep one byte before the next scan position as context for the word boundary
+        keep_from = max(position - 1, 0)
+        if self.max_hits:
+            self._newlines += buffer.count(b"\n", 0, keep_from)
+        self._carry = buffer[keep_from:]
+        self._position = position - keep_from
+
+    @property
+    def counts(self) -> dict[str, int]:
+        """Non-zero counts, in the configured keyword order."""
+        return {kw: self._counts[self._needles[kw]] for kw in self.keywords if self._counts[self._needles[kw]]}
+
+    @property
+    def hits(self) -> dict[str, list[tuple[int, int]]]:
+        """Recorded (line, byte offset) hits of the keywords that were found, in the configured keyword order."""
+        return {kw: self._hits[self._needles[kw]] for kw in self.keywords if self._counts[self._needles[kw]]}
+
+
+def parse_keywords(value: str) -> list[str]:
+    """Parse a comma-separated keyword list."""
+    return [kw.strip() for kw in value.split(",") if kw.strip()]
+
+
+def count_keywords(text: str, keywords: list[str] | None = None) -> dict[str, int]:
     """Count occurrences of each keyword in the text."""
-    counts = {}
-    for keyword, pattern in KEYWORD_PATTERNS:
-        count = len(pattern.findall(text))
-        if count > 0:
-            counts[keyword] = count
-    return counts
+    scanner = KeywordScanner(KEYWORDS if keywords is None else keywords)
+    scanner.feed(text.encode("utf-8"))
+    scanner.finish()
+    return scanner.counts
 
 
 def format_keyword_summary(counts: dict[str, int]) -> str:
@@ -59,7 +239,58 @@ def format_keyword_summary(counts: dict[str, int]) -> str:
     return ", ".join(parts)
 
 
-def should_show_preview(lines: list[str], output_len: int) -> bool:
+def format_keyword_locations(hits: dict[str, list[tuple[int, int]]], limit: int = KEYWORD_SUMMARY_LOCATIONS) -> list[str]:
+    """Format the first hit lines of each keyword as 'error: L1042, L1088, L5531'."""
+    result = []
+    for kw, kw_hits in hits.items():
+        lines: list[int] = []
+        for line, _ in kw_hits:
+            if not lines or lines[-1] != line:
+                lines.append(line)
+        shown = ", ".join(f"L{line}" for line in lines[:limit])
+        result.append(f"{kw}: {shown}{', ...' if len(lines) > limit else ''}")
+    return result
+
+
+def write_keyword_hits(path: Path, scanner: "KeywordScanner") -> None:
+    """Save the keyword hits of an output for `llm-toto query --keywords`."""
+    data = {
+        "keywords": scanner.keywords,
+        "max_hits": scanner.max_hits,
+        "counts": scanner.counts,
+        "hits": scanner.hits,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, separators=(",", ":"))
+
+
+def read_keyword_hits(path: Path, keywords: list[str]) -> tuple[dict[str, int], dict[str, list[tuple[int, int]]]] | None:
+    """Load the saved (counts, hits) of the given keywords, None if they weren't all recorded."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    recorded = {kw.lower() for kw in data.get("keywords", [])}
+    if not all(kw.lower() in recorded for kw in keywords):
+        return None
+    # Keywords are case-insensitive, so match them up ignoring case
+    counts = {kw.lower(): count for kw, count in data.get("counts", {}).items()}
+    hits = {kw.lower(): [tuple(hit) for hit in kw_hits] for kw, kw_hits in data.get("hits", {}).items()}
+    return (
+        {kw: counts[kw.lower()] for kw in keywords if kw.lower() in counts},
+        {kw: hits[kw.lower()] for kw in keywords if kw.lower() in counts},
+    )
+
+
+def preview_lines(head_lines: list[str], tail_lines: list[str], total: int) -> list[str]:
+    """Pick the lines shown in the preview from the captured first and last lines."""
+    head = min(PREVIEW_HEAD_LINES, total)
+    tail = min(PREVIEW_TAIL_LINES, total - head)
+    return head_lines[:head] + (tail_lines[-tail:] if tail > 0 else [])
+
+
+def should_show_preview(head_lines: list[str], tail_lines: list[str], total: int, output_len: int) -> bool:
     """Decide whether a preview is useful for this output.
 
     Returns False if:
@@ -67,18 +298,14 @@ def should_show_preview(lines: list[str], output_len: int) -> bool:
     - The omitted portion would be less than PREVIEW_MIN_OMISSION_RATIO of the total
       (preview shows almost everything, so it's pointless)
     """
-    total = len(lines)
-    head = min(PREVIEW_HEAD_LINES, total)
-    tail = min(PREVIEW_TAIL_LINES, total - head)
-
-    preview_lines = lines[:head] + lines[-tail:] if tail > 0 else lines[:head]
+    lines = preview_lines(head_lines, tail_lines, total)
 
     # Guard: any preview line too long means preview is useless noise
-    if any(len(line) > PREVIEW_MAX_LINE_LENGTH for line in preview_lines):
+    if any(len(line) > PREVIEW_MAX_LINE_LENGTH for line in lines):
         return False
 
     # Guard: if the omitted portion is too small relative to total, skip preview
-    preview_chars = sum(len(line) for line in preview_lines)
+    preview_chars = sum(len(line) for line in lines)
     omitted_chars = output_len - preview_chars
     if omitted_chars < output_len * PREVIEW_MIN_OMISSION_RATIO:
         return False
@@ -86,60 +313,1574 @@ def should_show_preview(lines: list[str], output_len: int) -> bool:
     return True
 
 
-def make_preview(lines: list[str], head: int = PREVIEW_HEAD_LINES, tail: int = PREVIEW_TAIL_LINES) -> str:
+def make_preview(
+    head_lines: list[str],
+    tail_lines: list[str],
+    total: int,
+    head: int = PREVIEW_HEAD_LINES,
+    tail: int = PREVIEW_TAIL_LINES,
+) -> str:
     """Create a preview showing first N and last M lines."""
-    total = len(lines)
-
     if total <= head + tail:
-        return "\n".join(lines)
+        return "\n".join(preview_lines(head_lines, tail_lines, total))
 
-    head_lines = lines[:head]
-    tail_lines = lines[-tail:]
     skipped = total - head - tail
 
-    return "\n".join(head_lines) + f"\n... ({skipped} lines omitted) ...\n" + "\n".join(tail_lines)
+    return "\n".join(head_lines[:head]) + f"\n... ({skipped} lines omitted) ...\n" + "\n".join(tail_lines[-tail:])
+
+
+class Summarizer:
+    """Incremental parser of one tool's output into a compact summary.
+
+    Subclasses define LINE_PATTERN, a MULTILINE regex with one named group
+    per kind of interesting line, and handle() its matches. The pattern runs
+    over the complete lines of each chunk, so only the matching lines cost
+    any Python work.
+    """
+
+    name = ""
+    # Selects the summarizer by the wrapped command
+    COMMAND_PATTERN: "re.Pattern[str] | None" = None
+    # Selects the summarizer by the start of the output, when no command pattern matched
+    SNIFF_PATTERN: "re.Pattern[bytes] | None" = None
+    LINE_PATTERN: "re.Pattern[bytes]" = re.compile(rb"(?!)")
+
+    def __init__(self):
+        self._carry = b""
+
+    def feed(self, data: bytes) -> None:
+        end = data.rfind(b"\n")
+        if end == -1:
+            if len(self._carry) < SUMMARY_MAX_LINE_BYTES:
+                self._carry += data
+            return
+        block = self._carry + data[: end + 1]
+        self._carry = data[end + 1 :][:SUMMARY_MAX_LINE_BYTES]
+        self._parse(block)
+
+    def finish(self) -> None:
+        if self._carry:
+            self._parse(self._carry + b"\n")
+            self._carry = b""
+
+    def _parse(self, block: bytes) -> None:
+        for match in self.LINE_PATTERN.finditer(block):
+            self.handle(match.lastgroup, match)
+
+    def handle(self, kind: str, match: "re.Match[bytes]") -> None:
+        """Record one LINE_PATTERN match, the default LINE_PATTERN never matches."""
+
+    def summary(self) -> list[str]:
+        """The summary lines, empty if the output wasn't recognized."""
+        return []
+
+
+def _summary_text(value: bytes) -> str:
+    return _truncate_line(value.decode("utf-8", errors="replace").strip())
+
+
+def _summary_list(title: str, items: dict[str, None], total: int) -> list[str]:
+    """A titled list of at most SUMMARY_MAX_ITEMS items."""
+    if not items:
+        return []
+    lines = [f"{title} ({total}):"]
+    lines.extend(f"  {item}" for item in list(items)[:SUMMARY_MAX_ITEMS])
+    if total > SUMMARY_MAX_ITEMS:
+        lines.append(f"  ... ({total - SUMMARY_MAX_ITEMS} more)")
+    return lines
+
+
+class PytestSummarizer(Summarizer):
+    """Failed tests from the short test summary, and the final counts."""
+
+    name = "pytest"
+    COMMAND_PATTERN = re.compile(r"\bpytest\b|\bpy\.test\b")
+    SNIFF_PATTERN = re.compile(rb"^=+ test session starts =+", re.MULTILINE)
+    LINE_PATTERN = re.compile(
+        rb"^(?P<failed>(?:FAILED|ERROR) [^\r\n]+)"
+        rb"|^=+ (?P<totals>[^\r\n]*\b(?:passed|failed|errors?|skipped|deselected|no tests ran)\b[^\r\n]*?) =+\r?$",
+        re.MULTILINE,
+    )
+
+    def __init__(self):
+        super().__init__()
+        self.failed: dict[str, None] = {}
+        self.totals: str | None = None
+
+    def handle(self, kind: str, match: "re.Match[bytes]") -> None:
+        if kind == "failed":
+            self.failed[_summary_text(match.group(kind))] = None
+        else:
+            self.totals = _summary_text(match.group(kind))
+
+    def summary(self) -> list[str]:
+        lines = [f"Result: {self.totals}"] if self.totals else []
+        return lines + _summary_list("Failed", self.failed, len(self.failed))
+
+
+class JestSummarizer(Summarizer):
+    """Failed test files and test names, and the final counts (jest, vitest)."""
+
+    name = "jest"
+    COMMAND_PATTERN = re.compile(r"\b(?:jest|vitest)\b")
+    SNIFF_PATTERN = re.compile(rb"^(?:> (?:jest|vitest)\b|\s*(?:PASS|FAIL) \S+\.(?:[cm]?[jt]sx?)\b)", re.MULTILINE)
+    LINE_PATTERN = re.compile(
+        rb"^\s*FAIL\s+(?P<failed_file>\S[^\r\n]*)"
+        rb"|^\s*\xe2\x97\x8f (?P<failed_test>[^\r\n]+)"  # "● Suite › test"
+        rb"|^(?P<totals>(?:Test Suites|Tests|Snapshots):\s+[^\r\n]+)",
+        re.MULTILINE,
+    )
+
+    def __init__(self):
+        super().__init__()
+        self.failed_files: dict[str, None] = {}
+        self.failed_tests: dict[str, None] = {}
+        self.totals: dict[str, str] = {}
+
+    def handle(self, kind: str, match: "re.Match[bytes]") -> None:
+        text = _summary_text(match.group(kind))
+        if kind == "failed_file":
+            self.failed_files[text] = None
+        elif kind == "failed_test":
+            self.failed_tests[text] = None
+        else:
+            self.totals[text.split(":", 1)[0]] = text
+
+    def summary(self) -> list[str]:
+        return (
+            list(self.totals.values())
+            + _summary_list("Failed files", self.failed_files, len(self.failed_files))
+            + _summary_list("Failed tests", self.failed_tests, len(self.failed_tests))
+        )
+
+
+class MavenSummarizer(Summarizer):
+    """Compiler errors, failed tests, test counts and the build result."""
+
+    name = "maven"
+    COMMAND_PATTERN = re.compile(r"(?:^|[\s/])mvnw?\b")
+    SNIFF_PATTERN = re.compile(rb"^\[INFO\] Scanning for projects", re.MULTILINE)
+    LINE_PATTERN = re.compile(
+        rb"^\[ERROR\] (?P<compile_error>\S+\.(?:java|kt|scala|groovy):\[\d+,\d+\] [^\r\n]+)"
+        rb"|^\[ERROR\] {3}(?P<failed_test>\S[^\r\n]*)"
+        rb"|^\[(?:INFO|WARNING|ERROR)\] (?P<tests>Tests run: \d+, Failures: \d+, Errors: \d+, Skipped: \d+)\r?$"
+        rb"|^\[INFO\] (?P<result>BUILD (?:SUCCESS|FAILURE))",
+        re.MULTILINE,
+    )
+
+    def __init__(self):
+        super().__init__()
+        self.compile_errors: dict[str, None] = {}
+        self.failed_tests: dict[str, None] = {}
+        self.tests: str | None = None
+        self.result: str | None = None
+
+    def handle(self, kind: str, match: "re.Match[bytes]") -> None:
+        text = _summary_text(match.group(kind))
+        if kind == "compile_error":
+            self.compile_errors[text] = None
+        elif kind == "failed_test":
+            self.failed_tests[text] = None
+        elif kind == "tests":
+            # The last one is the total over all modules
+            self.tests = text
+        else:
+            self.result = text
+
+    def summary(self) -> list[str]:
+        lines = [f"Result: {' - '.join(part for part in (self.result, self.tests) if part)}"] if self.result else []
+        return (
+            lines
+            + _summary_list("Compiler errors", self.compile_errors, len(self.compile_errors))
+            + _summary_list("Failed tests", self.failed_tests, len(self.failed_tests))
+        )
+
+
+class CargoSummarizer(Summarizer):
+    """Compiler errors with their locations, warning count, failed tests and test results."""
+
+    name = "cargo"
+    COMMAND_PATTERN = re.compile(r"\bcargo\b")
+    SNIFF_PATTERN = re.compile(rb"^ +Compiling \S+ v\d", re.MULTILINE)
+    LINE_PATTERN = re.compile(
+        rb"^(?P<diagnostic>(?:error|warning)(?:\[\w+\])?: [^\r\n]+)"
+        rb"|^ *--> (?P<location>[^\r\n]+)"
+        rb"|^test (?P<failed_test>\S+) \.\.\. FAILED\r?$"
+        rb"|^test result: (?P<test_result>[^\r\n]+)",
+        re.MULTILINE,
+    )
+    # Aggregate messages without a location of their own
+    AGGREGATE_PATTERN = re.compile(r"^(?:error|warning): (?:could not compile|aborting due to|`[^`]+` \(.*\) generated)")
+
+    def __init__(self):
+        super().__init__()
+        self.errors: dict[str, None] = {}
+        self.error_count = 0
+        self.warning_count = 0
+        self.failed_tests: dict[str, None] = {}
+        self.test_results: list[str] = []
+        self._last: str | None = None
+
+    def handle(self, kind: str, match: "re.Match[bytes]") -> None:
+        text = _summary_text(match.group(kind))
+        if kind == "diagnostic":
+            self._last = None
+            if self.AGGREGATE_PATTERN.match(text):
+                return
+            if text.startswith("error"):
+                self.error_count += 1
+                self._last = text
+            else:
+                self.warning_count += 1
+        elif kind == "location":
+            if self._last is not None and len(self.errors) < SUMMARY_MAX_ITEMS:
+                self.errors[f"{text}: {self._last}"] = None
+            self._last = None
+        elif kind == "failed_test":
+            self.failed_tests[text] = None
+        else:
+            self.test_results.append(text)
+
+    def summary(self) -> list[str]:
+        lines = []
+        if self.error_count or self.warning_count:
+            lines.append(f"Compiler: {self.error_count} errors, {self.warning_count} warnings")
+        lines += _summary_list("Errors", self.errors, self.error_count)
+        lines += _summary_list("Failed tests", self.failed_tests, len(self.failed_tests))
+        lines += [f"Test result: {result}" for result in self.test_results[-SUMMARY_MAX_ITEMS:]]
+        return lines
+
+
+class _JsonContainer:
+    """An object or array being scanned by JsonSummarizer."""
+
+    __slots__ = ("is_object", "commas", "has_value", "keys", "expect_key", "key", "values", "first", "open_at", "value_at", "closed")
+
+    def __init__(self, is_object: bool, open_at: int):
+        self.is_object = is_object
+        self.commas = 0
+        self.has_value = False
+        # Keys, collected for the top-level object and the first element of arrays
+        self.keys: list[str] | None = None
+        self.expect_key = is_object
+        self.key: str | None = None
+        # Descriptions of the values of the top-level object
+        self.values: dict[str, object] | None = None
+        # The first element of an array
+        self.first: "_JsonContainer | None" = None
+        # Where the container, and the value of the current key, start in the current block (-1 if in an earlier one)
+        self.open_at = open_at
+        self.value_at = -1
+        # False while the closing bracket hasn't been seen (the scan was cut off)
+        self.closed = False
+
+    @property
+    def length(self) -> int:
+        return self.commas + 1 if self.commas or self.has_value else 0
+
+
+class JsonSummarizer(Summarizer):
+    """Shape of a JSON document: top-level keys and types, array lengths, keys of array elements.
+
+    A tokenizer regex finds the strings and structural characters, so the
+    nesting is tracked without parsing (or loading) the document. Only the
+    first few levels are described. JSON lines (one document per line) are
+    counted.
+    """
+
+    name = "json"
+    COMMAND_PATTERN = re.compile(r"(?:-o|--output)[= ]?json\b|--format[= ]?json\b|--json\b|\bjq\b")
+    SNIFF_PATTERN = re.compile(rb"\A\s*[\[{]")
+    # A string (possibly unterminated at the end of the block) or a structural character
+    TOKEN_PATTERN = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*(?:"|\\?\Z)|[\[\]{},:]')
+    # Nesting levels described in the summary (top-level values and the keys of their first elements)
+    MAX_DEPTH = 3
+
+    def __init__(self):
+        super().__init__()
+        self.root: _JsonContainer | None = None
+        self.documents = 0
+        self.scanned = 0
+        self.truncated = False
+        self._stack: list[_JsonContainer | None] = []
+        self._block = b""
+        # Start of a top-level scalar value continuing in the current block
+        self._scalar_prefix: bytes | None = None
+
+    def feed(self, data: bytes) -> None:
+        if self.truncated:
+            return
+        if self.scanned + len(data) > JSON_SUMMARY_MAX_BYTES:
+            self.truncated = True
+            return
+        self.scanned += len(data)
+        block = self._carry + data
+        self._carry = b""
+        root = self.root
+        if root is not None and root.values is not None and root.key not in root.values:
+            if root.value_at != -1:
+                self._scalar_prefix = self._block[root.value_at + 1 :][:PREVIEW_MAX_LINE_BYTES]
+            elif self._scalar_prefix is not None:
+                self._scalar_prefix = (self._scalar_prefix + self._block)[:PREVIEW_MAX_LINE_BYTES]
+        for container in self._stack:
+            if container is not None:
+                if not container.has_value:
+                    # Only scalars (no tokens of their own) can follow the opening bracket in the old block
+                    start = container.open_at + 1 if container.open_at != -1 else 0
+                    container.has_value = bool(self._block[start:].strip())
+                container.open_at = container.value_at = -1
+        self._block = block
+        for match in self.TOKEN_PATTERN.finditer(block):
+            token = match.group()
+            if token[0] == 0x22 and (len(token) == 1 or token[-1] != 0x22 or _escaped_quote(token)):
+                # A string continuing in the next chunk, keep just enough to finish it
+                if len(token) > SUMMARY_MAX_LINE_BYTES:
+                    trailing = len(token) - len(token.rstrip(b"\\"))
+                    token = b'"' + b"\\" * (trailing % 2)
+                self._carry = token
+                break
+            self._token(token, match.start())
+
+    def finish(self) -> None:
+        self._carry = b""
+
+    def _token(self, token: bytes, position: int) -> None:
+        stack = self._stack
+        current = stack[-1] if stack else None
+        first = token[0]
+        if first == 0x7B or first == 0x5B:  # { [
+            if not stack:
+                self.documents += 1
+            if current is not None:
+                current.has_value = True
+            if len(stack) >= self.MAX_DEPTH:
+                stack.append(None)
+                return
+            container = _JsonContainer(first == 0x7B, position)
+            if not stack and self.root is None:
+                self.root = container
+                if container.is_object:
+                    container.keys, container.values = [], {}
+            elif current is not None and current is self.root and current.values is not None:
+                current.values[current.key or ""] = container
+                if container.is_object:
+                    container.keys = []
+            elif current is not None and not current.is_object and current.first is None and not current.commas:
+                current.first = container
+                if container.is_object:
+                    container.keys = []
+            stack.append(container)
+        elif first == 0x7D or first == 0x5D:  # } ]
+            if not stack:
+                return
+            container = stack.pop()
+            if container is not None:
+                container.closed = True
+            if container is not None and not container.has_value:
+                start = container.open_at + 1 if container.open_at != -1 else 0
+                container.has_value = bool(self._block[start:position].strip())
+            if current is not None and current is self.root and current.values is not None:
+                self._scalar(current, position)
+        elif current is None:
+            return
+        elif first == 0x2C:  # ,
+            if current is self.root and current.values is not None:
+                self._scalar(current, position)
+            current.commas += 1
+            current.expect_key = current.is_object
+        elif first == 0x3A:  # :
+            current.expect_key = False
+            current.value_at = position
+            self._scalar_prefix = None
+        elif current.expect_key:
+            current.key = token[1:-1].decode("utf-8", errors="replace")
+            if current.keys is not None and len(current.keys) <= SUMMARY_MAX_ITEMS:
+                current.keys.append(current.key)
+        else:
+            current.has_value = True
+            if current.values is not None:
+                current.values[current.key or ""] = _truncate_line(token.decode("utf-8", errors="replace"))
+
+    def _scalar(self, container: _JsonContainer, position: int) -> None:
+        """Record a number, boolean or null value of the top-level object, which has no token of its own."""
+        if container.key is not None and container.key not in container.values:
+            if container.value_at != -1:
+                value = self._block[container.value_at + 1 : position].strip()
+            elif self._scalar_prefix is not None:
+                value = (self._scalar_prefix + self._block[:position]).strip()
+            else:
+                return
+            if value:
+                container.values[container.key] = _truncate_line(value.decode("utf-8", errors="replace"))
+
+    def summary(self) -> list[str]:
+        root = self.root
+        if root is None:
+            return []
+        if self.documents > 1:
+            lines = [f"JSON lines: {self.documents} documents, the first one is {_describe_json(root)}"]
+        elif root.is_object:
+            lines = [f"JSON object with {len(root.keys)}{'+' if len(root.keys) > SUMMARY_MAX_ITEMS else ''} keys:"]
+            for key in root.keys[:SUMMARY_MAX_ITEMS]:
+                value = root.values.get(key)
+                lines.append(f"  {key}: {_describe_json(value) if isinstance(value, _JsonContainer) else value or '...'}")
+            if len(root.keys) > SUMMARY_MAX_ITEMS:
+                lines.append("  ...")
+        else:
+            lines = [f"JSON {_describe_json(root)}"]
+        if self.truncated:
+            lines.append(f"(only the first {JSON_SUMMARY_MAX_BYTES // 1024 // 1024} MB were scanned)")
+        return lines
+
+
+def _escaped_quote(token: bytes) -> bool:
+    """Whether a token ending with a quote actually ends with an escaped quote (so the string continues)."""
+    body = token[1:-1]
+    return (len(body) - len(body.rstrip(b"\\"))) % 2 == 1
+
+
+def _describe_json(container: "_JsonContainer") -> str:
+    if container.is_object:
+        return "object" if container.keys is None else f"object {{{_json_keys(container.keys)}}}"
+    description = f"array[{container.length}{'' if container.closed else '+'}]"
+    if container.first is not None and container.first.keys:
+        description += f" of objects {{{_json_keys(container.first.keys)}}}"
+    elif container.first is not None:
+        description += " of objects" if container.first.is_object else " of arrays"
+    return description
+
+
+def _json_keys(keys: list[str]) -> str:
+    shown = ", ".join(keys[:SUMMARY_MAX_KEYS])
+    return shown + (", ..." if len(keys) > SUMMARY_MAX_KEYS else "")
+
+
+SUMMARIZERS = [PytestSummarizer, JestSummarizer, MavenSummarizer, CargoSummarizer, JsonSummarizer]
+
+
+def select_summarizer(command: str, head: bytes) -> Summarizer | None:
+    """Pick the summarizer for the wrapped command, or for the start of its output."""
+    for summarizer in SUMMARIZERS:
+        if summarizer.COMMAND_PATTERN is not None and summarizer.COMMAND_PATTERN.search(command):
+            return summarizer()
+    for summarizer in SUMMARIZERS:
+        if summarizer.SNIFF_PATTERN is not None and summarizer.SNIFF_PATTERN.search(head):
+            return summarizer()
+    return None
 
 
 def get_output_dir(session_id: str) -> Path:
     """Get or create the output directory for this session."""
-    output_dir = Path("/tmp/llm-toto") / session_id
+    output_dir = OUTPUT_ROOT / session_id
     output_dir.mkdir(parents=True, exist_ok=True)
     return output_dir
 
 
-def save_output(output_dir: Path, content: str) -> Path:
-    """Save output to a timestamped file."""
-    timestamp = int(time.time() * 1000)
-    output_file = output_dir / f"{timestamp}.txt"
-    output_file.write_text(content, encoding="utf-8")
-    return output_file
+def resolve_compression(compression: str) -> str:
+    """Fall back to gzip when zstd isn't available in this Python."""
+    if compression == "zstd" and zstd is None:
+        return "gzip"
+    return compression if compression in COMPRESSION_SUFFIXES else "none"
+
+
+def create_output_file(output_dir: Path, compression: str = "none") -> tuple[Path, BinaryIO]:
+    """Create a new output file, named by timestamp and PID, and open it for writing.
+
+    The name is reserved with O_EXCL, so two commands finishing in the same
+    millisecond never overwrite each other.
+    """
+    base = f"{int(time.time() * 1000)}-{os.getpid()}"
+    suffix = ".txt" + COMPRESSION_SUFFIXES[compression]
+    attempt = 0
+    while True:
+        path = output_dir / (base + (f"-{attempt}" if attempt else "") + suffix)
+        try:
+            os.close(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644))
+            break
+        except FileExistsError:
+            attempt += 1
+
+    if compression == "gzip":
+        return path, gzip.open(path, "wb", compresslevel=GZIP_LEVEL)
+    if compression == "zstd":
+        return path, zstd.open(path, "wb")
+    return path, open(path, "wb")
+
+
+def open_output(path: Path) -> BinaryIO:
+    """Open a buffered output for reading, decompressing it on the fly."""
+    if path.name.endswith(".gz"):
+        return gzip.open(path, "rb")
+    if path.name.endswith(".zst"):
+        if zstd is None:
+            raise RuntimeError(f"{path} is zstd-compressed, reading it needs Python 3.14+")
+        return zstd.open(path, "rb")
+    return open(path, "rb")
+
+
+def sidecar_path(output_file: Path, suffix: str) -> Path:
+    """Path of a file stored next to an output, e.g. its line index."""
+    return output_file.parent / (output_file.name.split(".", 1)[0] + suffix)
+
+
+def parse_size(value: str) -> int:
+    """Parse a byte size like '512M' or '2G'."""
+    value = value.strip().upper().rstrip("B")
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+
+class RetentionPolicy:
+    """Limits on the disk (or tmpfs) space used by buffered outputs."""
+
+    def __init__(self, max_session_bytes: int, max_total_bytes: int, max_age_seconds: float):
+        self.max_session_bytes = max_session_bytes
+        self.max_total_bytes = max_total_bytes
+        self.max_age_seconds = max_age_seconds
+
+    @classmethod
+    def from_env(cls) -> "RetentionPolicy":
+        return cls(
+            max_session_bytes=parse_size(os.environ.get("LLM_TOTO_MAX_SESSION_BYTES", str(DEFAULT_MAX_SESSION_BYTES))),
+            max_total_bytes=parse_size(os.environ.get("LLM_TOTO_MAX_TOTAL_BYTES", str(DEFAULT_MAX_TOTAL_BYTES))),
+            max_age_seconds=float(os.environ.get("LLM_TOTO_MAX_AGE_HOURS", DEFAULT_MAX_AGE_HOURS)) * 3600,
+        )
+
+
+class StoredOutput:
+    """A buffered output together with its sidecar files (same name up to the first dot)."""
+
+    def __init__(self, session_dir: Path, key: str):
+        self.session_dir = session_dir
+        self.key = key
+        self.paths: list[Path] = []
+        self.size = 0
+        self.mtime = 0.0
+
+    def remove(self) -> None:
+        for path in self.paths:
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def list_outputs(session_dir: Path) -> list[StoredOutput]:
+    """List the stored outputs of a session, oldest first.
+
+    Outputs deduplicated into the same blob are hardlinks. Their data is
+    counted for the newest one only, since removing the older ones frees
+    nothing.
+    """
+    outputs: dict[str, StoredOutput] = {}
+    shared: dict[str, list[os.stat_result]] = {}
+    try:
+        entries = list(os.scandir(session_dir))
+    except FileNotFoundError:
+        return []
+    for entry in entries:
+        if not entry.is_file(follow_symlinks=False) or entry.name.startswith("."):
+            continue
+        key = entry.name.split(".", 1)[0]
+        output = outputs.setdefault(key, StoredOutput(session_dir, key))
+        stat = entry.stat(follow_symlinks=False)
+        output.paths.append(Path(entry.path))
+        if stat.st_nlink > 1:
+            shared.setdefault(key, []).append(stat)
+        else:
+            output.size += stat.st_size
+        output.mtime = max(output.mtime, stat.st_mtime)
+
+    result = sorted(outputs.values(), key=lambda output: output.mtime)
+    seen_inodes = set()
+    for output in reversed(result):
+        for stat in shared.get(output.key, []):
+            if stat.st_ino not in seen_inodes:
+                seen_inodes.add(stat.st_ino)
+                output.size += stat.st_size
+    return result
+
+
+def collect_garbage(
+    policy: RetentionPolicy,
+    sessions: list[str] | None = None,
+    keep: Path | None = None,
+    dry_run: bool = False,
+) -> list[StoredOutput]:
+    """Remove outputs that are too old or over the size limits, oldest first.
+
+    Only the given sessions are checked (all of them if None), the total limit
+    is only enforced when checking all sessions. The output `keep` (the one
+    just written) is never removed. Returns the removed outputs.
+    """
+    if sessions is None:
+        try:
+            session_dirs = [Path(entry.path) for entry in os.scandir(OUTPUT_ROOT) if entry.is_dir()]
+        except FileNotFoundError:
+            return []
+    else:
+        session_dirs = [OUTPUT_ROOT / session for session in sessions]
+
+    keep_key = (keep.parent, keep.name.split(".", 1)[0]) if keep is not None else None
+    cutoff = time.time() - policy.max_age_seconds
+    removed: list[StoredOutput] = []
+    remaining: list[StoredOutput] = []
+
+    for session_dir in session_dirs:
+        outputs = [output for output in list_outputs(session_dir) if (output.session_dir, output.key) != keep_key]
+        session_bytes = sum(output.size for output in outputs)
+        for output in outputs:
+            if output.mtime < cutoff or session_bytes > policy.max_session_bytes:
+                removed.append(output)
+                session_bytes -= output.size
+            else:
+                remaining.append(output)
+
+    if sessions is None:
+        total_bytes = sum(output.size for output in remaining)
+        for output in sorted(remaining, key=lambda output: output.mtime):
+            if total_bytes <= policy.max_total_bytes:
+                break
+            removed.append(output)
+            total_bytes -= output.size
+
+    if not dry_run:
+        for output in removed:
+            output.remove()
+        for session_dir in session_dirs:
+            remove_orphaned_blobs(session_dir)
+            prune_command_index(session_dir)
+            try:
+                session_dir.rmdir()  # only succeeds when empty
+            except OSError:
+                pass
+    return removed
+
+
+def deduplicate_output(output_file: Path, digest: str) -> Path | None:
+    """Store the output content-addressed, as a hardlink to the blob of its content.
+
+    If the blob already exists, the output is replaced by another link to it,
+    and the earlier output with the same content is returned. Best-effort.
+    """
+    blobs_dir = output_file.parent / BLOBS_DIR
+    # Keep the extension, compressed blobs are only shared between outputs with the same compression
+    blob = blobs_dir / (digest + "." + output_file.name.split(".", 1)[1])
+    try:
+        blobs_dir.mkdir(exist_ok=True)
+        try:
+            os.link(output_file, blob)
+            return None
+        except FileExistsError:
+            pass
+        tmp_path = output_file.with_name(output_file.name + ".tmp")
+        os.link(blob, tmp_path)
+        os.replace(tmp_path, output_file)
+        inode = blob.stat().st_ino
+    except OSError:
+        return None
+
+    # The newest other output linked to the same blob
+    for output in reversed(list_outputs(output_file.parent)):
+        for path in output.paths:
+            if path != output_file and path.stat().st_ino == inode:
+                return path
+    return None
+
+
+def remove_orphaned_blobs(session_dir: Path) -> None:
+    """Remove the blobs no output links to anymore."""
+    blobs_dir = session_dir / BLOBS_DIR
+    try:
+        for entry in os.scandir(blobs_dir):
+            if entry.stat(follow_symlinks=False).st_nlink == 1:
+                os.unlink(entry.path)
+        blobs_dir.rmdir()  # only succeeds when empty
+    except OSError:
+        pass
+
+
+def command_key(command: str, cwd: str) -> str:
+    """Identify a command by its whitespace-normalized text and working directory."""
+    normalized = json.dumps([" ".join(command.split()), cwd])
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+def read_command_index(session_dir: Path) -> list[dict]:
+    """The entries of the session's command index, oldest first."""
+    try:
+        with open(session_dir / COMMAND_INDEX, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+    except OSError:
+        return []
+    entries = []
+    for line in lines:
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            continue
+    return entries
+
+
+def find_previous_run(session_dir: Path, key: str) -> Path | None:
+    """The newest still existing output of the same command in the session."""
+    for entry in reversed(read_command_index(session_dir)):
+        if entry.get("key") == key and (session_dir / entry.get("file", "")).is_file():
+            return session_dir / entry["file"]
+    return None
+
+
+def record_run(output_file: Path, key: str, command: str, details: dict | None = None) -> None:
+    """Add a buffered output to the session's command index. Best-effort."""
+    line = json.dumps({"key": key, "file": output_file.name, "command": command, **(details or {})}) + "\n"
+    try:
+        fd = os.open(output_file.parent / COMMAND_INDEX, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line.encode("utf-8"))
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
+
+
+def worktree_fingerprint(cwd: str) -> str | None:
+    """Digest of the size and mtime of the project's files, as listed by git.
+
+    Covers tracked and untracked files that aren't ignored, plus the git
+    index, HEAD and its reflog, so commits and checkouts count as changes.
+    None outside of a git work tree.
+    """
+    root = find_project_root(cwd)
+    try:
+        listing = subprocess.run(
+            ["git", "ls-files", "-z", "--cached", "--others", "--exclude-standard"],
+            cwd=root,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            timeout=30,
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if listing.returncode != 0:
+        return None
+
+    digest = hashlib.sha256()
+    for name in listing.stdout.split(b"\0") + [b".git/index", b".git/HEAD", b".git/logs/HEAD"]:
+        if not name:
+            continue
+        try:
+            stat = os.stat(os.path.join(os.fsencode(root), name))
+            digest.update(name + struct.pack("<qq", stat.st_size, stat.st_mtime_ns))
+        except OSError:
+            digest.update(name + b"\0")
+    return digest.hexdigest()
+
+
+def find_cached_run(session_dir: Path, key: str, fingerprint: str, max_age: float) -> dict | None:
+    """The index entry of the newest run of the command, if it can be served instead of running it again.
+
+    It must have finished within max_age seconds, with the work tree as it is
+    now, and have been slow enough to be worth it.
+    """
+    for entry in reversed(read_command_index(session_dir)):
+        if entry.get("key") != key:
+            continue
+        output_file = session_dir / entry.get("file", "")
+        if (
+            entry.get("fingerprint") == fingerprint
+            and time.time() - entry.get("time", 0) <= max_age
+            and entry.get("duration", 0) >= RERUN_CACHE_MIN_SECONDS
+            and output_file.is_file()
+            and sidecar_path(output_file, REPORT_SUFFIX).is_file()
+        ):
+            return entry
+        return None
+    return None
+
+
+def prune_command_index(session_dir: Path) -> None:
+    """Drop the index entries of removed outputs, and the index once it is empty."""
+    path = session_dir / COMMAND_INDEX
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+        kept = []
+        for line in lines:
+            try:
+                if (session_dir / json.loads(line).get("file", "")).is_file():
+                    kept.append(line)
+            except ValueError:
+                continue
+        if not kept:
+            path.unlink()
+        elif len(kept) < len(lines):
+            tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.writelines(kept)
+            os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+
+def history_enabled() -> bool:
+    return os.environ.get("LLM_TOTO_HISTORY", "1") not in ("", "0")
+
+
+def find_project_root(cwd: str) -> str:
+    """The nearest directory with a .git entry, or cwd itself."""
+    path = os.path.abspath(cwd)
+    while True:
+        if os.path.exists(os.path.join(path, ".git")):
+            return path
+        parent = os.path.dirname(path)
+        if parent == path:
+            return os.path.abspath(cwd)
+        path = parent
+
+
+def history_path(cwd: str) -> Path:
+    """The history database of the project containing cwd, named after its path like ~/.claude/projects.
+
+    rewrite-bash.py computes the same path.
+    """
+    history_dir = Path(os.environ.get("LLM_TOTO_HISTORY_DIR") or HISTORY_DIR)
+    return history_dir / f"{find_project_root(cwd).replace(os.sep, '-')}.sqlite3"
+
+
+def history_key(command: str) -> str:
+    """Commands are remembered by their whitespace-normalized text."""
+    return " ".join(command.split())
+
+
+def open_history(path: Path) -> sqlite3.Connection:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    connection = sqlite3.connect(str(path), timeout=1.0)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS commands ("
+        " command TEXT PRIMARY KEY,"
+        " runs INTEGER NOT NULL DEFAULT 0,"
+        " duration REAL NOT NULL DEFAULT 0,"  # EWMA, seconds
+        " output_bytes REAL NOT NULL DEFAULT 0,"  # EWMA
+        " max_output_bytes INTEGER NOT NULL DEFAULT 0,"
+        " exit_code INTEGER,"  # of the last run
+        " last_run REAL,"
+        " threshold INTEGER"  # set with `llm-toto history --threshold`
+        ")"
+    )
+    return connection
+
+
+def record_history(cwd: str, command: str, duration: float, output_bytes: int, exit_code: int) -> None:
+    """Fold a finished run into the project's history. Best-effort."""
+    now = time.time()
+    try:
+        connection = open_history(history_path(cwd))
+        try:
+            with connection:
+                connection.execute(
+                    "INSERT INTO commands (command, runs, duration, output_bytes, max_output_bytes, exit_code, last_run)"
+                    " VALUES (:command, 1, :duration, :output_bytes, :output_bytes, :exit_code, :now)"
+                    " ON CONFLICT (command) DO UPDATE SET"
+                    "  duration = CASE WHEN runs = 0 THEN :duration ELSE :alpha * :duration + (1 - :alpha) * duration END,"
+                    "  output_bytes = CASE WHEN runs = 0 THEN :output_bytes ELSE :alpha * :output_bytes + (1 - :alpha) * output_bytes END,"
+                    "  max_output_bytes = MAX(max_output_bytes, :output_bytes),"
+                    "  runs = runs + 1,"
+                    "  exit_code = :exit_code,"
+                    "  last_run = :now",
+                    {
+                        "command": history_key(command),
+                        "duration": duration,
+                        "output_bytes": output_bytes,
+                        "exit_code": exit_code,
+                        "now": now,
+                        "alpha": HISTORY_EWMA_ALPHA,
+                    },
+                )
+                connection.execute(
+                    "DELETE FROM commands WHERE last_run < ? AND threshold IS NULL",
+                    (now - HISTORY_MAX_AGE_DAYS * 86400,),
+                )
+        finally:
+            connection.close()
+    except (OSError, sqlite3.Error):
+        pass
+
+
+def history_threshold(cwd: str, command: str) -> int | None:
+    """The threshold set for the command in the project's history, if any."""
+    path = history_path(cwd)
+    if not path.is_file():
+        return None
+    try:
+        connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=1.0)
+        try:
+            row = connection.execute("SELECT threshold FROM commands WHERE command = ?", (history_key(command),)).fetchone()
+        finally:
+            connection.close()
+    except sqlite3.Error:
+        return None
+    return row[0] if row is not None else None
+
+
+def enforce_retention(session_id: str, keep: Path) -> None:
+    """Apply the retention limits after an output was buffered. Best-effort."""
+    policy = RetentionPolicy.from_env()
+    try:
+        collect_garbage(policy, sessions=[session_id], keep=keep)
+        marker = OUTPUT_ROOT / GC_MARKER
+        try:
+            due = time.time() - marker.stat().st_mtime > GC_INTERVAL_SECONDS
+        except FileNotFoundError:
+            due = True
+        if due:
+            marker.touch()
+            collect_garbage(policy, keep=keep)
+    except (OSError, ValueError):
+        pass
+
+
+def _truncate_line(line: str) -> str:
+    """Keep just enough of a line to show it or to tell it's too long for the preview."""
+    line = line[: PREVIEW_MAX_LINE_LENGTH + 1]
+    return line[:-1] if line.endswith("\r") else line
+
+
+def _decode_line(raw: bytes) -> str:
+    """Decode a (truncated) raw line for the preview."""
+    return _truncate_line(raw.decode("utf-8", errors="replace"))
+
+
+class LineIndexWriter:
+    """Writes the sparse line index of an output as it is captured.
+
+    Roughly every LINE_INDEX_BLOCK_SIZE bytes, the byte offset and the number
+    of newlines before it are recorded. Finding a line then only needs a
+    bisect and a scan of one block, and recording costs one bytes.count() per
+    chunk instead of touching every line.
+    """
+
+    def __init__(self):
+        # Interleaved (offset, newlines before offset) pairs
+        self.entries = array("Q")
+        self.line_count = 0
+        self.byte_count = 0
+        self._next_entry = 0
+        self._file: BinaryIO | None = None
+
+    def feed(self, data: bytes) -> None:
+        if self.byte_count >= self._next_entry:
+            self.entries.extend((self.byte_count, self.line_count))
+            self._next_entry = self.byte_count + LINE_INDEX_BLOCK_SIZE
+            if self._file is not None and len(self.entries) >= 2 * LINE_INDEX_FLUSH_ENTRIES:
+                self.flush()
+        self.line_count += data.count(b"\n")
+        self.byte_count += len(data)
+
+    def open(self, path: Path) -> None:
+        """Start writing the index to a file, the header is completed by close()."""
+        self._file = open(path, "wb")
+        self._file.write(LINE_INDEX_HEADER.pack(LINE_INDEX_MAGIC, LINE_INDEX_BLOCK_SIZE, 0, 0))
+        self.flush()
+
+    def flush(self) -> None:
+        if self._file is not None:
+            self.entries.tofile(self._file)
+            self.entries = array("Q")
+
+    def close(self, line_count: int) -> None:
+        if self._file is None:
+            return
+        self.flush()
+        self._file.seek(0)
+        self._file.write(LINE_INDEX_HEADER.pack(LINE_INDEX_MAGIC, LINE_INDEX_BLOCK_SIZE, line_count, self.byte_count))
+        self._file.close()
+        self._file = None
+
+
+class OutputCapture:
+    """Incrementally collected output of the wrapped command.
+
+    The output is handled as raw bytes and never decoded as a whole: it is
+    held in memory until it crosses the threshold (in bytes), then it is
+    spilled verbatim to the session file (together with its line index) and
+    every following chunk is written straight to it. Lines are counted on the
+    raw bytes, only the first and last lines are kept, and decoded, for the
+    preview.
+
+    With a live stream, chunks are also echoed to it as they arrive, until the
+    output crosses the threshold.
+    """
+
+    def __init__(
+        self,
+        threshold: int,
+        session_id: str,
+        keywords: list[str],
+        compression: str = "none",
+        live: BinaryIO | None = None,
+        command: str = "",
+    ):
+        self.threshold = threshold
+        self.session_id = session_id
+        self.compression = resolve_compression(compression)
+        self.byte_count = 0
+        self.line_count = 0
+        self.keywords = KeywordScanner(keywords, max_hits=KEYWORD_HITS_MAX)
+        self.line_index = LineIndexWriter()
+        self._head: list[bytes] = []
+        self._tail: deque[bytes] = deque(maxlen=PREVIEW_TAIL_LINES)
+        self.output_file: Path | None = None
+        self._digest = hashlib.sha256()
+        # An earlier output of the session with the same content
+        self.identical_to: Path | None = None
+        self._buffer: list[bytes] = []
+        self._file = None
+        self.live = live
+        self.command = command
+        # Chosen when the output is spilled, small outputs are printed as they are
+        self.summarizer: Summarizer | None = None
+        # The last byte echoed to the live stream
+        self.echoed_tail = b""
+        # The start of the incomplete last line
+        self._pending = b""
+
+    @property
+    def spilled(self) -> bool:
+        return self.output_file is not None
+
+    @property
+    def output(self) -> bytes:
+        """The whole raw output, available only while it wasn't spilled."""
+        return b"".join(self._buffer)
+
+    @property
+    def head_lines(self) -> list[str]:
+        return [_decode_line(line) for line in self._head]
+
+    @property
+    def tail_lines(self) -> list[str]:
+        return [_decode_line(line) for line in self._tail]
+
+    @property
+    def keyword_counts(self) -> dict[str, int]:
+        return self.keywords.counts
+
+    @property
+    def keyword_hits(self) -> dict[str, list[tuple[int, int]]]:
+        return self.keywords.hits
+
+    def feed(self, data: bytes) -> None:
+        """Add a chunk of raw output."""
+        self.keywords.feed(data)
+        self.line_index.feed(data)
+        self._digest.update(data)
+        was_spilled = self._file is not None
+        if was_spilled:
+            self._file.write(data)
+            if self.summarizer is not None:
+                self.summarizer.feed(data)
+        else:
+            self._buffer.append(data)
+        self.byte_count += len(data)
+        if not was_spilled and self.byte_count > self.threshold:
+            self._spill()
+        self._add_lines(data)
+        if self.live is not None and not was_spilled and data:
+            # The chunk that crosses the threshold is not echoed anymore
+            if self._file is None:
+                self._echo(data)
+            else:
+                self._echo(
+                    (b"" if self.echoed_tail in (b"", b"\n") else b"\n")
+                    + f"[llm-toto: output above threshold, buffering the rest to {self.output_file}]\n".encode()
+                )
+
+    def _echo(self, data: bytes) -> None:
+        try:
+            self.live.write(data)
+            self.live.flush()
+        except OSError:
+            # Nobody is reading anymore, keep capturing
+            self.live = None
+            return
+        self.echoed_tail = data[-1:]
+
+    def feed_text(self, text: str) -> None:
+        """Add already decoded output (e.g. llm-toto's own error messages)."""
+        self.feed(text.encode("utf-8"))
+
+    def finish(self) -> None:
+        """Count the last unterminated line, close the session file."""
+        self.keywords.finish()
+        if self.summarizer is not None:
+            self.summarizer.finish()
+        if self._pending:
+            self.line_count += 1
+            if len(self._head) < PREVIEW_HEAD_LINES:
+                self._head.append(self._pending)
+            self._tail.append(self._pending)
+            self._pending = b""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self.identical_to = deduplicate_output(self.output_file, self._digest.hexdigest())
+            write_keyword_hits(sidecar_path(self.output_file, KEYWORD_HITS_SUFFIX), self.keywords)
+        self.line_index.close(self.line_count)
+
+    def _add_lines(self, data: bytes) -> None:
+        """Count the lines of a chunk and keep the first and last ones for the preview.
+
+        Only the start of a line matters for the preview, so a huge line
+        (minified JSON, base64, ...) isn't kept in memory.
+        """
+        newlines = data.count(b"\n")
+        if not newlines:
+            if len(self._pending) < PREVIEW_MAX_LINE_BYTES:
+                self._pending = (self._pending + data[:PREVIEW_MAX_LINE_BYTES])[:PREVIEW_MAX_LINE_BYTES]
+            return
+        self.line_count += newlines
+
+        if len(self._head) < PREVIEW_HEAD_LINES:
+            wanted = min(newlines, PREVIEW_HEAD_LINES - len(self._head))
+            first = data.split(b"\n", wanted)[:wanted]
+            first[0] = self._pending + first[0][:PREVIEW_MAX_LINE_BYTES]
+            self._head.extend(line[:PREVIEW_MAX_LINE_BYTES] for line in first)
+
+        # Split off just the lines that can still end up in the tail
+        pieces = data.rsplit(b"\n", min(newlines, PREVIEW_TAIL_LINES))
+        last_newline = pieces[0].rfind(b"\n")
+        if last_newline == -1:
+            first_line = self._pending + pieces[0][:PREVIEW_MAX_LINE_BYTES]
+        else:
+            first_line = pieces[0][last_newline + 1 :]
+        self._tail.extend(line[:PREVIEW_MAX_LINE_BYTES] for line in [first_line] + pieces[1:-1])
+        self._pending = pieces[-1][:PREVIEW_MAX_LINE_BYTES]
+
+    def _spill(self) -> None:
+        """Move the buffered output to the session file, the output is written verbatim."""
+        self.output_file, self._file = create_output_file(get_output_dir(self.session_id), self.compression)
+        self.summarizer = select_summarizer(self.command, b"".join(self._buffer)[:SUMMARY_SNIFF_BYTES])
+        for data in self._buffer:
+            self._file.write(data)
+            if self.summarizer is not None:
+                self.summarizer.feed(data)
+        self._buffer = []
+        self.line_index.open(sidecar_path(self.output_file, LINE_INDEX_SUFFIX))
+
 
+def to_shell_command(command: list[str]) -> str:
+    """The command line run by the shell, the hook passes it as a single argument."""
+    return shlex.join(command) if len(command) > 1 else command[0]
 
-def run_command(command: list[str]) -> tuple[str, int]:
-    """Run a command as a shell command, capturing combined stdout+stderr.
+
+def run_command(command: list[str], capture: OutputCapture) -> int:
+    """Run a command as a shell command, streaming combined stdout+stderr into the capture.
 
     Always uses shell=True because commands may contain shell features
     like redirects (2>&1), environment variables, etc.
-    Returns (output, exit_code).
+    Returns the exit code.
     """
-    shell_command = shlex.join(command) if len(command) > 1 else command[0]
+    shell_command = to_shell_command(command)
     try:
-        result = subprocess.run(
+        process = subprocess.Popen(
             shell_command,
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
-            text=True,
             shell=True,
         )
-        return result.stdout or "", result.returncode
+        with process:
+            while True:
+                chunk = process.stdout.read1(READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                capture.feed(chunk)
+        return process.returncode
     except Exception as e:
-        return f"llm-toto: error running command: {e}\n", 1
+        capture.feed_text(f"llm-toto: error running command: {e}\n")
+        return 1
+    finally:
+        capture.finish()
+
+
+class OutputReader:
+    """Random access to a buffered output through mmap and its line index.
+
+    Compressed outputs are decompressed into an anonymous temporary file first.
+    Without a (valid) index sidecar, the index is rebuilt in memory.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        if path.name.endswith((".gz", ".zst")):
+            self._file = tempfile.TemporaryFile()
+            with open_output(path) as f:
+                shutil.copyfileobj(f, self._file)
+            self._file.flush()
+        else:
+            self._file = open(path, "rb")
+        self.size = os.fstat(self._file.fileno()).st_size
+        self.data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+        self.offsets, self.newlines, self.line_count = self._load_index()
+
+    def close(self) -> None:
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self._file.close()
+
+    def __enter__(self) -> "OutputReader":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _load_index(self) -> tuple[array, array, int]:
+        entries = array("Q")
+        line_count = None
+        try:
+            with open(sidecar_path(self.path, LINE_INDEX_SUFFIX), "rb") as f:
+                magic, _, indexed_lines, size = LINE_INDEX_HEADER.unpack(f.read(LINE_INDEX_HEADER.size))
+                if magic == LINE_INDEX_MAGIC and size == self.size:
+                    entries.frombytes(f.read())
+                    line_count = indexed_lines
+        except (OSError, struct.error, ValueError):
+            pass
+
+        if line_count is None or not entries:
+            writer = LineIndexWriter()
+            for start in range(0, self.size, LINE_INDEX_BLOCK_SIZE):
+                writer.feed(self.data[start : start + LINE_INDEX_BLOCK_SIZE])
+            unterminated = self.size > 0 and self.data[self.size - 1 : self.size] != b"\n"
+            entries = writer.entries or array("Q", [0, 0])
+            line_count = writer.line_count + (1 if unterminated else 0)
+        return entries[0::2], entries[1::2], line_count
+
+    def line_start(self, line: int) -> int:
+        """Byte offset where the (1-based) line starts, the output size past the end."""
+        skip = line - 1
+        if skip <= 0:
+            return 0
+        # The last block starting with fewer than `skip` newlines before it contains the wanted newline
+        block = max(bisect.bisect_left(self.newlines, skip) - 1, 0)
+        start = self.offsets[block]
+        end = self.offsets[block + 1] if block + 1 < len(self.offsets) else self.size
+        skip -= self.newlines[block]
+        pieces = self.data[start:end].split(b"\n", skip)
+        if len(pieces) <= skip:
+            return self.size
+        return start + sum(map(len, pieces[:skip])) + skip
+
+    def line_at(self, offset: int) -> int:
+        """The (1-based) number of the line containing the byte offset."""
+        block = bisect.bisect_right(self.offsets, offset) - 1
+        return self.newlines[block] + self.data[self.offsets[block] : offset].count(b"\n") + 1
+
+    def lines(self, first: int, last: int) -> list[tuple[int, str]]:
+        """The lines first..last (1-based, inclusive), decoded for display."""
+        result = []
+        position = self.line_start(first)
+        for number in range(max(first, 1), min(last, self.line_count) + 1):
+            newline = self.data.find(b"\n", position)
+            end = self.size if newline == -1 else newline
+            result.append((number, _display_line(self.data[position:end])))
+            position = end + 1
+        return result
+
+
+def _display_line(raw: bytes) -> str:
+    text = raw.rstrip(b"\r").decode("utf-8", errors="replace")
+    if len(text) > QUERY_MAX_LINE_LENGTH:
+        return text[:QUERY_MAX_LINE_LENGTH] + f"... ({len(text) - QUERY_MAX_LINE_LENGTH} more chars)"
+    return text
+
+
+def parse_line_range(value: str) -> tuple[int, int]:
+    """Parse 'A', 'A:B', 'A:' or 'A:+N' (1-based, inclusive)."""
+    first, sep, last = value.partition(":")
+    start = int(first) if first else 1
+    if not sep:
+        return start, start
+    if not last:
+        return start, sys.maxsize
+    if last.startswith("+"):
+        return start, start + int(last[1:]) - 1
+    return start, int(last)
+
+
+def print_line_groups(reader: OutputReader, matched: list[int], context: int) -> None:
+    """Print matched lines grep-style: 'N:line' for matches, 'N-line' for context, '--' between groups."""
+    groups: list[list[int]] = []
+    for line in matched:
+        first, last = line - context, line + context
+        if groups and first <= groups[-1][1] + 1:
+            groups[-1][1] = max(groups[-1][1], last)
+        else:
+            groups.append([first, last])
+
+    matched_set = set(matched)
+    for index, (first, last) in enumerate(groups):
+        if index and context:
+            print("--")
+        for number, text in reader.lines(max(first, 1), last):
+            print(f"{number}{':' if number in matched_set else '-'}{text}")
+
+
+def query_main(argv: list[str]) -> None:
+    """`llm-toto query <file>`: read parts of a buffered output without scanning all of it."""
+    parser = argparse.ArgumentParser(prog="llm-toto query", description="Query a buffered output")
+    parser.add_argument("file", type=Path)
+    parser.add_argument("--lines", "-l", type=parse_line_range, help="Line range: A, A:B, A: or A:+N")
+    parser.add_argument("--grep", "-g", help="Print lines matching the regex")
+    parser.add_argument("--context", "-C", type=int, default=0, help="Lines of context around grep matches")
+    parser.add_argument("--ignore-case", "-i", action="store_true")
+    parser.add_argument(
+        "--keywords", "-k",
+        nargs="?",
+        const=os.environ.get("LLM_TOTO_KEYWORDS", ",".join(KEYWORDS)),
+        type=parse_keywords,
+        help="List the lines with keyword hits (default keywords if no list is given)",
+    )
+    parser.add_argument("--max-count", "-m", type=int, default=QUERY_DEFAULT_MAX_COUNT, help="Max lines to print")
+    args = parser.parse_args(argv)
+
+    try:
+        reader = OutputReader(args.file)
+    except (OSError, RuntimeError) as e:
+        print(f"llm-toto: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    with reader:
+        if args.lines is None and args.grep is None and args.keywords is None:
+            print(f"{args.file}: {reader.line_count} lines, {reader.size} bytes")
+            return
+
+        if args.lines is not None:
+            first, last = args.lines
+            lines = reader.lines(first, min(last, first + args.max_count - 1))
+            for number, text in lines:
+                print(f"{number}:{text}")
+            if last > first + args.max_count - 1 and first + args.max_count - 1 < reader.line_count:
+                print(f"... (stopped after {args.max_count} lines, use --max-count)")
+
+        if args.grep is not None:
+            flags = re.MULTILINE | (re.IGNORECASE if args.ignore_case else 0)
+            pattern = re.compile(args.grep.encode("utf-8"), flags)
+            matched: list[int] = []
+            position = 0
+            truncated = False
+            while True:
+                match = pattern.search(reader.data, position)
+                if match is None:
+                    break
+                if len(matched) >= args.max_count:
+                    truncated = True
+                    break
+                matched.append(reader.line_at(match.start()))
+                # One match per line is enough
+                newline = reader.data.find(b"\n", match.end() if match.end() > match.start() else match.start())
+                if newline == -1:
+                    break
+                position = newline + 1
+            print_line_groups(reader, matched, args.context)
+            if truncated:
+                print(f"... (stopped after {args.max_count} matching lines, use --max-count)")
+
+        if args.keywords is not None:
+            counts, hits = load_keyword_hits(reader, args.keywords, args.max_count)
+            for keyword, kw_hits in hits.items():
+                kw_hits = kw_hits[: args.max_count]
+                print(f"{keyword} ({counts[keyword]}):")
+                for line in sorted({line for line, _ in kw_hits}):
+                    for number, text in reader.lines(line, line):
+                        print(f"{number}:{text}")
+                if counts[keyword] > len(kw_hits):
+                    print(f"... ({counts[keyword] - len(kw_hits)} more, use --max-count)")
+
+
+def load_keyword_hits(
+    reader: OutputReader, keywords: list[str], max_hits: int = KEYWORD_HITS_MAX
+) -> tuple[dict[str, int], dict[str, list[tuple[int, int]]]]:
+    """Keyword (counts, hits) of an output, from the hits recorded during capture if possible."""
+    saved = read_keyword_hits(sidecar_path(reader.path, KEYWORD_HITS_SUFFIX), keywords)
+    if saved is not None:
+        return saved
+    scanner = KeywordScanner(keywords, max_hits=max_hits)
+    for start in range(0, reader.size, QUERY_SCAN_CHUNK_SIZE):
+        scanner.feed(reader.data[start : start + QUERY_SCAN_CHUNK_SIZE])
+    scanner.finish()
+    return scanner.counts, scanner.hits
+
+
+def hits_truncated(counts: dict[str, int], hits: dict[str, list[tuple[int, int]]]) -> bool:
+    """Whether some keyword had more matches than were recorded (see KEYWORD_HITS_MAX)."""
+    return any(count > len(hits.get(kw, [])) for kw, count in counts.items())
+
+
+def keyword_lines(reader: OutputReader, hits: dict[str, list[tuple[int, int]]]) -> list[tuple[int, str]]:
+    """The distinct (line number, text) of the lines with keyword hits, in output order."""
+    lines = {line: offset for kw_hits in hits.values() for line, offset in kw_hits}
+    result = []
+    for line, offset in sorted(lines.items()):
+        start = reader.data.rfind(b"\n", 0, offset) + 1
+        end = reader.data.find(b"\n", offset)
+        text = reader.data[start : reader.size if end == -1 else end]
+        result.append((line, text.decode("utf-8", errors="replace").strip()))
+    return result
+
+
+def diff_runs(
+    previous: list[tuple[int, str]], current: list[tuple[int, str]]
+) -> tuple[list[tuple[int, str]], list[tuple[int, str]]]:
+    """Compare keyword lines as multisets: (new lines of the current run, lines fixed since the previous one).
+
+    Timestamps, durations and addresses are ignored, so "FAILED test_a (0.31s)"
+    and "FAILED test_a (0.29s)" are the same line.
+    """
+    def unmatched(lines: list[tuple[int, str]], other: list[tuple[int, str]]) -> list[tuple[int, str]]:
+        remaining = Counter(VOLATILE_PATTERN.sub("#", text) for _, text in other)
+        result = []
+        for line, text in lines:
+            normalized = VOLATILE_PATTERN.sub("#", text)
+            if remaining[normalized] > 0:
+                remaining[normalized] -= 1
+            else:
+                result.append((line, text))
+        return result
+
+    return unmatched(current, previous), unmatched(previous, current)
+
+
+def compare_with_previous_run(
+    previous_file: Path, capture: OutputCapture, keywords: list[str]
+) -> list[str] | None:
+    """Summary lines with the keyword lines that changed since the previous run. Best-effort."""
+    try:
+        with OutputReader(previous_file) as reader:
+            previous_counts, previous_hits = load_keyword_hits(reader, keywords)
+            before = keyword_lines(reader, previous_hits)
+        with OutputReader(capture.output_file) as reader:
+            after = keyword_lines(reader, capture.keyword_hits)
+    except (OSError, RuntimeError):
+        return None
+    if not before and not after:
+        # Nothing to compare, the preview says more
+        return None
+
+    new, fixed = diff_runs(before, after)
+    lines = [f"Same command as {previous_file}: {len(new)} new, {len(fixed)} fixed keyword lines"]
+    if hits_truncated(previous_counts, previous_hits) or hits_truncated(capture.keyword_counts, capture.keyword_hits):
+        # Lines past the last recorded hit of one run would show up as new or fixed
+        lines[0] += f" (partial: only the first {KEYWORD_HITS_MAX} hits of each keyword were compared)"
+    for title, changed, numbered in (("New", new, True), ("Fixed", fixed, False)):
+        if changed:
+            lines.append(f"{title}:")
+            for line, text in changed[:RUN_DIFF_MAX_LINES]:
+                lines.append(f"  L{line}: {_truncate_line(text)}" if numbered else f"  {_truncate_line(text)}")
+            if len(changed) > RUN_DIFF_MAX_LINES:
+                lines.append(f"  ... ({len(changed) - RUN_DIFF_MAX_LINES} more)")
+    return lines
+
+
+def cat_main(argv: list[str]) -> None:
+    """`llm-toto cat <file>...`: print buffered outputs, decompressing them."""
+    parser = argparse.ArgumentParser(prog="llm-toto cat", description="Print buffered outputs")
+    parser.add_argument("files", nargs="+", type=Path)
+    args = parser.parse_args(argv)
+
+    for path in args.files:
+        try:
+            with open_output(path) as f:
+                shutil.copyfileobj(f, sys.stdout.buffer)
+        except (OSError, RuntimeError) as e:
+            print(f"llm-toto: {e}", file=sys.stderr)
+            sys.exit(1)
+
+
+def gc_main(argv: list[str]) -> None:
+    """`llm-toto gc`: enforce the retention limits on all sessions."""
+    policy = RetentionPolicy.from_env()
+    parser = argparse.ArgumentParser(prog="llm-toto gc", description="Remove old buffered outputs")
+    parser.add_argument("--max-age-hours", type=float, default=policy.max_age_seconds / 3600)
+    parser.add_argument("--max-session-bytes", type=parse_size, default=policy.max_session_bytes)
+    parser.add_argument("--max-total-bytes", type=parse_size, default=policy.max_total_bytes)
+    parser.add_argument("--dry-run", action="store_true", help="Only list what would be removed")
+    args = parser.parse_args(argv)
+
+    policy = RetentionPolicy(args.max_session_bytes, args.max_total_bytes, args.max_age_hours * 3600)
+    removed = collect_garbage(policy, dry_run=args.dry_run)
+    for output in removed:
+        for path in output.paths:
+            print(path)
+    verb = "Would remove" if args.dry_run else "Removed"
+    print(f"{verb} {len(removed)} outputs ({sum(output.size for output in removed) / 1024 / 1024:.1f} MB)")
+
+
+def history_main(argv: list[str]) -> None:
+    """`llm-toto history`: list the wrapped commands of the project, or tune one of them."""
+    parser = argparse.ArgumentParser(prog="llm-toto history", description="Show the history of wrapped commands in this project")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--threshold", type=parse_size, metavar="BYTES", help="Buffer the output of COMMAND above this size (0 resets it)")
+    group.add_argument("--forget", action="store_true", help="Drop COMMAND from the history")
+    parser.add_argument("command", nargs="?", help="The command, as it is wrapped")
+    args = parser.parse_args(argv)
+    if (args.threshold is not None or args.forget) and not args.command:
+        parser.error("COMMAND is required with --threshold and --forget")
+
+    path = history_path(os.getcwd())
+    if args.threshold is None and not args.forget and not path.is_file():
+        print("No history for this project")
+        return
+    try:
+        connection = open_history(path)
+        try:
+            with connection:
+                if args.forget:
+                    connection.execute("DELETE FROM commands WHERE command = ?", (history_key(args.command),))
+                    return
+                if args.threshold is not None:
+                    connection.execute(
+                        "INSERT INTO commands (command, threshold) VALUES (?, ?)"
+                        " ON CONFLICT (command) DO UPDATE SET threshold = excluded.threshold",
+                        (history_key(args.command), args.threshold or None),
+                    )
+                    return
+                rows = connection.execute(
+                    "SELECT command, runs, duration, output_bytes, max_output_bytes, exit_code, threshold"
+                    " FROM commands ORDER BY last_run DESC"
+                ).fetchall()
+        finally:
+            connection.close()
+    except (OSError, sqlite3.Error) as e:
+        print(f"llm-toto: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"{'runs':>5} {'avg time':>9} {'avg output':>11} {'max output':>11} {'exit':>4} {'threshold':>9}  command")
+    for command, runs, duration, output_bytes, max_output_bytes, exit_code, threshold in rows:
+        print(
+            f"{runs:>5} {duration:>8.2f}s {output_bytes:>11.0f} {max_output_bytes:>11} {'' if exit_code is None else exit_code:>4}"
+            f" {'' if threshold is None else threshold:>9}  {command}"
+        )
+
+
+SUBCOMMANDS = {
+    "cat": cat_main,
+    "gc": gc_main,
+    "history": history_main,
+    "query": query_main,
+}
 
 
 def main():
+    # Subcommands - wrapped commands are passed after "--", so they never clash
+    if len(sys.argv) > 1 and sys.argv[1] in SUBCOMMANDS:
+        SUBCOMMANDS[sys.argv[1]](sys.argv[2:])
+        return
+
     parser = argparse.ArgumentParser(
         description="LLM Tool Output Tokens Optimizer",
-        usage="llm-toto [--session ID] [--threshold N] <command...>",
+        usage="llm-toto [--session ID] [--threshold N] [--keywords LIST] [--compress MODE] [--live] <command...>",
     )
     parser.add_argument(
         "--session", "-s",
@@ -149,8 +1890,34 @@ def main():
     parser.add_argument(
         "--threshold", "-t",
         type=int,
-        default=int(os.environ.get("LLM_TOTO_THRESHOLD", DEFAULT_THRESHOLD)),
-        help=f"Character threshold for buffering (default: {DEFAULT_THRESHOLD})",
+        help=f"Output size in bytes above which the output is buffered (default: the command's threshold"
+        f" in the project history, else LLM_TOTO_THRESHOLD or {DEFAULT_THRESHOLD})",
+    )
+    parser.add_argument(
+        "--keywords", "-k",
+        type=parse_keywords,
+        default=parse_keywords(os.environ.get("LLM_TOTO_KEYWORDS", ",".join(KEYWORDS))),
+        help=f"Comma-separated keywords to count (default: {','.join(KEYWORDS)})",
+    )
+    parser.add_argument(
+        "--compress",
+        choices=sorted(COMPRESSION_SUFFIXES),
+        default=os.environ.get("LLM_TOTO_COMPRESS", "none"),
+        help="Compress buffered outputs (zstd needs Python 3.14+, falls back to gzip)",
+    )
+    parser.add_argument(
+        "--live",
+        action="store_true",
+        default=os.environ.get("LLM_TOTO_LIVE", "") not in ("", "0"),
+        help="Stream the output while it is below the threshold (env: LLM_TOTO_LIVE=1)",
+    )
+    parser.add_argument(
+        "--rerun-cache",
+        type=float,
+        metavar="SECONDS",
+        default=float(os.environ.get("LLM_TOTO_RERUN_CACHE") or 0),
+        help="Print the buffered result of the same slow command instead of running it again,"
+        " if it ran within SECONDS and no project files changed since (env: LLM_TOTO_RERUN_CACHE, default: off)",
     )
     parser.add_argument(
         "command",
@@ -173,39 +1940,104 @@ def main():
         parser.print_help()
         sys.exit(1)
 
-    output, exit_code = run_command(command)
+    shell_command = to_shell_command(command)
+    cwd = os.getcwd()
+    record = history_enabled()
+    threshold = args.threshold
+    if threshold is None and record:
+        threshold = history_threshold(cwd, shell_command)
+    if threshold is None:
+        threshold = int(os.environ.get("LLM_TOTO_THRESHOLD", DEFAULT_THRESHOLD))
+    key = command_key(shell_command, cwd)
+    fingerprint = worktree_fingerprint(cwd) if args.rerun_cache > 0 else None
+    if fingerprint is not None:
+        cached = find_cached_run(OUTPUT_ROOT / args.session, key, fingerprint, args.rerun_cache)
+        if cached is not None:
+            output_file = OUTPUT_ROOT / args.session / cached["file"]
+            age = time.time() - cached["time"]
+            print(
+                f"[llm-toto: cached result, not re-run. The same command finished {age:.0f}s ago"
+                f" (exit code {cached['exit_code']}) and no project files changed since."
+                " Set LLM_TOTO_RERUN_CACHE=0 to run it again]"
+            )
+            sys.stdout.write(sidecar_path(output_file, REPORT_SUFFIX).read_text(encoding="utf-8"))
+            sys.exit(cached["exit_code"])
 
-    output_len = len(output)
+    capture = OutputCapture(
+        threshold,
+        args.session,
+        args.keywords,
+        args.compress,
+        sys.stdout.buffer if args.live else None,
+        shell_command,
+    )
+    started = time.monotonic()
+    exit_code = run_command(command, capture)
+    duration = time.monotonic() - started
+    if record:
+        record_history(cwd, shell_command, duration, capture.byte_count, exit_code)
 
-    if output_len <= args.threshold:
-        # Small output: print as-is
-        if output:
-            sys.stdout.write(output)
-            if not output.endswith("\n"):
-                sys.stdout.write("\n")
-    else:
-        # Large output: buffer to file and print summary
-        output_dir = get_output_dir(args.session)
-        output_file = save_output(output_dir, output)
+    if capture.echoed_tail not in (b"", b"\n"):
+        # Keep the summary (or the shell prompt) off the last echoed line
+        sys.stdout.write("\n")
 
-        lines = output.splitlines()
-        line_count = len(lines)
+    if not capture.spilled:
+        # Small output: print it verbatim, unless it was already streamed
+        output = capture.output
+        if output and capture.live is None:
+            sys.stdout.flush()
+            sys.stdout.buffer.write(output if output.endswith(b"\n") else output + b"\n")
+    else:
+        # Large output: already buffered to file, print summary
+        keyword_summary = format_keyword_summary(capture.keyword_counts)
 
-        keyword_counts = count_keywords(output)
-        keyword_summary = format_keyword_summary(keyword_counts)
+        # A re-run of the same command is summarized by what changed since the previous run
+        previous_run = find_previous_run(capture.output_file.parent, key)
+        run_diff = compare_with_previous_run(previous_run, capture, args.keywords) if previous_run else None
 
-        # Print summary
-        print(f"Output buffered to {output_file} ({line_count} lines)")
+        report = [f"Output buffered to {capture.output_file} ({capture.line_count} lines)"]
+        if capture.identical_to is not None:
+            report.append(f"Identical to {capture.identical_to}")
+        if capture.compression != "none":
+            report.append(f"Compressed, read it with: python3 {os.path.abspath(__file__)} cat {capture.output_file}")
+        report.append(
+            f"Query it with: python3 {os.path.abspath(__file__)} query {capture.output_file}"
+            " --grep REGEX [-C N] | --lines A:B"
+        )
 
         if keyword_summary:
-            print(f"Keyword mentions: {keyword_summary}")
+            report.append(f"Keyword mentions: {keyword_summary}")
+            for locations in format_keyword_locations(capture.keyword_hits):
+                report.append(f"  {locations}")
+
+        # A structured summary of the tool's output replaces the preview
+        summary = capture.summarizer.summary() if capture.summarizer is not None else []
+        if summary:
+            report += ["", f"Summary ({capture.summarizer.name}):"] + summary
+
+        if run_diff is not None:
+            report += [""] + run_diff
 
         # Only show preview if it would be useful
-        if should_show_preview(lines, output_len):
-            preview = make_preview(lines)
-            print()
-            print("Preview:")
-            print(preview)
+        head_lines, tail_lines = capture.head_lines, capture.tail_lines
+        if not summary and run_diff is None and should_show_preview(head_lines, tail_lines, capture.line_count, capture.byte_count):
+            report += ["", "Preview:", make_preview(head_lines, tail_lines, capture.line_count)]
+
+        report_text = "\n".join(report) + "\n"
+        sys.stdout.write(report_text)
+
+        details = None
+        if fingerprint is not None:
+            # Kept for the rerun cache
+            details = {"time": time.time(), "duration": duration, "exit_code": exit_code, "fingerprint": fingerprint}
+            try:
+                sidecar_path(capture.output_file, REPORT_SUFFIX).write_text(report_text, encoding="utf-8")
+            except OSError:
+                details = None
+        record_run(capture.output_file, key, shell_command, details)
+
+        sys.stdout.flush()
+        enforce_retention(args.session, capture.output_file)
 
     sys.exit(exit_code)
 
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""Micro-benchmark of the rewrite hook's command classifier.
+
+Runs is_passthrough() and rewrite_command() over a corpus of commands and
+compares the prefix trie classifier with the linear prefix/regex loop it
+replaced (checking both agree on every command).
+
+    python3 tests/bench_classifier.py                  # built-in corpus
+    python3 tests/bench_classifier.py commands.txt     # one command per line
+"""
+
+import argparse
+import os
+import re
+import time
+from importlib.machinery import SourceFileLoader
+
+rewrite = SourceFileLoader("rewrite_bash", os.path.join(os.path.dirname(__file__), "..", "hooks", "rewrite-bash.py")).load_module()
+
+CORPUS = [
+    "git status",
+    "git diff --stat",
+    "git log --oneline -20",
+    "git add -A && git commit -m 'Fix parser'",
+    "git push origin main",
+    "git checkout -b feature/login",
+    "ls -la",
+    "ls -la src/components/",
+    "cat package.json",
+    "head -50 src/main.py",
+    "tail -n 100 /var/log/app.log",
+    "wc -l src/*.py",
+    "grep -n 'def main' src/app.py",
+    "grep -rn 'TODO' src/",
+    "rg 'import React' --type ts",
+    "find . -name '*.py' -not -path './node_modules/*'",
+    "sed -n '100,160p' src/server.ts",
+    "awk '{print $1}' access.log | sort | uniq -c",
+    "mkdir -p build/out",
+    "rm -rf dist",
+    "cp .env.example .env",
+    "mv old.py new.py",
+    "chmod +x scripts/deploy.sh",
+    "touch src/__init__.py",
+    "echo $PATH",
+    "export NODE_ENV=production",
+    "cd frontend && npm run build",
+    "npm install",
+    "npm ci",
+    "npm test",
+    "npm run lint -- --fix",
+    "npx jest src/components/Button.test.tsx",
+    "yarn add -D typescript",
+    "pip install -r requirements.txt",
+    "uv sync",
+    "python3 -m pytest tests/ -x -q",
+    "pytest tests/test_api.py::test_login -vv",
+    "python3 manage.py migrate",
+    "python3 -c 'import sys; print(sys.version)'",
+    "node scripts/build.js",
+    "./mvnw package 2>&1 | grep ERROR",
+    "./mvnw -q test -Dtest=OrderServiceTest",
+    "./gradlew build --info",
+    "make build",
+    "make -j8 test 2>&1 | tail -50",
+    "cargo build --release",
+    "cargo test -- --nocapture",
+    "cargo clippy --all-targets",
+    "go test ./...",
+    "go build -o bin/app ./cmd/app",
+    "docker build -t app:latest .",
+    "docker compose up -d",
+    "docker logs api --tail 200",
+    "kubectl get pods -n staging | grep Running",
+    "kubectl logs deploy/api -n staging --since=1h",
+    "terraform plan -out tfplan",
+    "gh pr view 123 --json title,body",
+    "glab mr list",
+    "curl -s https://api.example.com/health | jq .",
+    "FOO=bar ./run.sh",
+    "$(npm bin)/tsc --noEmit",
+    "(cd backend && ./gradlew test)",
+    "[ -f .env ] && source .env",
+    "source venv/bin/activate && python3 -m pytest",
+    "true",
+    "diff -u a.txt b.txt",
+    "sort -u names.txt",
+    "xargs -n1 echo < list.txt",
+    "tsc --noEmit -p tsconfig.json",
+    "eslint . --ext .ts,.tsx",
+]
+
+
+# The per-call regexes of the classifier before it used the prefix trie
+LINEAR_FILE_OP_PATTERNS = [
+    r"^grep\s+(?!-[rR]\b)(?!.*\s-[rR]\b)",
+    r"^sed\s+",
+    r"^awk\s+",
+    r"^diff\s+",
+    r"^sort\s+",
+    r"^uniq\s+",
+    r"^cut\s+",
+    r"^tr\s+",
+    r"^tee\s+",
+    r"^xargs\s+",
+]
+
+
+def linear_is_passthrough(command: str) -> bool:
+    """The classifier before the prefix trie: a startswith loop, then a regex per file operation."""
+    stripped = command.strip()
+    if not stripped:
+        return True
+    for prefix in rewrite.PASSTHROUGH_PREFIXES:
+        if stripped.startswith(prefix) or stripped == prefix.rstrip():
+            return True
+    for pattern in LINEAR_FILE_OP_PATTERNS:
+        if re.match(pattern, stripped):
+            return True
+    if re.match(r"^[A-Za-z_][A-Za-z0-9_]*=", stripped):
+        return True
+    return stripped.startswith("(") or stripped.startswith("$")
+
+
+def bench(name: str, function, commands: list[str], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for command in commands:
+            function(command)
+    per_call = (time.perf_counter() - start) / (repeat * len(commands)) * 1e6
+    print(f"  {name:<28} {per_call:8.2f} us/command")
+    return per_call
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the rewrite hook's command classifier")
+    parser.add_argument("corpus", nargs="?", help="File with one command per line (default: built-in corpus)")
+    parser.add_argument("--repeat", type=int, default=2000, help="Passes over the corpus (default: 2000)")
+    args = parser.parse_args()
+
+    if args.corpus:
+        with open(args.corpus) as f:
+            commands = [line.rstrip("\n") for line in f if line.strip()]
+    else:
+        commands = CORPUS
+
+    mismatches = [c for c in commands if rewrite.is_passthrough(c) != linear_is_passthrough(c)]
+    for command in mismatches:
+        print(f"  MISMATCH {command!r}: compiled={rewrite.is_passthrough(command)}")
+
+    start = time.perf_counter()
+    rewrite.build_prefix_trie(rewrite.PASSTHROUGH_PREFIXES)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    print(f"{len(commands)} commands, {args.repeat} passes, {len(rewrite.PASSTHROUGH_PREFIXES)} prefixes")
+    print(f"  {'prefix trie build':<28} {build_ms:8.2f} ms (once per process)")
+    linear = bench("is_passthrough (linear)", linear_is_passthrough, commands, args.repeat)
+    compiled = bench("is_passthrough (compiled)", rewrite.is_passthrough, commands, args.repeat)
+    bench("rewrite_command", lambda c: rewrite.rewrite_command(c, "bench"), commands, args.repeat)
+    print(f"  speedup {linear / compiled:.1f}x")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
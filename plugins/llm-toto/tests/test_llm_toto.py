@@ -1,16 +1,22 @@
 #!/usr/bin/env python3
 """Tests for the llm-toto CLI tool."""
 
+import glob
 import json
 import os
+import shutil
 import subprocess
 import sys
 import tempfile
+import time
 from pathlib import Path
 
 SCRIPT = os.path.join(os.path.dirname(__file__), "..", "scripts", "llm-toto.py")
 SESSION = "test-session"
 
+# Keep the runs of the tests out of the user's command history
+os.environ.setdefault("LLM_TOTO_HISTORY_DIR", tempfile.mkdtemp(prefix="llm-toto-history-"))
+
 
 def run_toto(command: str, threshold: int = 4000, session: str = SESSION) -> tuple[str, int]:
     """Run llm-toto with the given command and return (stdout, exit_code)."""
@@ -126,6 +132,21 @@ def test_threshold_env_var():
     assert "Output buffered to" in result.stdout
 
 
+def test_keywords_env_var():
+    """LLM_TOTO_KEYWORDS should replace the default keyword set."""
+    env = os.environ.copy()
+    env["LLM_TOTO_KEYWORDS"] = "panic,FATAL,Traceback"
+    cmd = "echo 'FATAL: x'; echo 'thread panicked'; echo 'Traceback (most recent call last)'; echo 'fatal again'; echo error"
+    result = subprocess.run(
+        ["python3", SCRIPT, "--session", SESSION, "--threshold", "10", "--", "bash", "-c", cmd],
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+    assert "Keyword mentions: panic 1, FATAL 2, Traceback 1" in result.stdout
+    assert "error" not in result.stdout.split("Keyword mentions:")[1].split("\n")[0]
+
+
 def test_session_dir_created():
     """Session directory should be created automatically."""
     session = f"test-dir-{os.getpid()}"
@@ -133,9 +154,7 @@ def test_session_dir_created():
     session_dir = Path(f"/tmp/llm-toto/{session}")
     assert session_dir.exists(), f"Session dir {session_dir} should exist"
     # Cleanup
-    for f in session_dir.iterdir():
-        f.unlink()
-    session_dir.rmdir()
+    shutil.rmtree(session_dir)
 
 
 def test_empty_output():
@@ -186,6 +205,301 @@ def test_no_preview_minified_json():
     assert "Preview:" not in output, "Preview should be suppressed for minified JSON"
 
 
+def test_invalid_utf8_passed_through_verbatim():
+    """Output that isn't valid UTF-8 should be printed and buffered byte for byte."""
+    small = subprocess.run(
+        ["python3", SCRIPT, "--session", SESSION, "--", "bash", "-c", "printf 'a\\xff\\xfe b\\n'"],
+        capture_output=True,
+    )
+    assert small.stdout == b"a\xff\xfe b\n"
+
+    large = subprocess.run(
+        ["python3", SCRIPT, "--session", SESSION, "--threshold", "100", "--", "bash", "-c",
+         "for i in $(seq 1 100); do printf 'line \\xff\\xc3\\n'; done"],
+        capture_output=True,
+    )
+    assert large.returncode == 0
+    output = large.stdout.decode("utf-8")
+    assert "line \ufffd\ufffd" in output
+    file_path = output.split("Output buffered to ")[1].split(" (")[0]
+    with open(file_path, "rb") as f:
+        assert f.read() == b"line \xff\xc3\n" * 100
+
+
+def test_large_output_streamed_to_file():
+    """Output spilled mid-stream should land in the file complete, with all lines and keywords counted."""
+    # ~2.4 MB single line (counted in pieces) followed by short lines
+    cmd = "python3 -c \"import sys; sys.stdout.write('error ' * 400000 + '\\n'); [print('warn', i) for i in range(3000)]\""
+    output, code = run_toto(cmd, threshold=100)
+    assert code == 0
+    assert "(3001 lines)" in output
+    assert "error 400000" in output
+    assert "warn 3000" in output
+    file_path = output.split("Output buffered to ")[1].split(" (")[0]
+    content = Path(file_path).read_text()
+    assert content.startswith("error error ")
+    assert content.endswith("warn 2999\n")
+    assert len(content) == 2400001 + sum(len(f"warn {i}\n") for i in range(3000))
+    os.unlink(file_path)
+
+
+def test_compressed_output_cat():
+    """Compressed outputs should be readable back through the cat subcommand."""
+    env = os.environ.copy()
+    env["LLM_TOTO_COMPRESS"] = "gzip"
+    result = subprocess.run(
+        ["python3", SCRIPT, "--session", SESSION, "--threshold", "100", "--", "bash", "-c", "seq 1 500"],
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+    file_path = result.stdout.split("Output buffered to ")[1].split(" (")[0]
+    assert file_path.endswith(".txt.gz")
+    assert "cat " + file_path in result.stdout
+    content = subprocess.run(["python3", SCRIPT, "cat", file_path], capture_output=True, text=True).stdout
+    assert content == "".join(f"{i}\n" for i in range(1, 501))
+    os.unlink(file_path)
+
+
+def test_identical_output_deduplicated():
+    """A repeated output should be a hardlink to the earlier one, and the summary should say so."""
+    session = f"test-dedup-{os.getpid()}"
+    first, _ = run_toto("seq 1 700", threshold=100, session=session)
+    second, _ = run_toto("seq 1 700", threshold=100, session=session)
+    first_path = first.split("Output buffered to ")[1].split(" (")[0]
+    second_path = second.split("Output buffered to ")[1].split(" (")[0]
+    assert "Identical to" not in first
+    assert f"Identical to {first_path}\n" in second
+    assert os.stat(first_path).st_ino == os.stat(second_path).st_ino
+
+    # Once both outputs are removed, gc removes their blob too
+    old = time.time() - 100 * 24 * 3600
+    for path in glob.glob(os.path.join(os.path.dirname(first_path), "*.*")):
+        os.utime(path, (old, old))
+    result = subprocess.run(
+        ["python3", SCRIPT, "gc", "--max-age-hours", str(90 * 24)],
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0
+    assert not os.path.exists(os.path.dirname(first_path))
+
+
+def test_rerun_summarized_as_diff():
+    """A re-run of the same command should list the new and fixed keyword lines instead of a preview."""
+    session = f"test-rerun-{os.getpid()}"
+    with tempfile.NamedTemporaryFile("w", suffix=".log", delete=False) as f:
+        f.write("FAILED test_a (0.31s)\nFAILED test_b (1.20s)\n")
+    command = f"seq 1 300; cat {f.name}"
+    first, _ = run_toto(command, threshold=100, session=session)
+    assert "Same command as" not in first
+
+    with open(f.name, "w") as log:
+        log.write("FAILED test_b (1.24s)\nFAILED test_c (0.02s)\n")
+    second, _ = run_toto(command, threshold=100, session=session)
+    os.unlink(f.name)
+    first_path = first.split("Output buffered to ")[1].split(" (")[0]
+    assert f"Same command as {first_path}: 1 new, 1 fixed keyword lines" in second
+    assert "New:\n  L302: FAILED test_c (0.02s)\nFixed:\n  FAILED test_a (0.31s)\n" in second
+    assert "Preview:" not in second
+    shutil.rmtree(os.path.dirname(first_path))
+
+
+def test_rerun_diff_marked_partial_above_hit_limit():
+    """With more keyword hits than are recorded, the diff says it is partial."""
+    session = f"test-rerun-partial-{os.getpid()}"
+    command = "for i in $(seq 1 10010); do echo \"error $i\"; done"
+    first, _ = run_toto(command, threshold=100, session=session)
+    second, _ = run_toto(command, threshold=100, session=session)
+    assert "Same command as" in second
+    assert "(partial: only the first 10000 hits of each keyword were compared)" in second
+
+    quiet, _ = run_toto("seq 1 300; echo error", threshold=100, session=session)
+    quiet, _ = run_toto("seq 1 300; echo error", threshold=100, session=session)
+    assert "Same command as" in quiet
+    assert "(partial:" not in quiet
+    shutil.rmtree(os.path.dirname(first.split("Output buffered to ")[1].split(" (")[0]))
+
+
+def test_live_small_output_printed_once():
+    """In live mode, small outputs are streamed and not printed again at the end."""
+    env = os.environ.copy()
+    env["LLM_TOTO_LIVE"] = "1"
+    result = subprocess.run(
+        ["python3", SCRIPT, "--session", SESSION, "--", "bash", "-c", "echo first; printf second"],
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+    assert result.stdout == "first\nsecond\n"
+
+
+def test_live_stops_echoing_above_threshold():
+    """In live mode, the echo stops once the threshold is crossed and the summary follows."""
+    result = subprocess.run(
+        ["python3", SCRIPT, "--session", SESSION, "--live", "--threshold", "100", "--", "bash", "-c",
+         "echo early; sleep 0.2; seq 1 1000"],
+        capture_output=True,
+        text=True,
+    )
+    before, after = result.stdout.split("[llm-toto: output above threshold, buffering the rest to ")
+    assert before == "early\n"
+    assert "Output buffered to " in after
+    assert "\n999\n" not in before
+    file_path = after.split("Output buffered to ")[1].split(" (")[0]
+    with open(file_path) as f:
+        assert f.read() == "early\n" + "".join(f"{i}\n" for i in range(1, 1001))
+
+
+def test_keyword_locations_in_summary():
+    """The summary should list the lines of the keyword hits, which query --keywords reads back."""
+    output, code = run_toto("seq 1 300; echo 'ERROR one'; seq 1 50; echo 'error two error'; seq 1 50", threshold=100)
+    assert "Keyword mentions: error 3" in output
+    assert "  error: L301, L352\n" in output
+    file_path = output.split("Output buffered to ")[1].split(" (")[0]
+    assert os.path.exists(file_path.replace(".txt", ".hits"))
+    result = subprocess.run(["python3", SCRIPT, "query", file_path, "--keywords", "Error"], capture_output=True, text=True)
+    assert result.stdout == "Error (3):\n301:ERROR one\n352:error two error\n"
+
+
+def test_query_lines_and_grep():
+    """The query subcommand should read line ranges and grep matches through the line index."""
+    result = subprocess.run(
+        ["python3", SCRIPT, "--session", SESSION, "--", "bash", "-c", "seq 1 5000; echo 'FAILED test_x'; seq 5001 6000"],
+        capture_output=True,
+        text=True,
+    )
+    file_path = result.stdout.split("Output buffered to ")[1].split(" (")[0]
+    assert os.path.exists(file_path.replace(".txt", ".idx"))
+    assert "query " + file_path in result.stdout
+
+    def query(*args):
+        return subprocess.run(["python3", SCRIPT, "query", file_path, *args], capture_output=True, text=True).stdout
+
+    assert query("--lines", "1000:+3") == "1000:1000\n1001:1001\n1002:1002\n"
+    assert query("--lines", "5001") == "5001:FAILED test_x\n"
+    assert query("--grep", "FAILED", "-C", "1") == "5000-5000\n5001:FAILED test_x\n5002-5001\n"
+    assert query("--keywords").startswith("fail (1):\n5001:FAILED test_x\n")
+
+    # Without the index, it is rebuilt on the fly
+    os.unlink(file_path.replace(".txt", ".idx"))
+    assert query("--lines", "6001") == "6001:6000\n"
+    os.unlink(file_path)
+
+
+def test_pytest_output_summarized():
+    """Test runner output should be summarized as failures and totals instead of a preview."""
+    output, code = run_toto(
+        "echo '===== test session starts ====='; seq 1 300; "
+        "echo 'FAILED tests/test_a.py::test_x - assert 1 == 2'; "
+        "echo '===== 1 failed, 12 passed in 0.52s ====='",
+        threshold=100,
+    )
+    assert "Summary (pytest):\n" in output
+    assert "FAILED tests/test_a.py::test_x - assert 1 == 2" in output
+    assert "1 failed, 12 passed in 0.52s" in output
+    assert "Preview:" not in output
+
+
+def test_json_output_summarized_as_shape():
+    """JSON output should be summarized as its keys, value types and array lengths."""
+    document = {"items": [{"id": i, "name": "x" * 20} for i in range(100)], "total": 100, "next": None}
+    output, code = run_toto(f"echo '{json.dumps(document)}'", threshold=100)
+    assert (
+        "Summary (json):\nJSON object with 3 keys:\n"
+        "  items: array[100] of objects {id, name}\n  total: 100\n  next: null\n"
+    ) in output
+
+
+def test_gc_removes_old_outputs():
+    """gc should select outputs older than the max age."""
+    session = f"test-gc-{os.getpid()}"
+    output, code = run_toto("seq 1 500", threshold=100, session=session)
+    file_path = output.split("Output buffered to ")[1].split(" (")[0]
+    # The output together with its sidecars (line index, keyword hits)
+    paths = glob.glob(file_path.split(".")[0] + ".*")
+    old = os.stat(file_path).st_mtime - 10 * 3600
+    for path in paths:
+        os.utime(path, (old, old))
+    result = subprocess.run(
+        ["python3", SCRIPT, "gc", "--dry-run", "--max-age-hours", "5"],
+        capture_output=True,
+        text=True,
+    )
+    assert file_path in result.stdout
+    assert os.path.exists(file_path)
+    shutil.rmtree(os.path.dirname(file_path))
+
+
+def test_history_records_runs_and_thresholds():
+    """Runs are recorded in the project's history, and a threshold set there applies to the command."""
+    with tempfile.TemporaryDirectory() as project:
+        os.mkdir(os.path.join(project, ".git"))
+        os.mkdir(os.path.join(project, "src"))
+        env = dict(os.environ, LLM_TOTO_HISTORY_DIR=os.path.join(project, "history"), LLM_TOTO_THRESHOLD="100")
+
+        def toto(*args: str, cwd: str = project) -> str:
+            return subprocess.run(["python3", SCRIPT, *args], capture_output=True, text=True, env=env, cwd=cwd).stdout
+
+        toto("--session", SESSION, "--", "seq", "1", "500")
+        assert "Output buffered to" in toto("--session", SESSION, "--", "seq", "1", "500", cwd=os.path.join(project, "src"))
+        toto("--session", SESSION, "--", "bash", "-c", "exit 3")
+        listing = toto("history").splitlines()
+        # runs, avg time, avg output, max output, exit code, threshold, command
+        assert listing[1].split()[:1] + listing[1].split()[4:] == ["1", "3", "bash", "-c", "'exit", "3'"]
+        assert listing[2].split()[:1] + listing[2].split()[2:] == ["2", "1892", "1892", "0", "seq", "1", "500"]
+
+        toto("history", "--threshold", "4k", "seq  1 500")
+        assert "Output buffered to" not in toto("--session", SESSION, "--", "seq", "1", "500")
+        toto("history", "--forget", "seq 1 500")
+        assert "seq 1 500" not in toto("history")
+
+
+def test_rerun_cache_serves_unchanged_result():
+    """With the rerun cache, a slow command is not run again until a project file changes."""
+    session = f"test-rerun-cache-{os.getpid()}"
+    with tempfile.TemporaryDirectory() as project:
+        subprocess.run(["git", "init", "-q", project], check=True)
+        with open(os.path.join(project, "app.py"), "w") as f:
+            f.write("print('v1')\n")
+        env = dict(os.environ, LLM_TOTO_RERUN_CACHE="300")
+
+        def toto() -> subprocess.CompletedProcess:
+            command = ["python3", SCRIPT, "--session", session, "--threshold", "100", "--", "bash", "-c", "seq 1 300; echo ran >> runs.log; exit 3"]
+            return subprocess.run(command, capture_output=True, text=True, env=env, cwd=project)
+
+        def runs() -> int:
+            with open(os.path.join(project, "runs.log")) as f:
+                return len(f.readlines())
+
+        first = toto()
+        assert first.returncode == 3 and runs() == 1
+        index = Path(first.stdout.split("Output buffered to ")[1].split(" (")[0]).parent / ".commands.jsonl"
+        # Fast runs are always repeated
+        assert toto().returncode == 3 and runs() == 2
+
+        # runs.log is a project file too, ignore it
+        with open(os.path.join(project, ".gitignore"), "w") as f:
+            f.write("runs.log\n")
+        toto()
+        entries = [json.loads(line) for line in index.read_text().splitlines()]
+        entries[-1]["duration"] = 60
+        index.write_text("".join(json.dumps(entry) + "\n" for entry in entries))
+
+        cached = toto()
+        assert runs() == 3, "served from the cache"
+        assert cached.returncode == 3
+        assert cached.stdout.startswith("[llm-toto: cached result, not re-run.")
+        assert entries[-1]["file"] in cached.stdout
+
+        with open(os.path.join(project, "app.py"), "w") as f:
+            f.write("print('version 2')\n")
+        changed = toto()
+        assert runs() == 4
+        assert "cached result" not in changed.stdout
+    shutil.rmtree(index.parent)
+
+
 if __name__ == "__main__":
     test_functions = [v for k, v in sorted(globals().items()) if k.startswith("test_")]
     passed = 0
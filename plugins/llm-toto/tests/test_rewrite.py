@@ -1,8 +1,12 @@
 #!/usr/bin/env python3
 """Tests for the hook rewrite logic."""
 
+import shlex
+import sqlite3
 import sys
 import os
+import tempfile
+import time
 
 # Add parent dirs to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "hooks"))
@@ -126,6 +130,15 @@ def test_passthrough_already_wrapped():
     assert_passthrough("llm-toto --session x make build")
 
 
+def test_passthrough_prefix_boundaries():
+    """Prefixes ending with a space match the bare command, but not longer command names."""
+    assert_passthrough("cat")
+    assert_passthrough("[[ -f x ]]")
+    assert_rewritten("catalog-tool build")
+    assert_rewritten("echoserver --port 80")
+    assert_rewritten("sed")
+
+
 def test_rewrite_build_commands():
     """Build commands should be wrapped."""
     assert_rewritten("make build", "make build")
@@ -232,6 +245,19 @@ def test_strip_trailing_sort():
     assert "find . -name '*.py'" in result
 
 
+def test_keep_aggregating_filters():
+    """Filters whose result depends on the whole output (counts, inverted matches, transformations) are kept."""
+    assert wrapped("./mvnw test 2>&1 | grep ERROR | tail -5") == "TOTO ./mvnw test"
+    assert wrapped("git log --oneline | sort | uniq -c | head -5") == "TOTO 'git log --oneline | sort | uniq -c'"
+    assert wrapped("make 2>&1 | grep -c warning") == "TOTO 'make 2>&1 | grep -c warning'"
+    assert wrapped("make 2>&1 | grep -ic warning") == "TOTO 'make 2>&1 | grep -ic warning'"
+    assert wrapped("npm test | grep --invert-match PASS") == "TOTO 'npm test | grep --invert-match PASS'"
+    assert wrapped("find . -name '*.log' | sort -u") == "TOTO " + shlex.quote("find . -name '*.log' | sort -u")
+    assert wrapped("kubectl get pods | awk '{print $1}'") == "TOTO " + shlex.quote("kubectl get pods | awk '{print $1}'")
+    assert wrapped("pytest | wc -l") == "TOTO 'pytest | wc -l'"
+    assert wrapped("npm test | grep -- -v") == "TOTO npm test"
+
+
 def test_strip_stderr_redirect():
     """2>&1 should be stripped from commands."""
     result = rewrite.rewrite_command("./mvnw package 2>&1", SESSION)
@@ -267,6 +293,125 @@ def test_compound_command_rewrite():
     assert_rewritten("cd /project && ./mvnw package", "./mvnw package")
 
 
+def wrapped(command: str) -> str:
+    """The rewritten command, with the llm-toto invocation shortened to TOTO."""
+    result = rewrite.rewrite_command(command, SESSION)
+    assert result is not None, f"Expected rewrite for '{command}', got None"
+    return result.replace(f"python3 {rewrite.LLM_TOTO_SCRIPT} --session {SESSION} --", "TOTO")
+
+
+def test_compound_command_wraps_only_expensive_segment():
+    """Only the expensive pipeline is wrapped, so cd and echo still run in the outer shell."""
+    assert wrapped("cd frontend && npm run build") == "cd frontend && TOTO npm run build"
+    assert wrapped("make test || echo 'tests failed | see log'") == "TOTO make test || echo 'tests failed | see log'"
+    assert wrapped("x=$(git rev-parse HEAD); make VERSION=$x") == "x=$(git rev-parse HEAD); TOTO make VERSION=$x"
+
+
+def test_quoted_operators_do_not_split():
+    """Pipes and && inside quotes belong to the argument."""
+    assert wrapped("docker logs api | grep 'health|ping' | tail -3") == "TOTO docker logs api"
+    assert wrapped("docker logs api | grep -v 'health|ping' | wc -l") == "TOTO " + shlex.quote("docker logs api | grep -v 'health|ping' | wc -l")
+    assert wrapped('python3 -c "print(1 | 2) and 3 && 4"') == 'TOTO python3 -c "print(1 | 2) and 3 && 4"'
+
+
+def test_heredoc_body_is_not_parsed():
+    """The heredoc body stays in place and is fed to the wrapped command."""
+    command = "python3 - <<'EOF'\nprint('a | b && c')\nEOF"
+    assert wrapped(command) == "TOTO " + command
+    assert_passthrough("cat <<EOF > notes.txt\nbuild | test\nEOF")
+
+
+def test_subshell_segments_wrapped():
+    """Commands inside a subshell are wrapped, trailing filters of the subshell are stripped."""
+    assert wrapped("(cd backend && ./gradlew test) | tail -3") == "(cd backend && TOTO ./gradlew test)"
+
+
+def test_command_substitution_not_wrapped():
+    """The output of a command substitution is used by the shell, so it is never buffered."""
+    assert_passthrough("echo $(make build | tail -1)")
+
+
+def test_semantic_pipeline_wrapped_as_one_argument():
+    """A pipeline that doesn't end in a plain filter runs inside llm-toto as a whole."""
+    assert wrapped("curl -s https://api.example.com | jq .") == "TOTO 'curl -s https://api.example.com | jq .'"
+
+
+def test_stdout_redirected_to_file_not_wrapped():
+    """Output going to a file leaves nothing to buffer."""
+    assert_passthrough("make build > build.log 2>&1")
+    assert_passthrough("./gradlew test &> test.log")
+
+
+def test_compound_statement_wrapped_whole():
+    """Loops and conditionals can't be split, the whole command is wrapped."""
+    assert wrapped("for m in api web; do make -C $m test; done") == "TOTO 'for m in api web; do make -C $m test; done'"
+
+
+def test_unbalanced_quotes_passthrough():
+    """Commands that don't parse are left for the shell to report."""
+    assert_passthrough("make 'build")
+
+
+def test_history_skips_quiet_commands():
+    """Commands the project's history knows as fast and quiet are left unwrapped."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "history.sqlite3")
+        now = time.time()
+        with sqlite3.connect(path) as connection:
+            connection.execute(
+                "CREATE TABLE commands (command TEXT PRIMARY KEY, runs INTEGER, duration REAL, output_bytes REAL,"
+                " max_output_bytes INTEGER, exit_code INTEGER, last_run REAL, threshold INTEGER)"
+            )
+            connection.executemany(
+                "INSERT INTO commands VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    ("make lint", 5, 0.2, 120, 300, 0, now, None),
+                    ("make test", 5, 240.0, 40000, 90000, 0, now, None),
+                    ("make fmt", 5, 0.1, 10, 10, 0, now - 2 * 86400, None),
+                    ("make check", 5, 0.3, 100, 100, 2, now, None),
+                    ("make docs", 1, 0.1, 10, 10, 0, now, None),
+                    ("npm run build", 5, 0.5, 9000, 9000, 0, now, 20000),
+                    ("git log -5 | cat", 3, 0.1, 800, 800, 0, now, None),
+                ],
+            )
+        connection.close()
+        history = rewrite.CommandHistory(path)
+
+        def rewritten(command: str) -> str | None:
+            return rewrite.rewrite_command(command, SESSION, history)
+
+        assert rewritten("make lint") is None
+        assert rewritten("make lint 2>&1 | tail -5") is None
+        assert rewritten("npm run build") is None, "below the threshold set for the command"
+        assert rewritten("git log -5 | cat") is None
+        assert rewritten("cd api && make   lint") is None
+        assert "-- make test" in rewritten("make lint && make test")
+        assert rewritten("make fmt") is not None, "quiet, but not checked for a day"
+        assert rewritten("make check") is not None, "failed last time"
+        assert rewritten("make docs") is not None, "too few runs"
+        assert rewritten("make build") is not None, "no history"
+
+
+def test_history_path_follows_project_root():
+    """The hook reads the history file llm-toto writes for the project."""
+    with tempfile.TemporaryDirectory() as project:
+        os.makedirs(os.path.join(project, ".git"))
+        os.makedirs(os.path.join(project, "src", "app"))
+        # test_llm_toto.py points this at a temporary directory for the whole run, put it back afterwards
+        saved_history_dir = os.environ.get("LLM_TOTO_HISTORY_DIR")
+        os.environ["LLM_TOTO_HISTORY_DIR"] = os.path.join(project, "history")
+        try:
+            assert rewrite.CommandHistory.for_cwd(project) is None
+            os.makedirs(os.path.join(project, "history"))
+            open(os.path.join(project, "history", project.replace(os.sep, "-") + ".sqlite3"), "w").close()
+            assert rewrite.CommandHistory.for_cwd(os.path.join(project, "src", "app")) is not None
+        finally:
+            if saved_history_dir is None:
+                del os.environ["LLM_TOTO_HISTORY_DIR"]
+            else:
+                os.environ["LLM_TOTO_HISTORY_DIR"] = saved_history_dir
+
+
 def test_session_id_in_output():
     """Session ID should appear in the rewritten command."""
     result = rewrite.rewrite_command("make build", "my-session-123")
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Runs a hook script through the resident hook host, or in-process when no host is running.
+
+Usage (in hooks.json):
+    python3 -S ${CLAUDE_PLUGIN_ROOT}/scripts/host_client.py ${CLAUDE_PLUGIN_ROOT}/scripts/<hook>.py [args...]
+
+The client is started without the site module and imports only _socket, so
+forwarding a hook to the host (see the hook-host plugin) skips the script's
+own imports and setup. Plugins ship a copy of this file, so they keep
+working without the hook-host plugin installed.
+
+Protocol: the request is the script path, cwd, arguments and environment
+as NUL-terminated fields (lists end with an empty field), followed by the
+hook input until the client shuts down its side. The response is an
+"<exit code> <stdout length>" line, the stdout and then the stderr.
+"""
+
+import os
+import sys
+
+
+def socket_path() -> str:
+    return os.environ.get("HOOK_HOST_SOCKET") or os.path.join(
+        os.path.expanduser("~"), ".cache", "claude-hook-host", "host.sock"
+    )
+
+
+def encode_request(script: str, args: list, hook_input: bytes) -> bytes:
+    fields = [script, os.getcwd()] + args + [""]
+    fields += [f"{key}={value}" for key, value in os.environ.items()] + [""]
+    return b"".join(field.encode("utf-8", "surrogateescape") + b"\0" for field in fields) + hook_input
+
+
+def forward(path: str, request: bytes):
+    """Send the request to the host and replay its response. Returns the exit code, None when no host is listening."""
+    # The C module directly, importing socket (enum, selectors, ...) costs more than the rest of the client
+    import _socket
+
+    client = _socket.socket(_socket.AF_UNIX, _socket.SOCK_STREAM)
+    try:
+        client.connect(path)
+    except OSError:
+        client.close()
+        return None
+    try:
+        client.sendall(request)
+        client.shutdown(_socket.SHUT_WR)
+        chunks = []
+        while True:
+            chunk = client.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    finally:
+        client.close()
+    response = b"".join(chunks)
+    header, _, body = response.partition(b"\n")
+    if not header:
+        # The host went away without answering
+        return None
+    exit_code, stdout_length = (int(value) for value in header.split())
+    sys.stdout.buffer.write(body[:stdout_length])
+    sys.stdout.flush()
+    sys.stderr.buffer.write(body[stdout_length:])
+    sys.stderr.flush()
+    return exit_code
+
+
+def main():
+    script = os.path.abspath(sys.argv[1])
+    args = sys.argv[2:]
+    path = socket_path()
+
+    if os.path.exists(path):
+        hook_input = sys.stdin.buffer.read()
+        exit_code = forward(path, encode_request(script, args, hook_input))
+        if exit_code is not None:
+            sys.exit(exit_code)
+        # A stale socket, run the script here
+        import io
+
+        sys.stdin = io.TextIOWrapper(io.BytesIO(hook_input), encoding="utf-8")
+
+    import runpy
+
+    sys.argv = [script] + args
+    sys.path.insert(0, os.path.dirname(script))
+    runpy.run_path(script, run_name="__main__")
+
+
+if __name__ == "__main__":
+    main()